@@ -18,7 +18,7 @@ from tempfile import NamedTemporaryFile
 
 from Fred2.Core.Base import ACleavageSitePrediction, AExternal
 from Fred2.Core.Protein import Protein
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Result import CleavageSitePredictionResult
 
 
@@ -57,12 +57,12 @@ class AExternalCleavageSitePrediction(ACleavageSitePrediction, AExternal):
                                "not match external version {external_version}".format(internal_version=self.version,
                                                                                       external_version=external_version))
 
-        if isinstance(aa_seq, Peptide) or isinstance(aa_seq, Protein):
+        if isinstance(aa_seq, (Peptide, LightPeptide)) or isinstance(aa_seq, Protein):
             pep_seqs = {str(aa_seq): aa_seq}
         else:
             pep_seqs = {}
             for p in aa_seq:
-                if not isinstance(p, Peptide) and not isinstance(p, Protein):
+                if not isinstance(p, (Peptide, LightPeptide)) and not isinstance(p, Protein):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -16,7 +16,7 @@ import abc
 
 from Fred2.Core.Base import ACleavageSitePrediction, ACleavageFragmentPrediction
 from Fred2.Core.Protein import Protein
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Result import CleavageSitePredictionResult, CleavageFragmentPredictionResult
 
 
@@ -44,12 +44,12 @@ class APSSMCleavageSitePredictor(ACleavageSitePrediction):
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+model, fromlist=[model]),
                            model)
 
-        if isinstance(aa_seq, Peptide) or isinstance(aa_seq, Protein):
+        if isinstance(aa_seq, (Peptide, LightPeptide)) or isinstance(aa_seq, Protein):
             pep_seqs = {str(aa_seq): aa_seq}
         else:
             pep_seqs = {}
             for p in aa_seq:
-                if not isinstance(p, Peptide) and not isinstance(p, Protein):
+                if not isinstance(p, (Peptide, LightPeptide)) and not isinstance(p, Protein):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -322,12 +322,12 @@ class APSSMCleavageFragmentPredictor(ACleavageFragmentPrediction):
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+allele_model, fromlist=[allele_model]),
                            allele_model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides):peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -428,12 +428,12 @@ class PSSMGinodi(APSSMCleavageFragmentPredictor):
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+allele_model, fromlist=[allele_model]),
                            allele_model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide) and not isinstance(p, Protein):
+                if not isinstance(p, (Peptide, LightPeptide)) and not isinstance(p, Protein):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -33,12 +33,17 @@ class MetadataLogger(object):
 
     The saved values are accessed via :meth:`~Fred2.Core.MetadataLogger.log_metadata` and
     :meth:`~Fred2.Core.MetadataLogger.get_metadata`
+
+    The storage is only allocated by the first :meth:`~Fred2.Core.MetadataLogger.log_metadata`, objects without
+    metadata share the class default None.
     
     """
+    __metadata = None
+
     def __init__(self):
         """
         """
-        self.__metadata = defaultdict(list)
+        pass
 
     def log_metadata(self, label, value):
         """
@@ -47,8 +52,19 @@ class MetadataLogger(object):
         :param str label: key for the metadata that will be added
         :param list(object) value: any kindy of additional value that should be kept
         """
+        if self.__metadata is None:
+            self.__metadata = defaultdict(list)
         self.__metadata[label].append(value)
 
+    def _reduce_state(self):
+        """
+        Returns the pickle state of the metadata for the compact :meth:`__reduce__` of the data model classes, None if
+        nothing was logged (the state is applied to __dict__ by pickle)
+
+        :rtype: dict or None
+        """
+        return {"_MetadataLogger__metadata": self.__metadata} if self.__metadata else None
+
     def get_metadata(self, label, only_first=False):
         """
         Getter for the saved metadata with the key :attr:`label`
@@ -59,8 +75,10 @@ class MetadataLogger(object):
         # although defaultdict *would* return [] if it didn't find label in 
         # self.metadata, it would come with the side effect of adding label as 
         #a key to the defaultdict, so a getter is justified in this case.
+        if not self.__metadata or label not in self.__metadata:
+            return None if only_first else []
         if not only_first:
-            return self.__metadata[label] if label in self.__metadata else []
+            return self.__metadata[label]
         else:
             return self.__metadata[label][0] if self.__metadata[label] else None
 
@@ -0,0 +1,51 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: Core.CompactHashSet
+   :synopsis: Compact set of sequence hashes used to deduplicate streams of peptides and sequences
+.. moduleauthor:: schubert, walzer
+
+"""
+from itertools import izip
+
+import numpy
+
+
+class CompactHashSet(object):
+    """
+    Compact set of sequences used to track uniqueness across peptide batches. Only the 64 bit hash of each sequence
+    is stored in sorted numpy arrays (log-structured: small arrays are merged into larger ones), so a sequence costs
+    8 bytes.
+
+    .. warning::
+
+        Hash collisions (very unlikely) let a new sequence appear as already seen, i.e. it is dropped silently.
+    """
+    def __init__(self):
+        self.levels = []
+
+    def __len__(self):
+        return sum(len(l) for l in self.levels)
+
+    def add_new(self, seqs):
+        """
+        Adds the given unique sequences and returns those that were not contained before
+
+        :param list(str) seqs: Unique sequences to add
+        :return: The sequences that were not yet contained
+        :rtype: list(str)
+        """
+        hashes = numpy.fromiter((hash(seq) for seq in seqs), dtype=numpy.int64, count=len(seqs))
+        new = numpy.ones(len(seqs), dtype=bool)
+        for level in self.levels:
+            idx = numpy.searchsorted(level, hashes)
+            idx[idx == len(level)] = 0
+            new &= level[idx] != hashes
+        added = numpy.sort(hashes[new])
+        # keep the levels of decreasing size, merge equally sized levels
+        while self.levels and len(self.levels[-1]) <= 2*len(added):
+            added = numpy.union1d(self.levels.pop(), added)
+        if len(added):
+            self.levels.append(added)
+        return [seq for seq, n in izip(seqs, new) if n]
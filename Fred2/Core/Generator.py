@@ -12,12 +12,22 @@
 
 """
 
+import bisect
 import warnings
-from itertools import chain
+from heapq import merge
+from itertools import chain, groupby, izip, product
+from tempfile import TemporaryFile
+
+import numpy
+from Bio import BiopythonWarning
+from Bio.Alphabet import IUPAC
+from Bio.Data import CodonTable
 
 from Fred2.Core.Base import COMPLEMENT
+from Fred2.Core.CompactHashSet import CompactHashSet
 from Fred2.Core.Protein import Protein
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
+from Fred2.Core.PeptideIndex import PeptideIndex
 from Fred2.Core.Transcript import Transcript
 from Fred2.Core.Variant import VariationType
 from Fred2.IO.ADBAdapter import ADBAdapter, EAdapterFields
@@ -118,6 +128,160 @@ _incorp = {
 
 _allowed_aas = frozenset('ACDEFGHIKLMNPQRSTVWY')
 
+#nucleotide letters (IUPAC ambiguous DNA and RNA) that get their own slot in the codon lookup table, every other
+#character is mapped onto the last slot which is always translated as invalid
+_nuc_letters = "GATCRYWSMKHBVDNXU"
+_nuc_codes = numpy.empty(256, dtype=numpy.uint16)
+_nuc_codes.fill(len(_nuc_letters))
+for _i, _l in enumerate(_nuc_letters):
+    _nuc_codes[ord(_l)] = _i
+    _nuc_codes[ord(_l.lower())] = _i
+
+#special codes of the codon lookup table (all other entries are the ASCII code of the amino acid)
+_STOP_CODE = 0
+_INVALID_CODE = 1
+_TRANSLATION_BATCH = 1000
+
+_codon_lookups = {}
+
+
+def _get_codon_table(table):
+    """
+    Resolves the table argument in the same way as :meth:`Bio.Seq.Seq.translate` does for a generic RNA sequence
+
+    :param table: A name (string), an NCBI identifier (integer), or a CodonTable object
+    :return: The resolved codon table
+    :rtype: :class:`Bio.Data.CodonTable.CodonTable`
+    :raises ValueError: If incorrect table argument is pasted
+    """
+    try:
+        table_id = int(table)
+    except ValueError:
+        return CodonTable.ambiguous_generic_by_name[table]
+    except (AttributeError, TypeError):
+        if isinstance(table, CodonTable.CodonTable):
+            return table
+        raise ValueError('Bad table argument')
+    return CodonTable.ambiguous_generic_by_id[table_id]
+
+
+def _get_codon_lookup(codon_table):
+    """
+    Returns the (cached) lookup array of a codon table. The array is indexed by the three nucleotide codes
+    (see :data:`_nuc_codes`) of a codon and contains the ASCII code of the encoded amino acid, :data:`_STOP_CODE`
+    for stop codons or :data:`_INVALID_CODE` for non-valid codons. Ambiguous codons are resolved exactly as
+    Biopython does, i.e. possible stop codons (e.g. TAN) are translated as 'X'.
+
+    :param codon_table: The codon table to precompute
+    :type codon_table: :class:`Bio.Data.CodonTable.CodonTable`
+    :return: The lookup array
+    :rtype: numpy.ndarray
+    """
+    key = id(codon_table)
+    if key in _codon_lookups:
+        return _codon_lookups[key][1]
+
+    if codon_table.nucleotide_alphabet.letters is not None:
+        valid_letters = set(codon_table.nucleotide_alphabet.letters.upper())
+    else:
+        valid_letters = set(IUPAC.ambiguous_dna.letters.upper() + IUPAC.ambiguous_rna.letters.upper())
+
+    k = len(_nuc_letters) + 1
+    lookup = numpy.empty(k**3, dtype=numpy.uint8)
+    lookup.fill(_INVALID_CODE)
+    for a, b, c in product(xrange(k-1), repeat=3):
+        codon = _nuc_letters[a] + _nuc_letters[b] + _nuc_letters[c]
+        try:
+            code = ord(codon_table.forward_table[codon])
+        except (KeyError, CodonTable.TranslationError):
+            if codon in codon_table.stop_codons:
+                code = _STOP_CODE
+            elif valid_letters.issuperset(codon):
+                code = ord("X")
+            else:
+                code = _INVALID_CODE
+        lookup[a*k**2 + b*k + c] = code
+
+    #keep a reference to the table so that its id cannot be reused
+    _codon_lookups[key] = (codon_table, lookup)
+    return lookup
+
+
+def _translate_batch(seqs, table='Standard', stop_symbol='*', to_stop=True, cds=False):
+    """
+    Translates a batch of nucleotide sequences at once. All sequences are concatenated, reshaped into codon triplets
+    and translated with a single lookup into the precomputed codon table. The output matches
+    :meth:`Bio.Seq.Seq.translate` for generic RNA sequences.
+
+    The result is a generator. Translation errors are raised when the erroneous sequence is reached.
+
+    :param list(str) seqs: The nucleotide sequences to translate
+    :param str table: Which codon table to use? This can be either a name (string), an NCBI identifier (integer),
+                      or a CodonTable object
+    :param str stop_symbol: Single character string, what to use for any terminators
+    :param bool to_stop: If True, translation is terminated at the first in frame stop codon
+    :param bool cds: Boolean, indicates the sequences are complete CDS
+    :return: The protein sequences in the order of the input sequences
+    :rtype: Generator(str)
+    :raises ValueError: If incorrect table argument is pasted
+    :raises TranslationError: If sequence is not multiple of three, or first codon is not a start codon, or last
+                              codon is not a stop codon, or an extra stop codon was found in frame, or codon is
+                              non-valid
+    """
+    codon_table = _get_codon_table(table)
+    lookup = _get_codon_lookup(codon_table)
+    k = len(_nuc_letters) + 1
+
+    #collect the in-frame part of every sequence, postpone errors until the sequence is reached
+    coding = []
+    errors = {}
+    for i, seq in enumerate(seqs):
+        seq = seq.upper()
+        n = len(seq)
+        if cds:
+            if seq[:3] not in codon_table.start_codons:
+                errors[i] = "First codon '{0}' is not a start codon".format(seq[:3])
+            elif n % 3 != 0:
+                errors[i] = "Sequence length {0} is not a multiple of three".format(n)
+            elif seq[-3:] not in codon_table.stop_codons:
+                errors[i] = "Final codon '{0}' is not a stop codon".format(seq[-3:])
+            seq = seq[3:-3] if i not in errors else ""
+        coding.append(seq[:len(seq) - len(seq) % 3])
+
+    offsets = numpy.cumsum([0] + [len(s) // 3 for s in coding])
+    if offsets[-1]:
+        nucs = _nuc_codes[numpy.frombuffer("".join(coding), dtype=numpy.uint8)].reshape(-1, 3)
+        prot = lookup[nucs[:, 0]*k**2 + nucs[:, 1]*k + nucs[:, 2]]
+    else:
+        prot = numpy.empty(0, dtype=numpy.uint8)
+
+    for i, seq in enumerate(seqs):
+        if i in errors:
+            raise CodonTable.TranslationError(errors[i])
+        if not cds and len(seq) % 3:
+            warnings.warn("Partial codon, len(sequence) not a multiple of three. "
+                          "Explicitly trim the sequence or add trailing N before "
+                          "translation. This may become an error in future.",
+                          BiopythonWarning)
+        aas = prot[offsets[i]:offsets[i+1]]
+        stops = numpy.flatnonzero(aas == _STOP_CODE)
+        if stops.size:
+            if cds:
+                invalid = numpy.flatnonzero(aas[:stops[0]] == _INVALID_CODE)
+                if not invalid.size:
+                    raise CodonTable.TranslationError("Extra in frame stop codon found.")
+            elif to_stop:
+                aas = aas[:stops[0]]
+        invalid = numpy.flatnonzero(aas == _INVALID_CODE)
+        if invalid.size:
+            j = 3*invalid[0]
+            raise CodonTable.TranslationError("Codon '{0}' is invalid".format(coding[i][j:j+3]))
+        prot_seq = aas.tostring()
+        if cds:
+            yield "M" + prot_seq
+        else:
+            yield prot_seq.replace(chr(_STOP_CODE), stop_symbol) if stops.size else prot_seq
+
 
 def _check_for_problematic_variants(vars):
     """
@@ -155,10 +319,152 @@ def _check_for_problematic_variants(vars):
     return True
 
 
+def _get_window_sizes(window_size):
+    """
+    Returns the sorted unique window sizes of a single window size or an iterable of window sizes
+
+    :param window_size: Size of peptide fragments or a list (range) of sizes
+    :type window_size: int or list(int)
+    :return: The sorted window sizes
+    :rtype: list(int)
+    """
+    return sorted(set([window_size] if isinstance(window_size, (int, long)) else window_size))
+
+
+def _get_frameshift_ranges(protein):
+    """
+    Returns the ranges of start positions within a protein that follow an active (not yet compensated) frameshift,
+    i.e. for which :meth:`~Fred2.Core.Peptide.Peptide.get_variants_by_protein` reports a frameshift variant.
+
+    :param protein: The protein
+    :type protein: :class:`~Fred2.Core.Protein.Protein`
+    :return: List of half-open ranges (start, stop) of affected start positions
+    :rtype: list((int,int))
+    """
+    ranges = []
+    shift = 0
+    active = None
+    for pos, vs in sorted(protein.vars.iteritems()):
+        for v in vs:
+            if v.type in [VariationType.FSINS, VariationType.FSDEL]:
+                shift = (v.get_shift()+shift) % 3
+        if shift and active is None:
+            active = pos + 1
+        elif not shift and active is not None:
+            ranges.append((active, pos + 1))
+            active = None
+    if active is not None:
+        ranges.append((active, len(protein)))
+    return ranges
+
+
+def _gen_peptide_info(protein, window_sizes, only_variants=False):
+    """
+    Generates the peptide sequences of all window sizes of a protein in a single scan. A window is valid iff no
+    invalid residue falls inside it, hence only the stretches between invalid residues are scanned.
+
+    If only_variants is True, only windows that overlap a variant position of the protein or that follow an active
+    frameshift are enumerated.
+
+    :param protein: The protein to fragment
+    :type protein: :class:`~Fred2.Core.Protein.Protein`
+    :param list(int) window_sizes: Sorted list of window sizes
+    :param bool only_variants: Whether only windows affected by variants should be generated
+    :return: List of peptide sequences and their start position within the protein
+    :rtype: list((str,int))
+    """
+    res = []
+
+    seq = str(protein)
+    invalid = [i for i, a in enumerate(seq) if a not in _allowed_aas]
+
+    if not only_variants:
+        start = 0
+        for stop in invalid + [len(seq)]:
+            for i in xrange(start, stop):
+                for w in window_sizes:
+                    end = i+w
+                    if end > stop:
+                        break
+                    res.append((seq[i:end], i))
+            start = stop + 1
+        return res
+
+    if not window_sizes:
+        return res
+    var_pos = sorted(pos for pos, vs in protein.vars.iteritems() if vs)
+    fs_starts = set()
+    for fs_start, fs_stop in _get_frameshift_ranges(protein):
+        fs_starts.update(xrange(fs_start, fs_stop))
+
+    starts = set(fs_starts)
+    for pos in var_pos:
+        starts.update(xrange(max(0, pos-window_sizes[-1]+1), pos+1))
+
+    invalid.append(len(seq))
+    for i in sorted(starts):
+        if i >= len(seq):
+            break
+        stop = invalid[bisect.bisect_left(invalid, i)]
+        if i == stop:
+            continue
+        #first variant position at or after the start position
+        j = bisect.bisect_left(var_pos, i)
+        next_var = var_pos[j] if j < len(var_pos) else len(seq)
+        for w in window_sizes:
+            end = i+w
+            if end > stop:
+                break
+            if i in fs_starts or next_var < end:
+                res.append((seq[i:end], i))
+    return res
+
+
+def _spill_peptide_info(proteins, window_sizes, only_variants=False, tmp_dir=None):
+    """
+    Writes all peptide origins (sequence, protein number and position) into sorted runs on disk
+
+    :param proteins: Iterable of proteins
+    :type proteins: list(:class:`~Fred2.Core.Protein.Protein`)
+    :param list(int) window_sizes: Sorted list of window sizes
+    :param bool only_variants: Whether only windows affected by variants should be generated
+    :param str tmp_dir: Directory for the temporary run files
+    :return: The list of consumed proteins and the list of run files
+    :rtype: tuple(list(:class:`~Fred2.Core.Protein.Protein`),list(file))
+    """
+    prots = []
+    runs = []
+    records = []
+
+    def _write_run():
+        run = TemporaryFile(dir=tmp_dir)
+        records.sort()
+        run.writelines("%s\t%i\t%i\n" % r for r in records)
+        run.seek(0)
+        runs.append(run)
+        del records[:]
+
+    for prot in proteins:
+        if not isinstance(prot, Protein):
+            raise ValueError("Input does contain non protein objects.")
+        prots.append(prot)
+        records.extend((seq, len(prots)-1, pos) for seq, pos in _gen_peptide_info(prot, window_sizes,
+                                                                                        only_variants))
+        if len(records) >= _SPILL_RUN_SIZE:
+            _write_run()
+    if records:
+        _write_run()
+    return prots, runs
+
+
+_SPILL_RUN_SIZE = 1000000
+
+
 #################################################################
 # Public transcript generator functions
 def generate_peptides_from_variants(vars, length, dbadapter, id_type, peptides=None,
-                                    table='Standard', stop_symbol='*', to_stop=True, cds=False):
+                                    table='Standard', stop_symbol='*', to_stop=True, cds=False, reference=None,
+                                    only_variants=False):
     """
     Generates :class:`~Fred2.Core.Peptide.Peptide` from :class:`~Fred2.Core.Variant.Variant` and avoids the
     construction of all possible combinations of heterozygous variants by considering only those within the peptide
@@ -188,6 +494,13 @@ def generate_peptides_from_variants(vars, length, dbadapter, id_type, peptides=N
                      that the sequence length is a multiple of three, and that there is a single in frame stop codon at
                      the end (this will be excluded from the protein sequence, regardless of the to_stop option). If
                      these tests fail, an exception is raised
+    :param reference: An index of the reference proteome (or any container of peptide sequences). Peptides that
+                      occur in the reference are removed
+    :type reference: :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+    :param bool only_variants: If True, only the windows of the variant proteins that are affected by a variant are
+                               enumerated (see :func:`~Fred2.Core.Generator.generate_peptides_from_proteins`). This is
+                               faster, but the peptides then only reference the proteins in which they are affected
+                               by a variant, origins in reference windows are missing.
     :return: A list of unique (polymorphic) peptides
     :rtype: Generator(:class:`~Fred2.Core.Peptide.Peptide`)
     :raises ValueError: If incorrect table argument is pasted
@@ -237,6 +550,9 @@ def generate_peptides_from_variants(vars, length, dbadapter, id_type, peptides=N
     for v in vars:
         for trans_id in v.coding.iterkeys():
             transToVar.setdefault(trans_id, []).append(v)
+    # adapters that support it (e.g. CachingDBAdapter) fetch all transcripts at once
+    if hasattr(dbadapter, "prefetch"):
+        dbadapter.prefetch(transToVar.keys(), type=id_type)
 
     prots = []
     for tId, vs in transToVar.iteritems():
@@ -271,8 +587,14 @@ def generate_peptides_from_variants(vars, length, dbadapter, id_type, peptides=N
                 for ttId, varSeq, varComb in _generate_combinations(tId, vars, list(tSeq), {}, 0, strand == REVERS):
                     prots = chain(prots, generate_proteins_from_transcripts(Transcript("".join(varSeq), geneid, ttId,
                                                                                        vars=varComb)))
-    return [ p for p in generate_peptides_from_proteins(prots, length, peptides=peptides)
+    peps = [ p for p in generate_peptides_from_proteins(prots, length, peptides=peptides,
+                                                             only_variants=only_variants)
              if any(p.get_variants_by_protein(prot) for prot in p.proteins.iterkeys())]
+    if reference is None:
+        return peps
+    if hasattr(reference, "filter"):
+        return reference.filter(peps)
+    return [p for p in peps if str(p) not in reference]
 
 ################################################################################
 #        V A R I A N T S     = = >    T R A N S C R I P T S
@@ -345,6 +667,9 @@ def generate_transcripts_from_variants(vars, dbadapter, id_type):
     for v in vars:
         for trans_id in v.coding.iterkeys():
             transToVar.setdefault(trans_id, []).append(v)
+    # adapters that support it (e.g. CachingDBAdapter) fetch all transcripts at once
+    if hasattr(dbadapter, "prefetch"):
+        dbadapter.prefetch(transToVar.keys(), type=id_type)
 
     for tId, vs in transToVar.iteritems():
         query = dbadapter.get_transcript_information(tId, type=id_type)
@@ -403,68 +728,76 @@ def generate_proteins_from_transcripts(transcripts, table='Standard', stop_symbo
         if isinstance(transcripts, Transcript):
             transcripts = [transcripts]
 
+        def _translate(batch):
+            #translate a whole batch of transcripts with one codon table lookup
+            for t, prot_seq in izip(batch, _translate_batch([str(t) for t in batch], table=table,
+                                                            stop_symbol=stop_symbol, to_stop=to_stop, cds=cds)):
+                new_vars = dict()
+                for pos, var in t.vars.iteritems():
+                    if not var.isSynonymous:
+                        prot_pos = pos // 3
+                        new_vars.setdefault(prot_pos, []).append(var)
+
+                gene_id = t.gene_id
+                yield Protein(prot_seq, gene_id, t.transcript_id, t, new_vars)
+
+        batch = []
         for t in transcripts:
             if not isinstance(t, Transcript):
                 raise ValueError("An element of specified input is not of type Transcript")
-            # translate to a protein sequence
-            #if len(str(self)) % 3 != 0:
-            #    raise ValueError('ERROR while translating: lenght of transcript %s is no multiple of 3, the transcript is:\n %s' % (self.transcript_id, self))
+            batch.append(t)
+            if len(batch) == _TRANSLATION_BATCH:
+                for p in _translate(batch):
+                    yield p
+                batch = []
 
-            #TODO warn if intrasequence stops - biopython warns if  % 3 != 0
-            prot_seq = str(t.translate(table=table, stop_symbol=stop_symbol, to_stop=to_stop, cds=cds))
-
-            new_vars = dict()
-            for pos, var in t.vars.iteritems():
-                if not var.isSynonymous:
-                    prot_pos = pos // 3
-                    new_vars.setdefault(prot_pos, []).append(var)
-
-            gene_id = t.gene_id
-            yield Protein(prot_seq, gene_id, t.transcript_id, t, new_vars)
+        for p in _translate(batch):
+            yield p
 
 
 ################################################################################
 #        P R O T E I N    = = >    P E P T I D E
 ################################################################################
 
-def generate_peptides_from_proteins(proteins, window_size, peptides=None):
+def generate_peptides_from_proteins(proteins, window_size, peptides=None, only_variants=False, peptide_type=Peptide,
+                                    pool=None):
     """
-    Creates all :class:`~Fred2.Core.Peptide.Peptide` for a given window size, from a given
+    Creates all :class:`~Fred2.Core.Peptide.Peptide` for a given window size (or several window sizes), from a given
     :class:`~Fred2.Core.Protein.Protein`.
 
+    If several window sizes are given, all peptide lengths are generated within a single scan of each protein.
+
     The result is a generator.
 
     :param proteins: (Iterable of) protein(s) from which a list of unique peptides should be generated
     :type proteins: list(:class:`~Fred2.Core.Protein.Protein`) or :class:`~Fred2.Core.Protein.Protein`
-    :param int window_size: Size of peptide fragments
+    :param window_size: Size of peptide fragments or a list (range) of sizes
+    :type window_size: int or list(int)
     :param peptides: A list of peptides to update during peptide generation (usa case: Adding and updating Peptides of
                      newly generated Proteins)
     :type peptides: list(:class:`~Fred2.Core.Peptide.Peptide`)
+    :param bool only_variants: If True, only windows overlapping a variant position of the protein (see
+                               :attr:`~Fred2.Core.Protein.Protein.vars`) or following an active frameshift are
+                               generated. Reference windows are skipped entirely, hence the peptides only reference
+                               proteins in which they are affected by a variant.
+    :param peptide_type: The class of the created peptides, e.g. :class:`~Fred2.Core.Peptide.LightPeptide` for less
+                         memory and time per peptide
+    :type peptide_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Peptide.LightPeptide`
+    :param pool: If given, the canonical peptides of the pool are returned (and updated) instead of new objects
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
     :return: A unique generator of peptides
     :rtype: Generator(:class:`~Fred2.Core.Peptide.Peptide`)
     """
+    window_sizes = _get_window_sizes(window_size)
 
-    def gen_peptide_info(protein):
-        # Generate peptide sequences and returns the sequence
-        # #and start position within the protein
-        res = []
-
-        seq = str(protein)
-        for i in xrange(len(protein)+1-window_size):
-            # generate peptide fragment
-            end = i+window_size
-            pep_seq = seq[i:end]
-            res.append((pep_seq, i))
-        return res
-
-    if isinstance(peptides, Peptide):
+    if isinstance(peptides, (Peptide, LightPeptide)):
         peptides = [peptides]
 
     final_peptides = {}
 
     if peptides:
         for p in peptides:
-            if not isinstance(p, Peptide):
+            if not isinstance(p, (Peptide, LightPeptide)):
                 raise ValueError("Specified list of Peptides contain non peptide objects")
             final_peptides[str(p)] = p
 
@@ -475,12 +808,142 @@ def generate_peptides_from_proteins(proteins, window_size, peptides=None):
         if not isinstance(prot, Protein):
             raise ValueError("Input does contain non protein objects.")
         # generate all peptide sequences per protein:
-        for (seq, pos) in gen_peptide_info(prot):
-            if all(a in _allowed_aas for a in seq.upper()):
-                t_id = prot.transcript_id
+        t_id = prot.transcript_id
+        for (seq, pos) in _gen_peptide_info(prot, window_sizes, only_variants):
+            if pool is not None:
                 if seq not in final_peptides:
-                    final_peptides[seq] = Peptide(seq)
-                final_peptides[seq].proteins[t_id] = prot
-                final_peptides[seq].proteinPos[t_id].append(pos)
+                    final_peptides[seq] = pool.peptide(seq, peptide_type=peptide_type)
+                pool.add_origin(final_peptides[seq], prot, pos)
+                continue
+            if seq not in final_peptides:
+                final_peptides[seq] = peptide_type(seq)
+            final_peptides[seq].proteins[t_id] = prot
+            final_peptides[seq].proteinPos[t_id].append(pos)
 
     return final_peptides.itervalues()
+
+
+def generate_peptide_index_from_proteins(proteins, window_size, index=None, only_variants=False):
+    """
+    Creates a :class:`~Fred2.Core.PeptideIndex.PeptideIndex` of all peptides for a given window size (or several
+    window sizes), from a given :class:`~Fred2.Core.Protein.Protein`. In contrast to
+    :func:`~Fred2.Core.Generator.generate_peptides_from_proteins` the origins of the peptides are stored in flat
+    integer arrays and :class:`~Fred2.Core.Peptide.Peptide` objects are only created on access.
+
+    :param proteins: (Iterable of) protein(s) from which the unique peptides should be generated
+    :type proteins: list(:class:`~Fred2.Core.Protein.Protein`) or :class:`~Fred2.Core.Protein.Protein`
+    :param window_size: Size of peptide fragments or a list (range) of sizes
+    :type window_size: int or list(int)
+    :param index: An index to update during peptide generation
+    :type index: :class:`~Fred2.Core.PeptideIndex.PeptideIndex`
+    :param bool only_variants: If True, only windows overlapping a variant position or following an active
+                               frameshift are indexed
+    :return: The index of all unique peptides
+    :rtype: :class:`~Fred2.Core.PeptideIndex.PeptideIndex`
+    """
+    window_sizes = _get_window_sizes(window_size)
+    index = PeptideIndex() if index is None else index
+
+    if isinstance(proteins, Protein):
+        proteins = [proteins]
+
+    for prot in proteins:
+        if not isinstance(prot, Protein):
+            raise ValueError("Input does contain non protein objects.")
+        for (seq, pos) in _gen_peptide_info(prot, window_sizes, only_variants):
+            index.add(seq, prot, pos)
+
+    return index
+
+
+def generate_peptide_batches_from_proteins(proteins, window_size, batch_size=10000, spill=False, tmp_dir=None,
+                                           only_variants=False, peptide_type=Peptide, pool=None):
+    """
+    Streaming version of :func:`~Fred2.Core.Generator.generate_peptides_from_proteins`. Proteins are consumed one
+    after another and unique :class:`~Fred2.Core.Peptide.Peptide` are yielded in batches, so that memory does not
+    grow with the number of generated peptides.
+
+    By default, uniqueness across batches is tracked by a compact hash set (8 byte per unique sequence) and a
+    peptide only references the proteins of the batch in which it was yielded first. If :attr:`spill` is True, all
+    peptide origins are written into sorted runs on disk and merged afterwards. The peptides then reference all of
+    their proteins (as with :func:`~Fred2.Core.Generator.generate_peptides_from_proteins`), but the first batch is
+    only available after all proteins were consumed.
+
+    The result is a generator.
+
+    :param proteins: (Iterable of) protein(s) from which the unique peptides should be generated
+    :type proteins: list(:class:`~Fred2.Core.Protein.Protein`) or :class:`~Fred2.Core.Protein.Protein`
+    :param window_size: Size of peptide fragments or a list (range) of sizes
+    :type window_size: int or list(int)
+    :param int batch_size: The (approximate) number of peptides per batch
+    :param bool spill: If True, origins are sorted and merged on disk to collect all proteins of a peptide
+    :param str tmp_dir: Directory for the temporary files if :attr:`spill` is True
+    :param bool only_variants: If True, only windows overlapping a variant position or following an active
+                               frameshift are generated
+    :param peptide_type: The class of the created peptides, e.g. :class:`~Fred2.Core.Peptide.LightPeptide`
+    :type peptide_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Peptide.LightPeptide`
+    :param pool: If given, the canonical peptides of the pool are yielded (and updated) instead of new objects
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
+    :return: A generator of lists of unique peptides
+    :rtype: Generator(list(:class:`~Fred2.Core.Peptide.Peptide`))
+
+    .. warning::
+
+        Without spill, uniqueness across batches is tracked by the 64 bit hashes of the sequences only (see
+        :class:`~Fred2.Core.CompactHashSet.CompactHashSet`). A peptide whose hash collides with the hash of a
+        peptide of an earlier batch is dropped silently. Use spill=True if the output must be complete.
+    """
+    window_sizes = _get_window_sizes(window_size)
+
+    if isinstance(proteins, Protein):
+        proteins = [proteins]
+
+    if spill:
+        prots, runs = _spill_peptide_info(proteins, window_sizes, only_variants, tmp_dir=tmp_dir)
+
+        def _read_run(run):
+            for line in run:
+                seq, prot_nr, pos = line.split("\t")
+                yield seq, int(prot_nr), int(pos)
+
+        batch = []
+        for seq, origins in groupby(merge(*[_read_run(run) for run in runs]), key=lambda r: r[0]):
+            pep = peptide_type(seq) if pool is None else pool.peptide(seq, peptide_type=peptide_type)
+            for _, prot_nr, pos in origins:
+                prot = prots[prot_nr]
+                if pool is not None:
+                    pool.add_origin(pep, prot, pos)
+                    continue
+                pep.proteins[prot.transcript_id] = prot
+                pep.proteinPos[prot.transcript_id].append(pos)
+            batch.append(pep)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        for run in runs:
+            run.close()
+        return
+
+    seen = CompactHashSet()
+    batch = {}
+    for prot in proteins:
+        if not isinstance(prot, Protein):
+            raise ValueError("Input does contain non protein objects.")
+        t_id = prot.transcript_id
+        for (seq, pos) in _gen_peptide_info(prot, window_sizes, only_variants):
+            if pool is not None:
+                if seq not in batch:
+                    batch[seq] = pool.peptide(seq, peptide_type=peptide_type)
+                pool.add_origin(batch[seq], prot, pos)
+                continue
+            if seq not in batch:
+                batch[seq] = peptide_type(seq)
+            batch[seq].proteins[t_id] = prot
+            batch[seq].proteinPos[t_id].append(pos)
+        if len(batch) >= batch_size:
+            yield [batch[seq] for seq in seen.add_new(batch.keys())]
+            batch = {}
+    if batch:
+        yield [batch[seq] for seq in seen.add_new(batch.keys())]
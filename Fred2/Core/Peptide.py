@@ -17,7 +17,6 @@ from Bio.Alphabet import IUPAC
 
 from Fred2.Core import MetadataLogger
 from Fred2.Core.Protein import Protein
-from Fred2.Core.Variant import VariationType
 
 
 class Peptide(MetadataLogger, Seq):
@@ -27,7 +26,6 @@ class Peptide(MetadataLogger, Seq):
 
     .. note:: For accessing and manipulating the sequence see also :mod:`Bio.Seq.Seq` (from Biopython)
     """
-
     def __init__(self, seq, protein_pos=None):
         """
         :param str seq: Sequence of the peptide in one letter amino acid code
@@ -67,7 +65,7 @@ class Peptide(MetadataLogger, Seq):
             start, stop, step = index.indices(len(self))
             if start > stop:
                 raise ValueError("start has to be greater than stop")
-            protPos = {self.proteins[tId]: [p+(start-p) for p in pos] for tId, pos in self.proteinPos.iteritems()}
+            protPos = {self.proteins[tId]: [p+start for p in pos] for tId, pos in self.proteinPos.iteritems()}
             return Peptide(seq, protein_pos=protPos)
 
     def __repr__(self):
@@ -155,19 +153,10 @@ class Peptide(MetadataLogger, Seq):
             p = self.proteins[transcript_id]
             var = []
             fs = []
-            shift = 0
             for start_pos in self.proteinPos[transcript_id]:
-                for i in xrange(start_pos):
-                    for v in p.vars.get(i, []):
-                        if v.type in [VariationType.FSDEL, VariationType.FSINS]:
-                            shift = (v.get_shift()+shift) % 3
-                            if shift:
-                                fs.append(v)
-                            else:
-                                fs = []
-                for j in xrange(start_pos, start_pos+len(self)):
-                    for v in p.vars.get(j, []):
-                        var.append(v)
+                fs.extend(v for _, v in p.get_active_frameshifts(start_pos))
+                for _, vs in p.get_variants(start_pos, start_pos+len(self)):
+                    var.extend(vs)
             fs.extend(var)
             return fs
         except KeyError:
@@ -198,24 +187,25 @@ class Peptide(MetadataLogger, Seq):
                                                                                               transcript=protein_pos))
             var = dict()
             fs = dict()
-            shift = 0
-            for i in xrange(protein_pos):
-                for v in p.vars.get(i, []):
-                    if v.type in [VariationType.FSDEL, VariationType.FSINS]:
-                        shift = (v.get_shift()+shift) % 3
-                        if shift:
-                            fs.setdefault(i - protein_pos, []).append(v)
-                        else:
-                            fs.clear()
-            for j in xrange(protein_pos, protein_pos+len(self)):
-                for v in p.vars.get(j, []):
-                    var.setdefault(j - protein_pos, []).append(v)
+            for i, v in p.get_active_frameshifts(protein_pos):
+                fs.setdefault(i - protein_pos, []).append(v)
+            for j, vs in p.get_variants(protein_pos, protein_pos+len(self)):
+                if vs:
+                    var[j - protein_pos] = list(vs)
             fs.update(var)
             return fs
         except KeyError:
             raise KeyError("Peptide does not origin from protein with \
                              transcript ID {transcript}".format(transcript=transcript_id))
 
+    def __reduce__(self):
+        """
+        Pickles only the sequence, the origins and the metadata (instead of the Biopython alphabet and the attribute
+        names of each peptide), the proteins are pickled compactly as well
+        """
+        return _restore_peptide, (self.__class__, str(self), self.proteins or None, dict(self.proteinPos) or None,
+                                  self._reduce_state())
+
     def __eq__(self, other):
         return str(self) == str(other)
 
@@ -230,3 +220,167 @@ class Peptide(MetadataLogger, Seq):
 
     def __hash__(self):
         return hash(str(self))
+
+
+def _restore_peptide(cls, seq, proteins, protein_pos, metadata):
+    """
+    Unpickles a :class:`~Fred2.Core.Peptide.Peptide` pickled by :meth:`~Fred2.Core.Peptide.Peptide.__reduce__`
+    without the checks of its constructor
+
+    :rtype: :class:`~Fred2.Core.Peptide.Peptide`
+    """
+    pep = cls.__new__(cls)
+    pep.__dict__.update(_data=seq, alphabet=IUPAC.IUPACProtein, proteins={} if proteins is None else proteins,
+                        proteinPos=collections.defaultdict(list, protein_pos or ()))
+    if metadata:
+        pep.__dict__.update(metadata)
+    return pep
+
+
+class LightPeptide(object):
+    """
+    Lightweight alternative to :class:`~Fred2.Core.Peptide.Peptide` for creating millions of peptides. It has no
+    Biopython base class and stores its attributes in __slots__: the sequence is an interned str with a precomputed
+    hash, the protein maps and the metadata are only allocated when they are first written.
+
+    It is no subclass of :class:`~Fred2.Core.Peptide.Peptide` (the functions accepting both check for
+    (Peptide, LightPeptide)), but it compares and hashes like a :class:`~Fred2.Core.Peptide.Peptide` of the same
+    sequence and offers its protein, transcript, variant and metadata accessors, hence it can be passed to the
+    predictors and used in :class:`~Fred2.Core.Result.AResult`. The sequence methods of :class:`Bio.Seq.Seq` are not available, use
+    str(peptide) instead.
+
+    Usage:
+        peps = generate_peptides_from_proteins(proteins, 9, peptide_type=LightPeptide)
+    """
+    __slots__ = ("_seq", "_hash", "_proteins", "_protein_pos", "_metadata", "__weakref__")
+
+    def __init__(self, seq, protein_pos=None):
+        """
+        :param str seq: Sequence of the peptide in one letter amino acid code
+        :param protein_pos: Dict of transcript_IDs to position of origin in protein
+        :type protein_pos: dict(:class:`~Fred2.Core.Protein.Protein`,list(int))`
+        """
+        self._seq = intern(str(seq).upper())
+        self._hash = hash(self._seq)
+        self._proteins = None
+        self._protein_pos = None
+        self._metadata = None
+        if protein_pos:
+            if any(not isinstance(p, Protein) or any(not isinstance(i, (int, long)) for i in pos) for p, pos in
+                   protein_pos.iteritems()):
+                raise TypeError("The proteins_pos given to a Peptide object should be dict(Protein,list(int))")
+            self._proteins = {p.transcript_id: p for p in protein_pos.iterkeys()}
+            self._protein_pos = collections.defaultdict(list, ((p.transcript_id, pos)
+                                                               for p, pos in protein_pos.iteritems()))
+
+    @property
+    def proteins(self):
+        if self._proteins is None:
+            self._proteins = dict()
+        return self._proteins
+
+    @property
+    def proteinPos(self):
+        if self._protein_pos is None:
+            self._protein_pos = collections.defaultdict(list)
+        return self._protein_pos
+
+    def __getstate__(self):
+        return self._seq, self._proteins, self._protein_pos, self._metadata
+
+    def __setstate__(self, state):
+        seq, self._proteins, self._protein_pos, self._metadata = state
+        self._seq = intern(seq)
+        self._hash = hash(seq)
+
+    def __str__(self):
+        return self._seq
+
+    def __len__(self):
+        return len(self._seq)
+
+    def __iter__(self):
+        return iter(self._seq)
+
+    def __contains__(self, sub):
+        return str(sub) in self._seq
+
+    def __getitem__(self, index):
+        """
+        Returns a single letter or a sliced :class:`~Fred2.Core.Peptide.LightPeptide` (see
+        :meth:`~Fred2.Core.Peptide.Peptide.__getitem__`)
+        """
+        if isinstance(index, int):
+            return self._seq[index]
+        start, stop, step = index.indices(len(self))
+        if start > stop:
+            raise ValueError("start has to be greater than stop")
+        pep = LightPeptide(self._seq[index])
+        if self._protein_pos:
+            pep._proteins = dict(self._proteins)
+            pep._protein_pos = collections.defaultdict(list, ((tId, [p+start for p in pos])
+                                                              for tId, pos in self._protein_pos.iteritems()))
+        return pep
+
+    def __eq__(self, other):
+        return self._seq == str(other)
+
+    def __ne__(self, other):
+        return self._seq != str(other)
+
+    def __lt__(self, other):
+        return self._seq < str(other)
+
+    def __le__(self, other):
+        return self._seq <= str(other)
+
+    def __gt__(self, other):
+        return self._seq > str(other)
+
+    def __ge__(self, other):
+        return self._seq >= str(other)
+
+    def __hash__(self):
+        return self._hash
+
+    def log_metadata(self, label, value):
+        """
+        Inserts a new metadata (see :meth:`~Fred2.Core.Base.MetadataLogger.log_metadata`)
+
+        :param str label: key for the metadata that will be added
+        :param list(object) value: any kindy of additional value that should be kept
+        """
+        if self._metadata is None:
+            self._metadata = collections.defaultdict(list)
+        self._metadata[label].append(value)
+
+    def get_metadata(self, label, only_first=False):
+        """
+        Getter for the saved metadata with the key :attr:`label` (see
+        :meth:`~Fred2.Core.Base.MetadataLogger.get_metadata`)
+
+        :param str label: key for the metadata that is inferred
+        :param bool only_first: true if only the the first element of the matadata list is to be returned
+        """
+        values = self._metadata.get(label, []) if self._metadata else []
+        if only_first:
+            return values[0] if values else None
+        return values
+
+    def get_all_proteins(self):
+        return self._proteins.values() if self._proteins else []
+
+    def get_protein(self, transcript_id):
+        return self._proteins.get(transcript_id) if self._proteins else None
+
+    def get_all_transcripts(self):
+        return [p.orig_transcript for p in self._proteins.itervalues()] if self._proteins else []
+
+    def get_protein_positions(self, transcript_id):
+        return self._protein_pos.get(transcript_id, []) if self._protein_pos else []
+
+    # the remaining accessors only use the attributes shared with Peptide
+    get_transcript = Peptide.__dict__["get_transcript"]
+    get_variants_by_protein = Peptide.__dict__["get_variants_by_protein"]
+    get_variants_by_protein_position = Peptide.__dict__["get_variants_by_protein_position"]
+    __repr__ = Peptide.__dict__["__repr__"]
@@ -0,0 +1,196 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: Core.PeptideIndex
+   :synopsis: Contains the PeptideIndex class, a compact peptide to protein origin index
+
+   :Note: All internal indices start at 0!
+
+.. moduleauthor:: schubert, walzer
+
+"""
+import array
+
+import numpy
+
+from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Protein import Protein
+
+
+class PeptideIndex(object):
+    """
+    A :class:`~Fred2.Core.PeptideIndex.PeptideIndex` stores the origins (:class:`~Fred2.Core.Protein.Protein` and
+    position) of unique peptide sequences in flat integer arrays (CSR layout) instead of per
+    :class:`~Fred2.Core.Peptide.Peptide` dictionaries. :class:`~Fred2.Core.Peptide.Peptide` objects are only created
+    on access.
+
+    Origins of peptide i are found at :attr:`protein_ids` [:attr:`indptr` [i]::attr:`indptr` [i+1]] and
+    :attr:`positions` [:attr:`indptr` [i]::attr:`indptr` [i+1]].
+    """
+
+    def __init__(self):
+        self.proteins = []
+        self.__protein_ids = {}
+        self.__peptide_ids = {}
+        self.__sequences = []
+
+        # unsorted origin triples (peptide id, protein id, position)
+        self.__pep = array.array('l')
+        self.__prot = array.array('l')
+        self.__pos = array.array('l')
+
+        self.__indptr = None
+        self.__protein_ids_csr = None
+        self.__positions_csr = None
+
+    def add(self, seq, protein, pos):
+        """
+        Adds an origin of a peptide sequence
+
+        :param str seq: The peptide sequence
+        :param protein: The :class:`~Fred2.Core.Protein.Protein` from which the peptide originates
+        :type protein: :class:`~Fred2.Core.Protein.Protein`
+        :param int pos: The start position of the peptide within the protein
+        :raises ValueError: If protein is not of type :class:`~Fred2.Core.Protein.Protein`
+        """
+        if not isinstance(protein, Protein):
+            raise ValueError("Input does contain non protein objects.")
+
+        t_id = protein.transcript_id
+        if t_id not in self.__protein_ids:
+            self.__protein_ids[t_id] = len(self.proteins)
+            self.proteins.append(protein)
+        else:
+            self.proteins[self.__protein_ids[t_id]] = protein
+
+        if seq not in self.__peptide_ids:
+            self.__peptide_ids[seq] = len(self.__sequences)
+            self.__sequences.append(seq)
+
+        self.__pep.append(self.__peptide_ids[seq])
+        self.__prot.append(self.__protein_ids[t_id])
+        self.__pos.append(pos)
+        self.__indptr = None
+
+    def __build(self):
+        """
+        (Re-)builds the CSR arrays from the collected origin triples
+        """
+        if self.__indptr is not None:
+            return
+        pep = numpy.array(self.__pep, dtype=numpy.int_)
+        # stable sorting keeps the positions of every peptide in ascending order
+        order = numpy.argsort(pep, kind="mergesort")
+        self.__indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(pep, minlength=len(self.__sequences)))))
+        self.__protein_ids_csr = numpy.array(self.__prot, dtype=numpy.int_)[order]
+        self.__positions_csr = numpy.array(self.__pos, dtype=numpy.int_)[order]
+
+    @property
+    def indptr(self):
+        """
+        The CSR row pointer, origins of peptide i are stored in the range indptr[i]:indptr[i+1]
+        """
+        self.__build()
+        return self.__indptr
+
+    @property
+    def protein_ids(self):
+        """
+        The CSR array of protein ids (index into :attr:`proteins`) of all origins
+        """
+        self.__build()
+        return self.__protein_ids_csr
+
+    @property
+    def positions(self):
+        """
+        The CSR array of start positions of all origins
+        """
+        self.__build()
+        return self.__positions_csr
+
+    def __peptide_id(self, peptide):
+        if isinstance(peptide, (int, long)):
+            if not 0 <= peptide < len(self.__sequences):
+                raise KeyError("No peptide with id %i" % peptide)
+            return peptide
+        try:
+            return self.__peptide_ids[str(peptide)]
+        except KeyError:
+            raise KeyError("Peptide %s is not contained in the index" % str(peptide))
+
+    def __origins(self, peptide):
+        self.__build()
+        i = self.__peptide_id(peptide)
+        s, e = self.__indptr[i], self.__indptr[i+1]
+        return self.__protein_ids_csr[s:e], self.__positions_csr[s:e]
+
+    def __len__(self):
+        return len(self.__sequences)
+
+    def __contains__(self, peptide):
+        return str(peptide) in self.__peptide_ids
+
+    def __iter__(self):
+        for i in xrange(len(self.__sequences)):
+            yield self[i]
+
+    def __getitem__(self, peptide):
+        """
+        Creates the :class:`~Fred2.Core.Peptide.Peptide` object of a peptide sequence (or peptide id) with all its
+        origins
+
+        :param peptide: The peptide sequence or the peptide id
+        :type peptide: str or int
+        :return: The peptide
+        :rtype: :class:`~Fred2.Core.Peptide.Peptide`
+        :raises KeyError: If the peptide is not contained in the index
+        """
+        i = self.__peptide_id(peptide)
+        pep = Peptide(self.__sequences[i])
+        for prot_id, pos in zip(*self.__origins(i)):
+            prot = self.proteins[prot_id]
+            pep.proteins[prot.transcript_id] = prot
+            pep.proteinPos[prot.transcript_id].append(int(pos))
+        return pep
+
+    def sequences(self):
+        """
+        Returns all unique peptide sequences in order of their peptide id
+
+        :return: The peptide sequences
+        :rtype: list(str)
+        """
+        return list(self.__sequences)
+
+    def get_all_proteins(self, peptide):
+        """
+        Returns all :class:`~Fred2.Core.Protein.Protein` objects a peptide originates from (see
+        :meth:`~Fred2.Core.Peptide.Peptide.get_all_proteins`)
+
+        :param peptide: The peptide sequence or the peptide id
+        :type peptide: str or int
+        :return: A list of :class:`~Fred2.Core.Protein.Protein`
+        :rtype: list(:class:`~Fred2.Core.Protein.Protein`)
+        :raises KeyError: If the peptide is not contained in the index
+        """
+        prot_ids, _ = self.__origins(peptide)
+        return [self.proteins[p] for p in sorted(set(prot_ids))]
+
+    def get_protein_positions(self, peptide, transcript_id):
+        """
+        Returns all positions of origin of a peptide for a given :class:`~Fred2.Core.Protein.Protein` identified by
+        its transcript-ID (see :meth:`~Fred2.Core.Peptide.Peptide.get_protein_positions`)
+
+        :param peptide: The peptide sequence or the peptide id
+        :type peptide: str or int
+        :param str transcript_id: The unique transcript ID of the :class:`~Fred2.Core.Protein.Protein` in question
+        :return: A list of positions within the protein from which the peptide originated (starts at 0)
+        :rtype: list(int)
+        :raises KeyError: If the peptide is not contained in the index
+        """
+        prot_ids, positions = self.__origins(peptide)
+        if transcript_id not in self.__protein_ids:
+            return []
+        return [int(p) for p in positions[prot_ids == self.__protein_ids[transcript_id]]]
@@ -10,6 +10,7 @@
 .. moduleauthor:: schubert, brachvogel, walzer
 
 """
+import bisect
 import itertools
 
 from Bio.Seq import Seq
@@ -19,6 +20,80 @@ from Fred2.Core.Base import MetadataLogger
 from Fred2.Core.Variant import VariationType
 
 
+class _VariantDict(dict):
+    """
+    The variants of a :class:`~Fred2.Core.Protein.Protein` by position. Every modification of the dict or of one of
+    its variant lists increments :attr:`version`, which invalidates the variant index of the protein. The variant
+    lists are stored as copies, it is pickled and copied as plain dict.
+    """
+
+    def __init__(self, vars=None):
+        dict.__init__(self)
+        self.version = 0
+        for pos, variants in (vars or {}).iteritems():
+            dict.__setitem__(self, pos, self.__list(variants))
+
+    def __list(self, variants):
+        variants = _VariantList(variants)
+        variants.owner = self
+        return variants
+
+    def __setitem__(self, pos, variants):
+        self.version += 1
+        dict.__setitem__(self, pos, self.__list(variants))
+
+    def __delitem__(self, pos):
+        self.version += 1
+        dict.__delitem__(self, pos)
+
+    def setdefault(self, pos, variants=None):
+        if pos not in self:
+            self[pos] = [] if variants is None else variants
+        return dict.__getitem__(self, pos)
+
+    def update(self, *args, **kwargs):
+        for pos, variants in dict(*args, **kwargs).iteritems():
+            self[pos] = variants
+
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+
+    def clear(self):
+        self.version += 1
+        dict.clear(self)
+
+    def __reduce__(self):
+        return dict, (dict((pos, list(vs)) for pos, vs in self.iteritems()),)
+
+
+class _VariantList(list):
+    """
+    The variants at one position of a :class:`~Fred2.Core.Protein.Protein`, every modification increments the
+    version of the owning :class:`~Fred2.Core.Protein._VariantDict`
+    """
+    __slots__ = ("owner",)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _invalidating(method):
+    def _modify(self, *args, **kwargs):
+        self.owner.version += 1
+        return method(self, *args, **kwargs)
+    _modify.__name__ = method.__name__
+    return _modify
+
+for _name in ["__setitem__", "__delitem__", "__setslice__", "__delslice__", "__iadd__", "__imul__", "append",
+              "extend", "insert", "pop", "remove", "reverse", "sort"]:
+    setattr(_VariantList, _name, _invalidating(getattr(list, _name)))
+
+
 class Protein(MetadataLogger, Seq):
     """
     :class:`~Fred2.Core.Protein.Protein` corresponding to exactly one transcript.
@@ -28,6 +103,12 @@ class Protein(MetadataLogger, Seq):
         For accessing and manipulating the sequence see also :mod:`Bio.Seq.Seq`
         (from Biopython)
 
+    .. note::
+
+        Variant queries (slicing, :meth:`get_variants`, :meth:`get_active_frameshifts`) use an index of the sorted
+        variant positions that is built on the first query. It is rebuilt after :attr:`vars` or one of its variant
+        lists was modified or reassigned. The assigned dict is copied, later changes of it do not affect the protein.
+
     """
     newid = itertools.count().next #this is evil and has no other purpose? it does not help that there may be more than one protein from one transcript - due to variants
 
@@ -54,6 +135,80 @@ class Protein(MetadataLogger, Seq):
         self.transcript_id = "Protein_%i"%Protein.newid() if transcript_id is None else transcript_id
         self.gene_id = gene_id
 
+    @property
+    def vars(self):
+        """
+        The variants of the protein, key=position within protein, value=list of variants at that pos
+
+        :rtype: dict(int,list(:class:`~Fred2.Core.Variant.Variant`))
+        """
+        return self.__vars
+
+    @vars.setter
+    def vars(self, vars):
+        self.__vars = vars if isinstance(vars, _VariantDict) else _VariantDict(vars)
+        self.__index = None
+
+    def __variant_index(self):
+        """
+        Returns the index of the variants, (re)building it if necessary. It consists of the sorted variant positions
+        (and their variant lists) and the sorted frameshift variants. For each frameshift the index of the first
+        frameshift that is not compensated after it is stored (i.e. the frameshift itself + 1 if the cumulative shift
+        returns to 0), hence the active frameshifts before any position are a contiguous run of the list.
+
+        :return: positions, variant lists, frameshift positions, frameshift variants and run starts
+        :rtype: (list(int),list(list(:class:`~Fred2.Core.Variant.Variant`)),list(int),
+                list(:class:`~Fred2.Core.Variant.Variant`),list(int))
+        """
+        if self.__index is not None and self.__index[0] == self.__vars.version:
+            return self.__index[1]
+        positions = sorted(self.__vars)
+        var_lists = [self.__vars[pos] for pos in positions]
+        fs_pos, fs_vars, fs_begin = [], [], []
+        shift, begin = 0, 0
+        for pos, vs in itertools.izip(positions, var_lists):
+            for v in vs:
+                if v.type in [VariationType.FSINS, VariationType.FSDEL]:
+                    shift = (v.get_shift()+shift) % 3
+                    fs_pos.append(pos)
+                    fs_vars.append(v)
+                    if not shift:
+                        begin = len(fs_vars)
+                    fs_begin.append(begin)
+        index = (positions, var_lists, fs_pos, fs_vars, fs_begin)
+        self.__index = (self.__vars.version, index)
+        return index
+
+    def get_variants(self, start=0, stop=None):
+        """
+        Returns the variants at the positions [start, stop) of the protein in O(log V + hits)
+
+        :param int start: The first position
+        :param int stop: The position after the last one, default is the end of the protein
+        :return: The positions and their list of variants in ascending order
+        :rtype: list((int,list(:class:`~Fred2.Core.Variant.Variant`)))
+        """
+        positions, var_lists = self.__variant_index()[:2]
+        lo = bisect.bisect_left(positions, start)
+        hi = len(positions) if stop is None else bisect.bisect_left(positions, stop, lo)
+        return zip(positions[lo:hi], var_lists[lo:hi])
+
+    def get_active_frameshifts(self, start):
+        """
+        Returns the frameshift variants before a position whose shift is not yet compensated at it (i.e. all
+        frameshifts since the cumulative shift of the preceding frameshifts was 0 the last time) in O(log V + hits)
+
+        :param int start: The position
+        :return: The positions and frameshift variants in ascending order, empty if the frame is not shifted
+        :rtype: list((int,:class:`~Fred2.Core.Variant.Variant`))
+        """
+        fs_pos, fs_vars, fs_begin = self.__variant_index()[2:]
+        k = bisect.bisect_left(fs_pos, start)
+        if not k:
+            return []
+        begin = fs_begin[k-1]
+        return zip(fs_pos[begin:k], fs_vars[begin:k])
+
     def __getitem__(self, index):
         """
 
@@ -78,31 +233,33 @@ class Protein(MetadataLogger, Seq):
             start, stop, step = index.indices(len(self))
             if start > stop:
                 raise ValueError("start has to be greater than stop")
-            if index.step:
-                slice = set(xrange(start, step, stop))
-            else:
-                slice = set(xrange(start, stop))
 
             _vars = {}
-            _fs = {}
-            shift = 0
             #collect also all frame shift variants that are not canceled out
-            for pos, vs in sorted(self.vars.iteritems()):
-                if pos < start:
-                    for v in vs:
-                        if v.type in [VariationType.FSINS, VariationType.FSDEL]:
-                            shift = (v.get_shift()+shift) % 3
-                            if shift:
-                                _fs.setdefault(pos-start, []).append(v)
-                            else:
-                                _fs.clear()
-                    if pos in slice:
-                        _vars[pos-start] = vs
-            _vars.update(_fs)
+            for pos, v in self.get_active_frameshifts(start):
+                _vars.setdefault(pos-start, []).append(v)
+            for pos, vs in self.get_variants(start, stop):
+                if not (pos-start) % step:
+                    _vars[pos-start] = vs
             trans_id = self.transcript_id+":"+str(Protein.newid())
             seq = str(self)[index]
             return Protein(seq, gene_id=self.gene_id, transcript_id=trans_id, vars=_vars)
 
+    def __reduce__(self):
+        """
+        Pickles the constructor arguments and the metadata only, i.e. neither the Biopython alphabet nor the variant
+        index
+        """
+        return (self.__class__, (str(self), self.gene_id, self.transcript_id, self.orig_transcript, self.vars or None),
+                self._reduce_state())
+
+    def __setstate__(self, state):
+        # proteins pickled before __reduce__ was introduced store vars as plain attribute
+        vars = state.pop("vars", None)
+        self.__dict__.update(state)
+        if vars is not None:
+            self.vars = vars
+
     def __repr__(self):
         # Header:
         lines = []
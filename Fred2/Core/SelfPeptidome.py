@@ -0,0 +1,266 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: Core.SelfPeptidome
+   :synopsis: Contains the SelfPeptidome class, a k-mer index of a reference proteome to filter self peptides
+
+.. moduleauthor:: schubert, walzer
+
+"""
+import cPickle
+import math
+import os
+
+import numpy
+from Bio import SeqIO
+
+
+class SelfPeptidome(object):
+    """
+    A :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome` contains all k-mers of the configured lengths of a reference
+    proteome. It is built once (e.g. from a FASTA file or a :class:`~Fred2.IO.EnsemblAdapter.EnsemblDB`) and answers
+    whether a peptide occurs anywhere in the reference in constant time.
+
+    By default the k-mers are stored in an exact hash set. With bloom=True they are stored in a Bloom filter instead,
+    which needs only a few bytes per k-mer but reports peptides not contained in the reference as contained with
+    probability :attr:`error_rate` (i.e. some non-self peptides might be filtered, self peptides are always found).
+
+    Usage:
+        ref = SelfPeptidome.from_fasta('/path/to/proteome.fasta', [8, 9, 10, 11])
+        ref.save('/path/to/proteome.idx')
+        ref = SelfPeptidome.load('/path/to/proteome.idx')
+        peps = generate_peptides_from_variants(vars, 9, db, EIdentifierTypes.REFSEQ, reference=ref)
+    """
+
+    def __init__(self, lengths, bloom=False, capacity=None, error_rate=0.001):
+        """
+        :param lengths: The k-mer length(s) to index
+        :type lengths: int or list(int)
+        :param bool bloom: Whether a Bloom filter should be used instead of an exact hash set
+        :param int capacity: The expected number of k-mers (required for Bloom filters)
+        :param float error_rate: The false positive rate of the Bloom filter at the given capacity
+        :raises ValueError: If a Bloom filter is requested without capacity or with an invalid error rate
+        """
+        self.lengths = sorted(set([lengths] if isinstance(lengths, (int, long)) else lengths))
+        self.bloom = bloom
+        self.error_rate = error_rate
+        if bloom:
+            if not capacity or capacity <= 0:
+                raise ValueError("A Bloom filter needs a positive capacity")
+            if not 0 < error_rate < 1:
+                raise ValueError("The error rate has to be between 0 and 1")
+            # optimal number of bits and hash functions for the given capacity and false positive rate
+            self.__nbits = max(8, int(math.ceil(-capacity*math.log(error_rate)/math.log(2)**2)))
+            self.__nhashes = max(1, int(round(self.__nbits/float(capacity)*math.log(2))))
+            self.__bits = numpy.zeros((self.__nbits+7)//8, dtype=numpy.uint8)
+            self.__kmers = None
+        else:
+            self.__kmers = set()
+        # str hashes differ between platforms, hence they are stored to be checked on load
+        self.__hash_check = hash("FRED2")
+
+    @classmethod
+    def from_sequences(cls, sequences, lengths, **kwargs):
+        """
+        Builds the index from protein sequences
+
+        :param sequences: The reference protein sequences
+        :type sequences: list(str) or list(:class:`~Fred2.Core.Protein.Protein`)
+        :param lengths: The k-mer length(s) to index
+        :type lengths: int or list(int)
+        :param kwargs: Further options of :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`. If bloom is True and no
+                       capacity is given it is estimated from the sequence lengths
+        :return: The index
+        :rtype: :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+        """
+        sequences = [str(s) for s in sequences]
+        if kwargs.get("bloom") and not kwargs.get("capacity"):
+            n_lengths = 1 if isinstance(lengths, (int, long)) else len(set(lengths))
+            kwargs["capacity"] = max(1, sum(len(s) for s in sequences)*n_lengths)
+        ref = cls(lengths, **kwargs)
+        ref.add_sequences(sequences)
+        return ref
+
+    @classmethod
+    def from_fasta(cls, fasta_file, lengths, **kwargs):
+        """
+        Builds the index from a protein FASTA file. The file is streamed, so the sequences are never held in memory
+        at once.
+
+        :param str fasta_file: Path to the protein FASTA file
+        :param lengths: The k-mer length(s) to index
+        :type lengths: int or list(int)
+        :param kwargs: Further options of :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`. If bloom is True and no
+                       capacity is given it is estimated from the file size
+        :return: The index
+        :rtype: :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+        """
+        if kwargs.get("bloom") and not kwargs.get("capacity"):
+            n_lengths = 1 if isinstance(lengths, (int, long)) else len(set(lengths))
+            kwargs["capacity"] = max(1, os.path.getsize(fasta_file)*n_lengths)
+        ref = cls(lengths, **kwargs)
+        with open(fasta_file, "r") as f:
+            ref.add_sequences(str(rec.seq) for rec in SeqIO.parse(f, "fasta"))
+        return ref
+
+    @classmethod
+    def from_db(cls, db, lengths, **kwargs):
+        """
+        Builds the index from all sequences of a sequence database like :class:`~Fred2.IO.EnsemblAdapter.EnsemblDB`
+        or :class:`~Fred2.IO.UniProtAdapter.UniProtDB`
+
+        :param db: The sequence database
+        :type db: :class:`~Fred2.IO.EnsemblAdapter.EnsemblDB` or :class:`~Fred2.IO.UniProtAdapter.UniProtDB`
+        :param lengths: The k-mer length(s) to index
+        :type lengths: int or list(int)
+        :param kwargs: Further options of :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+        :return: The index
+        :rtype: :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+        """
+        return cls.from_sequences((rec.seq for rec in db.collection.itervalues()), lengths, **kwargs)
+
+    def __kmers_of(self, seq):
+        for k in self.lengths:
+            for i in xrange(len(seq)-k+1):
+                yield seq[i:i+k]
+
+    def __bloom_positions(self, kmers):
+        """
+        Calculates the bit positions of k-mers by double hashing
+
+        :param list(str) kmers: The k-mers
+        :return: Array of shape (len(kmers), number of hash functions) of bit positions
+        :rtype: numpy.ndarray
+        """
+        n = len(kmers)
+        h1 = numpy.fromiter((hash(s) for s in kmers), dtype=numpy.int64, count=n).view(numpy.uint64)
+        h2 = numpy.fromiter((hash("#"+s) for s in kmers), dtype=numpy.int64, count=n).view(numpy.uint64)
+        i = numpy.arange(self.__nhashes, dtype=numpy.uint64)
+        return (h1[:, None] + i[None, :]*(h2[:, None] | numpy.uint64(1))) % numpy.uint64(self.__nbits)
+
+    def __bloom_add(self, kmers):
+        pos = self.__bloom_positions(kmers).ravel()
+        numpy.bitwise_or.at(self.__bits, pos >> numpy.uint64(3),
+                            numpy.left_shift(numpy.uint8(1), (pos & numpy.uint64(7)).astype(numpy.uint8)))
+
+    def __bloom_contains(self, kmers):
+        pos = self.__bloom_positions(kmers)
+        hit = (self.__bits[pos >> numpy.uint64(3)] >> (pos & numpy.uint64(7)).astype(numpy.uint8)) & 1
+        return hit.all(axis=1)
+
+    def add_sequences(self, sequences, batch_size=1000000):
+        """
+        Adds all k-mers of the given sequences to the index
+
+        :param sequences: The protein sequences
+        :type sequences: list(str) or list(:class:`~Fred2.Core.Protein.Protein`)
+        :param int batch_size: Number of k-mers hashed at once when filling a Bloom filter
+        """
+        if not self.bloom:
+            for seq in sequences:
+                self.__kmers.update(self.__kmers_of(str(seq)))
+            return
+
+        batch = []
+        for seq in sequences:
+            batch.extend(self.__kmers_of(str(seq)))
+            if len(batch) >= batch_size:
+                self.__bloom_add(batch)
+                batch = []
+        if batch:
+            self.__bloom_add(batch)
+
+    def __check_length(self, seq):
+        if len(seq) not in self.lengths:
+            raise ValueError("Peptide length %i is not indexed (indexed lengths: %s)"
+                             % (len(seq), ",".join(map(str, self.lengths))))
+
+    def __contains__(self, peptide):
+        """
+        Checks whether a peptide occurs in the reference proteome
+
+        :param peptide: The peptide
+        :type peptide: str or :class:`~Fred2.Core.Peptide.Peptide`
+        :return: True if the peptide is contained (or a false positive of the Bloom filter)
+        :rtype: bool
+        :raises ValueError: If the length of the peptide is not indexed
+        """
+        seq = str(peptide)
+        self.__check_length(seq)
+        if self.bloom:
+            return bool(self.__bloom_contains([seq])[0])
+        return seq in self.__kmers
+
+    def __len__(self):
+        """
+        The number of indexed k-mers (for Bloom filters, the estimated number)
+        """
+        if not self.bloom:
+            return len(self.__kmers)
+        x = int(numpy.unpackbits(self.__bits).sum())
+        if x >= self.__nbits:
+            return self.__nbits
+        return int(round(-self.__nbits/float(self.__nhashes)*math.log(1 - x/float(self.__nbits))))
+
+    def filter(self, peptides):
+        """
+        Removes all peptides that occur in the reference proteome
+
+        :param peptides: The peptides to filter
+        :type peptides: list(:class:`~Fred2.Core.Peptide.Peptide`) or list(str)
+        :return: The peptides not contained in the reference proteome (in input order)
+        :rtype: list(:class:`~Fred2.Core.Peptide.Peptide`) or list(str)
+        :raises ValueError: If the length of a peptide is not indexed
+        """
+        peptides = list(peptides)
+        seqs = [str(p) for p in peptides]
+        for s in seqs:
+            self.__check_length(s)
+        if self.bloom:
+            if not seqs:
+                return []
+            contained = self.__bloom_contains(seqs)
+        else:
+            contained = [s in self.__kmers for s in seqs]
+        return [p for p, c in zip(peptides, contained) if not c]
+
+    def save(self, file_name):
+        """
+        Stores the index on disk
+
+        :param str file_name: The path of the file
+        """
+        with open(file_name, "wb") as f:
+            cPickle.dump({"lengths": self.lengths, "bloom": self.bloom, "error_rate": self.error_rate,
+                          "hash_check": self.__hash_check,
+                          "kmers": self.__kmers,
+                          "nbits": self.__nbits if self.bloom else None,
+                          "nhashes": self.__nhashes if self.bloom else None,
+                          "bits": self.__bits if self.bloom else None}, f, cPickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Loads an index stored with :meth:`~Fred2.Core.SelfPeptidome.SelfPeptidome.save`
+
+        :param str file_name: The path of the file
+        :return: The index
+        :rtype: :class:`~Fred2.Core.SelfPeptidome.SelfPeptidome`
+        :raises ValueError: If a Bloom filter was stored on a platform with incompatible string hashes
+        """
+        with open(file_name, "rb") as f:
+            d = cPickle.load(f)
+        if d["bloom"] and d["hash_check"] != hash("FRED2"):
+            raise ValueError("The Bloom filter in %s was created on an incompatible platform" % file_name)
+        ref = cls.__new__(cls)
+        ref.lengths = d["lengths"]
+        ref.bloom = d["bloom"]
+        ref.error_rate = d["error_rate"]
+        ref.__hash_check = d["hash_check"]
+        ref.__kmers = d["kmers"]
+        if ref.bloom:
+            ref.__nbits = d["nbits"]
+            ref.__nhashes = d["nhashes"]
+            ref.__bits = d["bits"]
+        return ref
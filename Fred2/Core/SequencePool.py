@@ -0,0 +1,157 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: Core.SequencePool
+   :synopsis: Interning registry returning one canonical Peptide/Protein object per sequence
+.. moduleauthor:: schubert, walzer
+"""
+import weakref
+
+from Fred2.Core.Peptide import Peptide, LightPeptide
+from Fred2.Core.Protein import Protein
+
+
+def _metadata(obj):
+    """
+    Returns the metadata dict of a :class:`~Fred2.Core.Base.MetadataLogger` or
+    :class:`~Fred2.Core.Peptide.LightPeptide`
+
+    :rtype: dict(str,list(object))
+    """
+    if isinstance(obj, LightPeptide):
+        return obj._metadata or {}
+    return obj._MetadataLogger__metadata or {}
+
+
+class SequencePool(object):
+    """
+    Interning registry (flyweight) of :class:`~Fred2.Core.Peptide.Peptide` and :class:`~Fred2.Core.Protein.Protein`
+    objects. Peptides are identified by their sequence, proteins by transcript ID and sequence. Requesting or
+    interning an object whose sequence is already registered returns the canonical instance, the origins (proteins
+    and positions) and metadata of the new object are merged into it.
+
+    Passing the same pool to the readers and generators (e.g. :func:`~Fred2.IO.FileReader.read_lines` and
+    :func:`~Fred2.Core.Generator.generate_peptides_from_proteins`) makes them share one object per sequence.
+
+    With weak=True the pool only holds weak references, an object is dropped from the pool once it is not
+    referenced anymore elsewhere.
+
+    Usage:
+        pool = SequencePool(weak=True)
+        peps = read_lines("peptides.txt", pool=pool)
+        variant_peps = list(generate_peptides_from_proteins(proteins, 9, pool=pool))
+    """
+
+    def __init__(self, weak=False):
+        """
+        :param bool weak: If True, the pool holds weak references only
+        """
+        self.weak = weak
+        self.__peptides = weakref.WeakValueDictionary() if weak else dict()
+        self.__proteins = weakref.WeakValueDictionary() if weak else dict()
+
+    def __len__(self):
+        return len(self.__peptides) + len(self.__proteins)
+
+    def __contains__(self, obj):
+        if isinstance(obj, Protein):
+            return (obj.transcript_id, str(obj)) in self.__proteins
+        return str(obj).upper() in self.__peptides
+
+    @staticmethod
+    def __merge_metadata(canonical, obj):
+        if obj is canonical:
+            return
+        for label, values in _metadata(obj).iteritems():
+            for value in values:
+                canonical.log_metadata(label, value)
+
+    @staticmethod
+    def add_origin(peptide, protein, position):
+        """
+        Adds a protein position of origin to a peptide, unless it is already known
+
+        :param peptide: The peptide
+        :type peptide: :class:`~Fred2.Core.Peptide.Peptide`
+        :param protein: The protein the peptide originates from
+        :type protein: :class:`~Fred2.Core.Protein.Protein`
+        :param int position: The start position of the peptide within the protein
+        """
+        t_id = protein.transcript_id
+        peptide.proteins.setdefault(t_id, protein)
+        positions = peptide.proteinPos[t_id]
+        if position not in positions:
+            positions.append(position)
+
+    def peptide(self, seq, protein_pos=None, peptide_type=Peptide):
+        """
+        Returns the canonical peptide of a sequence, it is created if the sequence is new
+
+        :param str seq: The peptide sequence
+        :param protein_pos: Proteins and positions of origin merged into the peptide
+        :type protein_pos: dict(:class:`~Fred2.Core.Protein.Protein`,list(int))
+        :param peptide_type: The class of a newly created peptide
+        :type peptide_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Peptide.LightPeptide`
+        :return: The canonical peptide
+        :rtype: :class:`~Fred2.Core.Peptide.Peptide`
+        """
+        key = str(seq).upper()
+        pep = self.__peptides.get(key)
+        if pep is None:
+            pep = peptide_type(key, protein_pos)
+            self.__peptides[key] = pep
+        elif protein_pos:
+            for prot, positions in protein_pos.iteritems():
+                for pos in positions:
+                    self.add_origin(pep, prot, pos)
+        return pep
+
+    def protein(self, seq, gene_id="unknown", transcript_id=None, orig_transcript=None, vars=None):
+        """
+        Returns the canonical protein of a transcript ID and sequence, it is created if it is new (see
+        :class:`~Fred2.Core.Protein.Protein` for the parameters)
+
+        :return: The canonical protein
+        :rtype: :class:`~Fred2.Core.Protein.Protein`
+        """
+        if transcript_id is not None:
+            prot = self.__proteins.get((transcript_id, str(seq).upper()))
+            if prot is not None:
+                return prot
+        return self.intern(Protein(seq, gene_id, transcript_id, orig_transcript, vars))
+
+    def intern(self, obj):
+        """
+        Registers an object or, if an object of the same sequence (and transcript ID for proteins) is already
+        registered, merges its origins and metadata into the registered one
+
+        :param obj: The peptide or protein
+        :type obj: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Protein.Protein`
+        :return: The canonical object
+        :rtype: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Protein.Protein`
+        :raises TypeError: If obj is neither a peptide nor a protein
+        """
+        if isinstance(obj, (Peptide, LightPeptide)):
+            key, objects = str(obj), self.__peptides
+        elif isinstance(obj, Protein):
+            key, objects = (obj.transcript_id, str(obj)), self.__proteins
+        else:
+            raise TypeError("Only Peptide and Protein objects can be interned")
+        canonical = objects.get(key)
+        if canonical is None:
+            objects[key] = obj
+            return obj
+        if isinstance(obj, (Peptide, LightPeptide)):
+            for t_id, positions in obj.proteinPos.iteritems():
+                for pos in positions:
+                    self.add_origin(canonical, obj.proteins[t_id], pos)
+        self.__merge_metadata(canonical, obj)
+        return canonical
+
+    def clear(self):
+        """
+        Removes all objects from the pool
+        """
+        self.__peptides.clear()
+        self.__proteins.clear()
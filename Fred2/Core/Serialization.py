@@ -0,0 +1,128 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: Core.Serialization
+   :synopsis: Compact batch serialization of peptides and their origins for the transfer between processes
+.. moduleauthor:: schubert, walzer
+
+"""
+import array
+import cPickle
+
+from Fred2.Core.Peptide import Peptide
+from Fred2.Core.SequencePool import _metadata
+
+
+def _int_array(values):
+    """
+    Returns the values as array of the smallest unsigned type that holds them
+
+    :param list(int) values: Non-negative integers
+    :rtype: array.array
+    """
+    top = max(values) if values else 0
+    for code in "BHIL":
+        if top < 256**array.array(code).itemsize:
+            return array.array(code, values)
+    raise OverflowError("Value %i is too large to be serialized" % top)
+
+
+def dumps_peptides(peptides, proteins=True):
+    """
+    Serializes a batch of peptides with their origins into a compact string, e.g. to pass them to
+    :mod:`multiprocessing` workers. The sequences are concatenated and the lengths, origin counts, protein numbers
+    and positions are encoded as integer arrays, each distinct :class:`~Fred2.Core.Protein.Protein` is serialized
+    only once (with its :attr:`~Fred2.Core.Protein.Protein.orig_transcript` and variants).
+
+    With proteins=False only the transcript IDs of the proteins are stored (shared references), they are resolved by
+    :func:`~Fred2.Core.Serialization.loads_peptides` against the proteins the receiving process already holds. This
+    reduces the payload to little more than the sequence bytes.
+
+    Usage:
+        data = dumps_peptides(peps, proteins=False)
+        # in the worker, proteins were e.g. passed once by the pool initializer
+        peps = loads_peptides(data, proteins=worker_proteins)
+
+    :param peptides: The peptides to serialize
+    :type peptides: list(:class:`~Fred2.Core.Peptide.Peptide`)
+    :param bool proteins: If True, the proteins are serialized as well, otherwise only their transcript IDs
+    :return: The serialized batch
+    :rtype: str
+    """
+    seqs, lengths, counts, prot_ids, positions = [], [], [], [], []
+    table, numbers = [], {}
+    metadata = []
+    for i, pep in enumerate(peptides):
+        seq = str(pep)
+        seqs.append(seq)
+        lengths.append(len(seq))
+        n = 0
+        for t_id, pos in pep.proteinPos.iteritems():
+            prot = pep.proteins[t_id]
+            number = numbers.get(id(prot))
+            if number is None:
+                number = numbers[id(prot)] = len(table)
+                table.append(prot if proteins else t_id)
+            n += len(pos)
+            prot_ids.extend([number]*len(pos))
+            positions.extend(pos)
+        counts.append(n)
+        meta = _metadata(pep)
+        if meta:
+            metadata.append((i, dict(meta)))
+    return cPickle.dumps(("".join(seqs), _int_array(lengths), _int_array(counts), _int_array(prot_ids),
+                          _int_array(positions), proteins, table, metadata), cPickle.HIGHEST_PROTOCOL)
+
+
+def loads_peptides(data, proteins=None, peptide_type=Peptide, pool=None):
+    """
+    Restores a batch of peptides serialized by :func:`~Fred2.Core.Serialization.dumps_peptides`
+
+    :param str data: The serialized batch
+    :param proteins: The proteins to which the transcript IDs are resolved if the batch was serialized with
+                     proteins=False, either by transcript ID or as list
+    :type proteins: dict(str,:class:`~Fred2.Core.Protein.Protein`) or list(:class:`~Fred2.Core.Protein.Protein`)
+    :param peptide_type: The class of the created peptides
+    :type peptide_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Peptide.LightPeptide`
+    :param pool: If given, the canonical peptides of the pool are returned (and updated) instead of new objects
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
+    :return: The peptides in the serialized order
+    :rtype: list(:class:`~Fred2.Core.Peptide.Peptide`)
+    :raises ValueError: If the proteins are needed but not given
+    :raises KeyError: If a transcript ID is not contained in proteins
+    """
+    seqs, lengths, counts, prot_ids, positions, embedded, table, metadata = cPickle.loads(data)
+    if not embedded and table:
+        if proteins is None:
+            raise ValueError("The peptides were serialized without proteins, they have to be given")
+        if not isinstance(proteins, dict):
+            proteins = {p.transcript_id: p for p in proteins}
+        try:
+            table = [proteins[t_id] for t_id in table]
+        except KeyError as e:
+            raise KeyError("Protein with transcript ID %s is not given" % e.args[0])
+
+    peps = []
+    start = origin = 0
+    for length, n in zip(lengths, counts):
+        seq = seqs[start:start+length]
+        start += length
+        if pool is not None:
+            pep = pool.peptide(seq, peptide_type=peptide_type)
+            for j in xrange(origin, origin+n):
+                pool.add_origin(pep, table[prot_ids[j]], positions[j])
+        else:
+            pep = peptide_type(seq)
+            for j in xrange(origin, origin+n):
+                prot = table[prot_ids[j]]
+                pep.proteins[prot.transcript_id] = prot
+                pep.proteinPos[prot.transcript_id].append(positions[j])
+        origin += n
+        peps.append(pep)
+
+    for i, meta in metadata:
+        for label, values in meta.iteritems():
+            for value in values:
+                peps[i].log_metadata(label, value)
+    return peps
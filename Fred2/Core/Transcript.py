@@ -92,6 +92,12 @@ class Transcript(MetadataLogger, Seq):
             t = Transcript(seq, gene_id=self.gene_id, transcript_id=trans_id, vars=_vars)
             return t
 
+    def __reduce__(self):
+        """
+        Pickles the constructor arguments and the metadata only (not the Biopython alphabet)
+        """
+        return self.__class__, (str(self), self.gene_id, self.transcript_id, self.vars or None), self._reduce_state()
+
     def __repr__(self):
         lines = ["TRANSCRIPT: %s" % self.transcript_id]
         # get all variants:
@@ -89,6 +89,17 @@ class Variant(MetadataLogger):
             for meta in metadata:
                 self.log_metadata(meta, metadata[meta])
 
+    def __reduce__(self):
+        """
+        Pickles the constructor arguments as tuple instead of the attribute dict, the state holds the gene and
+        metadata if set
+        """
+        state = self._reduce_state() or {}
+        if self.gene is not None:
+            state["gene"] = self.gene
+        return (self.__class__, (self.id, self.type, self.chrom, self.genomePos, self.ref, self.obs, self.coding,
+                                 self.isHomozygous, self.isSynonymous, self.experimentalDesign), state or None)
+
     def __repr__(self):
         return "Variant(g.%i%s>%s):%s" % (self.genomePos, self.ref, self.obs, self.experimentalDesign) \
             if self.experimentalDesign else "Variant(g.%i%s>%s)" % (self.genomePos, self.ref, self.obs)
@@ -6,9 +6,14 @@ __author__ = 'schubert, brachvogel'
 # Not yet sure if we should do this:
 from Fred2.Core.Base import *
 from Fred2.Core.Allele import *
+from Fred2.Core.CompactHashSet import *
 from Fred2.Core.Generator import *
 from Fred2.Core.Peptide import *
+from Fred2.Core.PeptideIndex import *
 from Fred2.Core.Protein import *
+from Fred2.Core.SelfPeptidome import *
+from Fred2.Core.SequencePool import *
+from Fred2.Core.Serialization import *
 from Fred2.Core.Transcript import *
 from Fred2.Core.Variant import *
 from Fred2.Core.Variant import VariationType
@@ -21,7 +21,7 @@ import math
 from collections import defaultdict
 
 from Fred2.Core.Allele import Allele, CombinedAllele
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Result import EpitopePredictionResult
 from Fred2.Core.Base import AEpitopePrediction, AExternal
 from tempfile import NamedTemporaryFile
@@ -72,12 +72,12 @@ class AExternalEpitopePrediction(AEpitopePrediction, AExternal):
                                "not match external version {external_version}".format(internal_version=self.version,
                                                                                       external_version=external_version))
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
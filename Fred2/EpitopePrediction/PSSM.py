@@ -14,7 +14,7 @@ import pandas
 import math
 
 from Fred2.Core.Allele import Allele
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Result import EpitopePredictionResult
 from Fred2.Core.Base import AEpitopePrediction
 
@@ -43,12 +43,12 @@ class APSSMEpitopePrediction(AEpitopePrediction):
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+allele_model, fromlist=[allele_model]),
                            allele_model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides):peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -571,12 +571,12 @@ class ARB(APSSMEpitopePrediction):
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+allele_model, fromlist=[allele_model]),
                            allele_model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides):peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -17,7 +17,7 @@ import pandas
 import pkg_resources
 
 from Fred2.Core.Allele import Allele
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Base import AEpitopePrediction, ASVM
 from Fred2.Core.Result import EpitopePredictionResult
 from Fred2.Data.svms.unitope.UniTope_encodedAlleles import UniTope_encodedAlleles
@@ -41,12 +41,12 @@ class ASVMEpitopePrediction(AEpitopePrediction, ASVM):
         :return: Returns a :class:`~Fred2.Core.Result.EpitopePredictionResult` object with the prediction results
         :rtype: :class:`~Fred2.Core.Result.EpitopePredictionResult`
         """
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -504,12 +504,12 @@ class UniTope(ASVMEpitopePrediction):
         :return: Returns a :class:`~Fred2.Core.Result.EpitopePredictionResult` object with the prediction results
         :rtype: :class:`~Fred2.Core.Result.EpitopePredictionResult`
         """
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
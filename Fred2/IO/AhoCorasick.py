@@ -0,0 +1,97 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: IO.AhoCorasick
+   :synopsis: Aho-Corasick automaton to search many sequences in a sequence database with a single pass
+.. moduleauthor:: walzer, schubert
+"""
+
+from collections import deque
+
+
+class AhoCorasick(object):
+    """
+    Aho-Corasick automaton of a set of patterns. All occurrences of all patterns in a text are found in a single
+    pass over the text, independent of the number of patterns.
+
+    Usage:
+        ac = AhoCorasick(['SYFPEITHI', 'KLLPKLVSY'])
+        for end, pattern in ac.iter_matches(db.searchstring):
+            ...
+    """
+
+    def __init__(self, patterns):
+        """
+        :param list(str) patterns: The (non-empty) patterns to search for
+        """
+        self.patterns = list(patterns)
+        goto = [{}]
+        out = [[]]
+        for i, p in enumerate(self.patterns):
+            state = 0
+            for c in p:
+                nxt = goto[state].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][c] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(i)
+
+        # failure links in breadth-first order, the outputs of the failure state are inherited
+        fail = [0]*len(goto)
+        queue = deque(goto[0].itervalues())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in goto[state].iteritems():
+                queue.append(nxt)
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f][c] if state and c in goto[f] else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+        self.__goto = goto
+        self.__fail = fail
+        self.__out = out
+
+    def __len__(self):
+        return len(self.__goto)
+
+    def iter_matches(self, text):
+        """
+        Generates all occurrences of all patterns in text ordered by their end position
+
+        :param str text: The text to search in
+        :return: Tuples of the end position (exclusive) of an occurrence and the index of the pattern
+        :rtype: generator((int, int))
+        """
+        goto, fail, out = self.__goto, self.__fail, self.__out
+        state = 0
+        for pos, c in enumerate(text):
+            nxt = goto[state].get(c)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(c)
+            state = nxt or 0
+            if out[state]:
+                for i in out[state]:
+                    yield pos+1, i
+
+    def find_all(self, text):
+        """
+        Returns the start positions of all non-overlapping occurrences of each pattern in text (the same positions as
+        repeatedly calling str.find with the start set behind the previous occurrence)
+
+        :param str text: The text to search in
+        :return: A list of start positions in ascending order for each pattern (in the order of :attr:`patterns`)
+        :rtype: list(list(int))
+        """
+        positions = [[] for _ in self.patterns]
+        for end, i in self.iter_matches(text):
+            start = end - len(self.patterns[i])
+            hits = positions[i]
+            if not hits or start >= hits[-1] + len(self.patterns[i]):
+                hits.append(start)
+        return positions
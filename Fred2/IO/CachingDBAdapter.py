@@ -0,0 +1,214 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: IO.CachingDBAdapter
+   :synopsis: DB-Adapter decorator caching the lookups of another DB-Adapter in memory and on disk
+.. moduleauthor:: walzer, schubert
+"""
+
+import cPickle
+import logging
+import sqlite3
+from collections import OrderedDict
+
+from Fred2.IO.ADBAdapter import ADBAdapter
+
+
+# the batch variant of each cached lookup, used by prefetch if the wrapped adapter provides it
+_BATCH_METHODS = {"get_transcript_information": "get_transcript_informations",
+                  "get_transcript_sequence": "get_transcript_sequences",
+                  "get_product_sequence": "get_product_sequences"}
+# maximal number of ids per SQLite IN list (SQLite allows 999 host parameters)
+_SQLITE_CHUNK = 500
+
+
+class CachingDBAdapter(ADBAdapter):
+    """
+    Wraps any :class:`~Fred2.IO.ADBAdapter.ADBAdapter` and caches the results of
+    :meth:`get_transcript_information`, :meth:`get_transcript_sequence` and :meth:`get_product_sequence` in a
+    least-recently-used in-memory cache and optionally in a SQLite file, so that repeated lookups (also across runs)
+    do not reach the wrapped adapter. All other attributes are looked up on the wrapped adapter.
+
+    Lookups that found nothing (None) are only cached in memory, never in the SQLite file, and
+    :meth:`prefetch` only caches the ids the wrapped adapter returned, so a transient failure of the wrapped adapter is
+    not remembered across runs. Exceptions of the wrapped adapter are not cached.
+
+    Usage:
+        db = CachingDBAdapter(MartsAdapter(biomart="http://grch37.ensembl.org"), cache_file="mart_cache.sqlite")
+        db.prefetch(transcript_ids, EIdentifierTypes.ENSEMBL)
+        peps = generate_peptides_from_variants(vars, 9, db, EIdentifierTypes.ENSEMBL)
+    """
+
+    def __init__(self, adapter, maxsize=10000, cache_file=None):
+        """
+        :param adapter: The adapter whose lookups are cached
+        :type adapter: :class:`~Fred2.IO.ADBAdapter.ADBAdapter`
+        :param int maxsize: The maximal number of results held in memory
+        :param str cache_file: Path of a SQLite file used as persistent second level cache (created if it does not
+                               exist)
+        :raises TypeError: If adapter is not an :class:`~Fred2.IO.ADBAdapter.ADBAdapter`
+        """
+        if not isinstance(adapter, ADBAdapter):
+            raise TypeError("The given adapter is not of type ADBAdapter")
+        self.adapter = adapter
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__lru = OrderedDict()
+        self.__db = None
+        if cache_file is not None:
+            self.__db = sqlite3.connect(cache_file)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS cache (method TEXT, id TEXT, args TEXT, value BLOB, "
+                              "PRIMARY KEY (method, id, args))")
+            self.__db.commit()
+
+    def __getattr__(self, name):
+        # only called for attributes not found on the wrapper itself
+        if name == "adapter":
+            raise AttributeError(name)
+        return getattr(self.adapter, name)
+
+    @staticmethod
+    def __args(kwargs):
+        return repr(sorted(kwargs.iteritems()))
+
+    def __remember(self, key, value):
+        self.__lru[key] = value
+        if len(self.__lru) > self.maxsize:
+            self.__lru.popitem(last=False)
+
+    def __store(self, rows):
+        if self.__db is not None and rows:
+            self.__db.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                                  [(m, i, a, sqlite3.Binary(cPickle.dumps(v, cPickle.HIGHEST_PROTOCOL)))
+                                   for (m, i, a), v in rows])
+            self.__db.commit()
+
+    def __load(self, method, ids, args):
+        """
+        Fetches the results of ids from the SQLite cache
+
+        :return: The cached results of the ids found in the SQLite cache
+        :rtype: dict(str,object)
+        """
+        found = dict()
+        if self.__db is None:
+            return found
+        ids = list(ids)
+        for i in xrange(0, len(ids), _SQLITE_CHUNK):
+            chunk = ids[i:i+_SQLITE_CHUNK]
+            cursor = self.__db.execute("SELECT id, value FROM cache WHERE method = ? AND args = ? AND id IN (%s)"
+                                       % ",".join("?"*len(chunk)), [method, args] + chunk)
+            for id_, value in cursor:
+                found[id_] = cPickle.loads(str(value))
+        return found
+
+    def __lookup(self, method, id_, kwargs):
+        key = (method, id_, self.__args(kwargs))
+        if key in self.__lru:
+            self.hits += 1
+            value = self.__lru.pop(key)
+            self.__lru[key] = value
+            return value
+        stored = self.__load(method, [id_], key[2])
+        if id_ in stored:
+            self.hits += 1
+            self.__remember(key, stored[id_])
+            return stored[id_]
+
+        self.misses += 1
+        value = getattr(self.adapter, method)(id_, **kwargs)
+        self.__remember(key, value)
+        if value is not None:
+            self.__store([(key, value)])
+        return value
+
+    def get_product_sequence(self, product_id, **kwargs):
+        """
+        Fetches the product sequence for the given id from the cache or the wrapped adapter
+
+        :param str product_id: The product ID as string
+        :keyword type: Given id, is in the form of this type,found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :return: The requested sequence as returned by the wrapped adapter
+        """
+        return self.__lookup("get_product_sequence", product_id, kwargs)
+
+    def get_transcript_sequence(self, transcript_id, **kwargs):
+        """
+        Fetches the transcript sequence for the given id from the cache or the wrapped adapter
+
+        :param str transcript_id: The transcript ID as string
+        :keyword type: Given id, is in the form of this type,found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :return: The requested sequence as returned by the wrapped adapter
+        """
+        return self.__lookup("get_transcript_sequence", transcript_id, kwargs)
+
+    def get_transcript_information(self, transcript_id, **kwargs):
+        """
+        Fetches the transcript information for the given id from the cache or the wrapped adapter
+
+        :param str transcript_id: The transcript ID as string
+        :keyword type: Given id, is in the form of this type,found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :return: Dictionary of the requested keys as in EAdapterFields.ENUM
+        :rtype: dict
+        """
+        return self.__lookup("get_transcript_information", transcript_id, kwargs)
+
+    def prefetch(self, ids, type=None, method="get_transcript_information"):
+        """
+        Fills the cache for many ids at once. Ids already cached are skipped, the remaining ones are fetched with a
+        single call of the batch lookup of the wrapped adapter if it has one (e.g.
+        :meth:`~Fred2.IO.MartsAdapter.MartsAdapter.get_transcript_informations`), otherwise one by one.
+
+        If more than :attr:`maxsize` ids are prefetched, the least recently used ones only remain in the SQLite cache.
+        Ids for which the wrapped adapter returns nothing are not cached, their lookups ask the wrapped adapter again.
+
+        :param list(str) ids: The ids to be fetched
+        :param type: The type of the ids as found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :param str method: The lookup to prefetch, one of get_transcript_information, get_transcript_sequence and
+                           get_product_sequence
+        :raises ValueError: If method is not a cached lookup
+        """
+        if method not in _BATCH_METHODS:
+            raise ValueError("%s is not a cached lookup" % method)
+        kwargs = {} if type is None else {"type": type}
+        args = self.__args(kwargs)
+
+        missing = [i for i in set(ids) if (method, i, args) not in self.__lru]
+        for i, value in self.__load(method, missing, args).iteritems():
+            self.__remember((method, i, args), value)
+        missing = [i for i in missing if (method, i, args) not in self.__lru]
+        if not missing:
+            return
+
+        batch = getattr(self.adapter, _BATCH_METHODS[method], None)
+        if batch is not None:
+            found = batch(missing, **kwargs)
+        else:
+            logging.info("%s has no batch lookup, prefetching one by one" % self.adapter.__class__.__name__)
+            fetch = getattr(self.adapter, method)
+            found = dict((i, fetch(i, **kwargs)) for i in missing)
+        rows = [((method, i, args), found[i]) for i in missing if found.get(i) is not None]
+        self.misses += len(missing)
+        for key, value in rows:
+            self.__remember(key, value)
+        self.__store(rows)
+
+    def clear(self):
+        """
+        Empties the in-memory cache (the SQLite cache is kept)
+        """
+        self.__lru.clear()
+
+    def close(self):
+        """
+        Closes the SQLite cache
+        """
+        if self.__db is not None:
+            self.__db.close()
+            self.__db = None
@@ -8,16 +8,43 @@ import logging
 import bisect
 
 from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from Fred2.IO.SuffixArray import SuffixArray
+from Fred2.IO.AhoCorasick import AhoCorasick
+from Fred2.IO.SequenceIndex import CompactCollection, save_sequence_index, load_sequence_index
 from Fred2.IO.ADBAdapter import ADBAdapter, EAdapterFields, EIdentifierTypes
 
 
+# number of queries from which on search_all streams the searchstring once through an Aho-Corasick automaton
+# instead of scanning it once per query
+_BATCH_SEARCH_MIN = 500
+
+
+def _offsets(seqs):
+    """
+    Returns the start positions of the given sequences in their '#' separated concatenation, followed by the length
+    of the concatenation + 1
+
+    :param list(str) seqs: The sequences
+    :return: The offsets
+    :rtype: list(int)
+    """
+    idx = [0]
+    for seq in seqs:
+        idx.append(idx[-1] + len(seq) + 1)
+    return idx
+
+
 class EnsemblDB(ADBAdapter):
-    def __init__(self, name='fdb'):
+    def __init__(self, name='fdb', compact=False):
         """
         EnsembleDB class to give quick access to entries (fast exact match searches) and convenient ways to produce
         combined fasta files. Search is done with python's fast search  based on a mix between boyer-moore and horspool
         (http://svn.python.org/view/python/trunk/Objects/stringlib/fastsearch.h?revision=68811&view=markup)
         :param name: a name for the EnsembleDB object
+        :param bool compact: If True, only the concatenated sequences (searchstring), their offsets, accessions and
+                             fasta headers are kept instead of all biopython seq records. The collection is then a
+                             read-only :class:`~Fred2.IO.SequenceIndex.CompactCollection` creating records on access.
         Usage:
             import EnsembleDB
             db = EnsembleDB.EnsembleDB('Ensemble') #give it a name
@@ -29,10 +56,12 @@ class EnsemblDB(ADBAdapter):
             db.read_seqs(d)
         """
         self.name = name
+        self.compact = compact
         self.collection = {}  # all the biopython seq records in a dict keyed by the id of the record
         self.searchstring = ''  # all sequences concatenated with a '#'
         self.accs = list()  # all accessions in respective order to searchstring
         self.idx = list()  # all indices of starting strings in the searchstring in respective order
+        self.suffix_array = None  # optional SuffixArray of the searchstring
         self.ensg2enst = dict()
         self.ensg2ensp = dict()
         self.enst2ensg = dict()
@@ -40,46 +69,72 @@ class EnsemblDB(ADBAdapter):
         self.ensp2ensg = dict()
         self.ensp2enst = dict()
 
-    def read_seqs(self, sequence_file):
+    def read_seqs(self, sequence_file, suffix_array=False):
         """
         read sequences from Ensemble protein files (.fasta) or from lists or dicts of BioPython SeqRecords
         and make them available for fast search. Appending also with this function.
         :param sequence_file: Ensembl files (.dat or .fasta)
+        :param bool suffix_array: If True, a :class:`~Fred2.IO.SuffixArray.SuffixArray` of all sequences is built
+                                  which speeds up :meth:`exists`, :meth:`search` and :meth:`search_all` from a linear
+                                  scan to a binary search per query (it is kept up to date on subsequent calls)
         :return:
         """
         recs = sequence_file
-        if not isinstance(sequence_file, dict) and not isinstance(sequence_file, list):
+        is_file = not isinstance(sequence_file, dict) and not isinstance(sequence_file, list)
+        if is_file and self.compact:
+            # records are packed one by one, no biopython seq records of the whole file are held at once
             try:
                 with open(sequence_file, 'rb') as f:
                     if sequence_file.endswith('.fa') or sequence_file.endswith('.fasta'):
-                        recs = SeqIO.to_dict(SeqIO.parse(f, "fasta"))
+                        entries = self.__update_compact((title.split(None, 1)[0] if title else "", seq, title)
+                                                        for title, seq in SimpleFastaParser(f))
                     else:  # assume it is a dat file
-                        recs = SeqIO.to_dict(SeqIO.parse(open(sequence_file), 'swiss'))
+                        entries = self.__update_compact((r.id, str(r.seq), r.description)
+                                                        for r in SeqIO.parse(f, 'swiss'))
             except:
                 logging.warn("Could not read file", UserWarning)
                 return
-        if isinstance(sequence_file, list):
-            recs = SeqIO.to_dict(sequence_file)
-        if recs:
-            self.collection.update(recs)
-            self.searchstring = '#'.join([str(x.seq) for x in self.collection.values()]).decode('ascii')
-            self.accs = self.collection.keys()
-            self.idx = list()
-            self.idx.append(0)
-            for i, v in enumerate(self.collection.values()):
-                self.idx.append(1 + self.idx[-1] + len(self.collection.values()[i].seq))
-
-            for i in recs.items():
+        else:
+            if is_file:
+                try:
+                    with open(sequence_file, 'rb') as f:
+                        if sequence_file.endswith('.fa') or sequence_file.endswith('.fasta'):
+                            recs = SeqIO.to_dict(SeqIO.parse(f, "fasta"))
+                        else:  # assume it is a dat file
+                            recs = SeqIO.to_dict(SeqIO.parse(open(sequence_file), 'swiss'))
+                except:
+                    logging.warn("Could not read file", UserWarning)
+                    return
+            if isinstance(sequence_file, list):
+                recs = SeqIO.to_dict(sequence_file)
+            if not recs:
+                return
+            if self.compact:
+                entries = self.__update_compact((acc, str(rec.seq), rec.description) for acc, rec in recs.iteritems())
+            else:
+                if isinstance(self.collection, CompactCollection):
+                    self.collection = dict(self.collection.iteritems())
+                self.collection.update(recs)
+                seqs = [str(x.seq) for x in self.collection.itervalues()]
+                self.searchstring = '#'.join(seqs).decode('ascii')
+                self.accs = self.collection.keys()
+                self.idx = _offsets(seqs)
+                entries = [(acc, rec.description) for acc, rec in recs.iteritems()]
+        if entries:
+            if suffix_array or self.suffix_array is not None:
+                self.suffix_array = SuffixArray(self.searchstring)
+
+            for acc, description in entries:
                 ensg = None
                 enst = None
                 ensp = None
-                if i[0].startswith('ENSG'):
-                    ensg = i[0]
-                elif i[0].startswith('ENST'):
-                    enst = i[0]
-                elif i[0].startswith('ENSP'):
-                    ensp = i[0]
-                ks = i[1].description.split(' ')
+                if acc.startswith('ENSG'):
+                    ensg = acc
+                elif acc.startswith('ENST'):
+                    enst = acc
+                elif acc.startswith('ENSP'):
+                    ensp = acc
+                ks = description.split(' ')
                 for j in ks:
                     if j.startswith('transcript:'):
                         enst = j.strip('transcript:')
@@ -104,6 +159,55 @@ class EnsemblDB(ADBAdapter):
                     logging.warn("Unparsable filecontents", UserWarning)
         return
 
+    def __update_compact(self, recs):
+        """
+        Merges the given records into the compact storage (see compact parameter of
+        :class:`~Fred2.IO.EnsemblAdapter.EnsemblDB`), records of already contained accessions are replaced. The
+        records are consumed one by one, the storage is only replaced once all of them were read.
+
+        :param recs: The accession, sequence and description of each record
+        :type recs: iterable((str,str,str))
+        :return: The accession and description of each given record
+        :rtype: list((str,str))
+        :raises ValueError: If an accession occurs twice in recs
+        """
+        if isinstance(self.collection, CompactCollection):
+            seqs = [self.collection.get_sequence(acc) for acc in self.accs]
+            descriptions = list(self.collection.descriptions)
+        else:
+            seqs = [str(self.collection[acc].seq) for acc in self.accs]
+            descriptions = [self.collection[acc].description for acc in self.accs]
+        accs = list(self.accs)
+        pos = dict((acc, i) for i, acc in enumerate(accs))
+        entries = []
+        read = set()
+        for acc, seq, description in recs:
+            # like SeqIO.to_dict for the non-compact storage
+            if acc in read:
+                raise ValueError("Duplicate key '%s'" % acc)
+            read.add(acc)
+            entries.append((acc, description))
+            if acc in pos:
+                seqs[pos[acc]] = seq
+                descriptions[pos[acc]] = description
+            else:
+                pos[acc] = len(accs)
+                accs.append(acc)
+                seqs.append(seq)
+                descriptions.append(description)
+        if not entries:
+            return entries
+        self.searchstring = '#'.join(seqs)
+        self.accs = accs
+        self.idx = _offsets(seqs)
+        self.collection = CompactCollection(self.searchstring, self.idx, accs, descriptions)
+        return entries
+
+    def __get_seq(self, acc):
+        if isinstance(self.collection, CompactCollection):
+            return self.collection.get_sequence(acc)
+        return str(self.collection[acc].seq)
+
     def map_enst(self, enst):
         """
         looks up enst from the mapping and returns a ensg and a ensp
@@ -155,7 +259,7 @@ class EnsemblDB(ADBAdapter):
                 return None
 
         if transcript_id in self.collection:
-            return str(self.collection[transcript_id].seq)
+            return self.__get_seq(transcript_id)
         else:
             return None
 
@@ -199,7 +303,7 @@ class EnsemblDB(ADBAdapter):
                 return None
 
         if transcript_id in self.collection:
-            return {EAdapterFields.SEQ: str(self.collection[transcript_id].seq),
+            return {EAdapterFields.SEQ: self.__get_seq(transcript_id),
                     EAdapterFields.GENE: self.collection[transcript_id].description.split('gene:')[1].split(' ')[0],
                     EAdapterFields.STRAND: "-" if
                     int(self.collection[transcript_id].description.split('chromosome:')[1].split(' ')[0].split(':')[-1])
@@ -207,6 +311,39 @@ class EnsemblDB(ADBAdapter):
         else:
             return None
 
+    def save_index(self, path):
+        """
+        Stores the concatenated sequences, offsets, accessions, fasta headers, id mappings and the suffix array (if
+        built) in the directory path, to be loaded by :meth:`load_index` instead of parsing the sequence files again
+
+        :param str path: The directory to write the index to
+        """
+        if isinstance(self.collection, CompactCollection):
+            descriptions = self.collection.descriptions
+        else:
+            descriptions = [self.collection[acc].description for acc in self.accs]
+        save_sequence_index(path, self.searchstring, self.idx, self.accs, descriptions, self.suffix_array,
+                            ensg2enst=self.ensg2enst, ensg2ensp=self.ensg2ensp, enst2ensg=self.enst2ensg,
+                            enst2ensp=self.enst2ensp, ensp2ensg=self.ensp2ensg, ensp2enst=self.ensp2enst)
+
+    def load_index(self, path):
+        """
+        Loads an index stored with :meth:`~Fred2.IO.EnsemblAdapter.EnsemblDB.save_index`. The sequences are
+        memory-mapped instead of read, so loading is near-instant and the memory is shared between processes using the
+        same index. Sequences appended later on with :meth:`read_seqs` are held in memory.
+
+        :param str path: The directory of the index
+        :raises IOError: If path does not contain an index
+        """
+        index = load_sequence_index(path)
+        self.searchstring = index["searchstring"]
+        self.idx = index["idx"]
+        self.accs = index["accs"]
+        self.collection = index["collection"]
+        self.suffix_array = index["suffix_array"]
+        for mapping in ("ensg2enst", "ensg2ensp", "enst2ensg", "enst2ensp", "ensp2ensg", "ensp2enst"):
+            setattr(self, mapping, index[mapping])
+
     def write_seqs(self, name):
         """
             Writes all fasta entries in the current object into one fasta file
@@ -216,6 +353,55 @@ class EnsemblDB(ADBAdapter):
         with open(name, "w") as output:
             SeqIO.write(self.collection.values(), output, "fasta")
 
+    def _find(self, seq):
+        """
+        Returns the position of the first occurrence of seq in the searchstring (using the suffix array if present)
+
+        :param str seq: The sequence to search for
+        :return: The position or -1 if seq does not occur
+        :rtype: int
+        """
+        if self.suffix_array is not None:
+            return self.suffix_array.find(seq)
+        return self.searchstring.find(seq)
+
+    def _find_all(self, seq):
+        """
+        Returns the positions of all non-overlapping occurrences of seq in the searchstring (using the suffix array if
+        present)
+
+        :param str seq: The sequence to search for
+        :return: The positions in ascending order
+        :rtype: list(int)
+        """
+        positions = []
+        if self.suffix_array is not None:
+            for index in self.suffix_array.find_all(seq):
+                if not positions or index >= positions[-1] + len(seq):
+                    positions.append(index)
+            return positions
+        index = 0
+        while index < len(self.searchstring):
+            index = self.searchstring.find(seq, index)
+            if index == -1:
+                break
+            positions.append(index)
+            index += len(seq)
+        return positions
+
+    def _find_all_batch(self, seqs):
+        """
+        Returns the positions of all non-overlapping occurrences of each of the given sequences in the searchstring
+        with a single pass of an :class:`~Fred2.IO.AhoCorasick.AhoCorasick` automaton over the searchstring
+
+        :param list(str) seqs: The sequences to search for
+        :return: A list of positions in ascending order for each sequence
+        :rtype: list(list(int))
+        """
+        queries = [v for v in seqs if v]
+        found = dict(zip(queries, AhoCorasick(queries).find_all(self.searchstring))) if queries else {}
+        return [found.get(v, []) if v else self._find_all(v) for v in seqs]
+
     def exists(self, seq):
         """
             Fast check if given sequence exists (as subsequence) in one of the EnsembleDB objects collection of
@@ -226,7 +412,7 @@ class EnsemblDB(ADBAdapter):
             :rtype: bool
             """
         if isinstance(seq, str):
-            index = self.searchstring.find(seq)
+            index = self._find(seq)
             if index >= 0:
                 return True
             else:
@@ -244,7 +430,7 @@ class EnsemblDB(ADBAdapter):
         """
         if isinstance(seq, str):
             ids = 'null'
-            index = self.searchstring.find(seq)
+            index = self._find(seq)
             if index >= 0:
                 j = bisect.bisect(self.idx, index) - 1
                 ids = self.accs[j]
@@ -254,7 +440,7 @@ class EnsemblDB(ADBAdapter):
             for i in seq:
                 ids.append('null')
             for i, v in enumerate(seq):
-                index = self.searchstring.find(v)
+                index = self._find(v)
                 if index >= 0:
                     j = bisect.bisect(self.idx, index) - 1
                     ids[i] = self.accs[j]
@@ -264,7 +450,8 @@ class EnsemblDB(ADBAdapter):
     def search_all(self, seq):
         """
             Search for all occurrences of given sequence(s) in the EnsembleDB objects collection returning (each) the
-            fasta header front part of all occurrences.
+            fasta header front part of all occurrences. Large lists of sequences are searched with a single pass
+            over the collection.
 
             :param str seq: A string interpreted as a single sequence or a list (of str) interpreted as a coll. of
                             sequences
@@ -273,35 +460,27 @@ class EnsemblDB(ADBAdapter):
             """
         if isinstance(seq, str):
             ids = 'null'
-            index = 0
-            searchstring_length = len(seq)
-            while index < len(self.searchstring):
-                index = self.searchstring.find(seq, index)
-                if index == -1:
-                    break
+            for index in self._find_all(seq):
                 j = bisect.bisect(self.idx, index) - 1
                 if ids == 'null':
                     ids = self.accs[j]
                 else:
                     ids = ids + ',' + self.accs[j]
-                index += searchstring_length
             return {seq: ids}
         if isinstance(seq, list):
             ids = list()
             for i in seq:
                 ids.append('null')
+            if self.suffix_array is None and len(seq) >= _BATCH_SEARCH_MIN:
+                hits = self._find_all_batch(seq)
+            else:
+                hits = [self._find_all(v) for v in seq]
             for i, v in enumerate(seq):
-                index = 0
-                searchstring_length = len(v)
-                while index < len(self.searchstring):
-                    index = self.searchstring.find(v, index)
-                    if index == -1:
-                        break
+                for index in hits[i]:
                     j = bisect.bisect(self.idx, index) - 1
                     if ids[i] == 'null':
                         ids[i] = self.accs[j]
                     else:
                         ids[i] = ids[i] + ',' + self.accs[j]
-                    index += searchstring_length
             return dict(zip(seq, ids))
         return None
\ No newline at end of file
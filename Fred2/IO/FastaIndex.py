@@ -0,0 +1,270 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: IO.FastaIndex
+   :synopsis: faidx-style index of fasta files for random access to single sequences of a memory-mapped file
+.. moduleauthor:: walzer, schubert
+"""
+
+import logging
+import mmap
+import os
+from collections import OrderedDict
+
+from Fred2.Core.Protein import Protein
+from Fred2.IO.ADBAdapter import ADBAdapter, EAdapterFields
+
+
+def index_fasta(fasta_file, index_file=None):
+    """
+    Indexes a fasta file like samtools faidx. For each record a tab separated line with the name (the header up to
+    the first whitespace), the sequence length, the byte offset of the sequence, the number of bases per line and
+    the number of bytes per line is written to index_file, hence the index can be exchanged with samtools.
+
+    All sequence lines of a record except the last one must have the same length.
+
+    :param str fasta_file: The fasta file to index
+    :param str index_file: The index file to write, default is fasta_file + '.fai'
+    :return: The (length, offset, line bases, line width) of each record by name in file order
+    :rtype: OrderedDict(str,(int,int,int,int))
+    :raises ValueError: If the line lengths of a record differ or a name occurs twice
+    """
+    entries = OrderedDict()
+    name = None
+    pos = 0
+    with open(fasta_file, "rb") as f:
+        for line in f:
+            if line.startswith(">"):
+                if name is not None:
+                    entries[name] = (length, offset, bases, width)
+                name = line[1:].split(None, 1)[0] if line[1:].strip() else ""
+                if name in entries:
+                    raise ValueError("Duplicated sequence name %s in %s" % (name, fasta_file))
+                offset = pos + len(line)
+                length = bases = width = 0
+                last = False
+            elif name is not None:
+                n = len(line.rstrip("\r\n"))
+                if n:
+                    if last:
+                        raise ValueError("Different line length in sequence %s of %s" % (name, fasta_file))
+                    if not bases:
+                        bases, width = n, len(line)
+                    elif n != bases or len(line) != width:
+                        # only the last line of a record may be shorter
+                        if n > bases:
+                            raise ValueError("Different line length in sequence %s of %s" % (name, fasta_file))
+                        last = True
+                    length += n
+                else:
+                    last = True
+            pos += len(line)
+    if name is not None:
+        entries[name] = (length, offset, bases, width)
+
+    with open(index_file or fasta_file + ".fai", "w") as f:
+        for name, entry in entries.iteritems():
+            f.write("%s\t%i\t%i\t%i\t%i\n" % ((name,) + entry))
+    return entries
+
+
+class FastaIndex(ADBAdapter):
+    """
+    Random access to the sequences of a (multi-GB) fasta file. The file is indexed once with
+    :func:`~Fred2.IO.FastaIndex.index_fasta` (an existing up-to-date .fai file, e.g. of samtools, is reused) and
+    memory-mapped, a sequence is read with a single seek to its computed byte position instead of parsing the file.
+
+    As :class:`~Fred2.IO.ADBAdapter.ADBAdapter` it serves sequences of e.g. Ensembl CDS or peptide fasta files, gene
+    and strand are taken from the Ensembl style header (gene_symbol: or gene: and chromosome:...:strand).
+
+    Usage:
+        fai = FastaIndex("Homo_sapiens.GRCh38.cds.all.fa")
+        prot = fai.get("ENST00000361390", Protein)
+        peps = generate_peptides_from_variants(vars, 9, fai, EIdentifierTypes.ENSEMBL)
+    """
+
+    def __init__(self, fasta_file, index_file=None, id_position=None):
+        """
+        :param str fasta_file: The fasta file
+        :param str index_file: The index file, default is fasta_file + '.fai'. It is created if it does not exist or
+                               is older than fasta_file.
+        :param int id_position: If given, records can also be accessed by the field at this position of their name
+                                counted by | (e.g. 1 for the accession of UniProt names like sp|P01308|INS_HUMAN)
+        :raises ValueError: If the fasta file cannot be indexed
+        """
+        self.fasta_file = fasta_file
+        self.index_file = index_file or fasta_file + ".fai"
+        self.entries = self.__load_index()
+        if self.entries is None:
+            try:
+                self.entries = index_fasta(fasta_file, self.index_file)
+            except IOError:
+                logging.warning("Could not write index %s, the index is kept in memory only" % self.index_file)
+                self.entries = index_fasta(fasta_file, os.devnull)
+        self.__aliases = dict()
+        if id_position is not None:
+            for name in self.entries:
+                try:
+                    self.__aliases.setdefault(name.split("|")[id_position], name)
+                except IndexError:
+                    pass
+        with open(fasta_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                self.__buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.__buf = ""
+
+    def __load_index(self):
+        """
+        Reads the index file if it is at least as recent as the fasta file
+
+        :return: The index or None if it has to be (re)built
+        :rtype: OrderedDict(str,(int,int,int,int))
+        """
+        try:
+            if os.path.getmtime(self.index_file) < os.path.getmtime(self.fasta_file):
+                return None
+            entries = OrderedDict()
+            with open(self.index_file, "r") as f:
+                for line in f:
+                    fields = line.rstrip("\r\n").split("\t")
+                    entries[fields[0]] = tuple(int(x) for x in fields[1:5])
+            return entries
+        except (OSError, IOError, ValueError, IndexError):
+            return None
+
+    def __resolve(self, name):
+        if name in self.entries:
+            return name
+        return self.__aliases.get(name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return self.__resolve(name) is not None
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def close(self):
+        """
+        Closes the memory map of the fasta file
+        """
+        if isinstance(self.__buf, mmap.mmap):
+            self.__buf.close()
+        self.__buf = ""
+
+    def get_sequence(self, name, start=0, end=None):
+        """
+        Returns the sequence (or the part [start:end) of it) of a record. Only the requested bytes are read.
+
+        :param str name: The name (or alias, see id_position) of the record
+        :param int start: The first position (0-based)
+        :param int end: The position after the last one, default is the end of the sequence
+        :return: The sequence as found in the file
+        :rtype: str
+        :raises KeyError: If the name is not contained
+        """
+        key = self.__resolve(name)
+        if key is None:
+            raise KeyError(name)
+        length, offset, bases, width = self.entries[key]
+        end = length if end is None else min(max(end, 0), length)
+        start = min(max(start, 0), end)
+        if start == end:
+            return ""
+        first = offset + start // bases * width + start % bases
+        last = offset + (end - 1) // bases * width + (end - 1) % bases
+        seq = self.__buf[first:last+1]
+        return seq.translate(None, "\r\n") if width != bases else seq
+
+    def get_description(self, name):
+        """
+        Returns the header line (without '>') of a record
+
+        :param str name: The name (or alias, see id_position) of the record
+        :return: The header
+        :rtype: str
+        :raises KeyError: If the name is not contained
+        """
+        key = self.__resolve(name)
+        if key is None:
+            raise KeyError(name)
+        offset = self.entries[key][1]
+        # the header may contain '>' itself, it starts after the last line break before its own one
+        start = self.__buf.rfind("\n>", 0, offset - 1)
+        start = start + 2 if start >= 0 else self.__buf.find(">", 0, offset) + 1
+        return self.__buf[start:offset].rstrip("\r\n")
+
+    def get(self, name, in_type=Protein):
+        """
+        Returns the sequence of a record as Fred2 object, in the same way as
+        :func:`~Fred2.IO.FileReader.read_fasta` creates it
+
+        :param str name: The name (or alias, see id_position) of the record
+        :param in_type: The type to create
+        :type in_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Transcript.Transcript`
+                or :class:`~Fred2.Core.Protein.Protein`
+        :return: The object of the sequence or None if the name is not contained
+        :rtype: :attr:`in_type`
+        """
+        if name not in self:
+            return None
+        seq = self.get_sequence(name).upper()
+        try:
+            return in_type(seq, transcript_id=name)
+        except TypeError:
+            return in_type(seq)
+
+    def get_product_sequence(self, product_id, **kwargs):
+        """
+        Fetches the product (i.e. protein) sequence for the given id
+
+        :param str product_id: The name (or alias) of the record
+        :return: The requested sequence or None if the id is not contained
+        :rtype: str
+        """
+        if product_id not in self:
+            return None
+        return self.get_sequence(product_id).upper().rstrip("*")
+
+    def get_transcript_sequence(self, transcript_id, **kwargs):
+        """
+        Fetches the transcript sequence for the given id
+
+        :param str transcript_id: The name (or alias) of the record
+        :return: The requested sequence or None if the id is not contained
+        :rtype: str
+        """
+        if transcript_id not in self:
+            return None
+        return self.get_sequence(transcript_id).upper()
+
+    def get_transcript_information(self, transcript_id, **kwargs):
+        """
+        Fetches transcript sequence, gene name and strand information for the given id. Gene and strand are parsed
+        from Ensembl style headers, otherwise the gene is empty and the strand is +.
+
+        :param str transcript_id: The name (or alias) of the record
+        :return: Dictionary of the requested keys as in :func:`~Fred2.IO.ADBAdapter.EAdapterFields` or None if the
+                 id is not contained
+        :rtype: dict
+        """
+        if transcript_id not in self:
+            return None
+        gene, strand = "", "+"
+        for field in self.get_description(transcript_id).split():
+            if field.startswith("gene_symbol:"):
+                gene = field[len("gene_symbol:"):]
+            elif field.startswith("gene:") and not gene:
+                gene = field[len("gene:"):]
+            elif field.startswith("chromosome:") and field.endswith(":-1"):
+                strand = "-"
+        return {EAdapterFields.SEQ: self.get_transcript_sequence(transcript_id),
+                EAdapterFields.GENE: gene,
+                EAdapterFields.STRAND: strand}
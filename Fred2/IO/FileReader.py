@@ -10,165 +10,1025 @@
 
 import warnings
 import os
-import re
+import struct
+import sys
+import urllib
+import zlib
+from collections import OrderedDict, deque
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 
+from Bio import bgzf
 from Bio.SeqIO.FastaIO import SimpleFastaParser
 
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.CompactHashSet import CompactHashSet
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Variant import Variant, VariationType, MutationSyntax
 
 
 ####################################
-#       F A S T A  -  R E A D E R
+#       S T R E A M I N G
+####################################
+def _deduplicated(keyed, dedup, chunk_size=100000):
+    """
+    Removes duplicates from a stream of (key, value) pairs, keeping the first occurrence of each key
+
+    :param keyed: The (key, value) pairs
+    :type keyed: iterable((str,object))
+    :param dedup: The strategy: None (no deduplication), "exact" (a set of all keys), "hash" (only the 64 bit hashes
+                  of the keys are stored, a hash collision drops a new key) or an int n (only duplicates among the
+                  last n distinct keys are removed)
+    :type dedup: None or str or int
+    :param int chunk_size: The number of pairs deduplicated at once with the "hash" strategy
+    :return: The pairs of first occurrences
+    :rtype: generator((str,object))
+    :raises ValueError: If the strategy is unknown
+    """
+    if dedup is None:
+        for k, v in keyed:
+            yield k, v
+    elif dedup == "exact":
+        seen = set()
+        for k, v in keyed:
+            if k not in seen:
+                seen.add(k)
+                yield k, v
+    elif dedup == "hash":
+        seen = CompactHashSet()
+        keyed = iter(keyed)
+        chunk = list(islice(keyed, chunk_size))
+        while chunk:
+            first = OrderedDict()
+            for k, v in chunk:
+                first.setdefault(k, v)
+            for k in seen.add_new(first.keys()):
+                yield k, first[k]
+            chunk = list(islice(keyed, chunk_size))
+    elif isinstance(dedup, (int, long)) and not isinstance(dedup, bool) and dedup > 0:
+        recent = OrderedDict()
+        for k, v in keyed:
+            if k in recent:
+                del recent[k]
+                recent[k] = True
+                continue
+            recent[k] = True
+            if len(recent) > dedup:
+                recent.popitem(last=False)
+            yield k, v
+    else:
+        raise ValueError("Unknown deduplication strategy %s" % str(dedup))
+
+
+def _batched(objects, batch_size):
+    """
+    Yields the objects one by one or, if batch_size is given, as lists of at most batch_size objects
+    """
+    if not batch_size:
+        for o in objects:
+            yield o
+        return
+    objects = iter(objects)
+    batch = list(islice(objects, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(objects, batch_size))
+
+
+####################################
+#       C O M P R E S S I O N
 ####################################
-def read_fasta(files, in_type=Peptide, id_position=1):
+_GZIP_MAGIC = "\x1f\x8b"
+# bytes read at once from (non-blocked) gzip files
+_GZIP_READ_SIZE = 1 << 20
+# number of BGZF blocks (at most 64 kB each) decompressed by one task
+_BGZF_BLOCKS_PER_TASK = 64
+
+
+class _LineReader(object):
+    """
+    Minimal read-only text file interface (iteration and readline) over a stream of decompressed chunks
+    """
+
+    def __init__(self, chunks):
+        self.__lines = self.__split(chunks)
+
+    @staticmethod
+    def __split(chunks):
+        # the pieces of an unfinished line are only joined once its end is read, long lines are not copied per chunk
+        pieces = []
+        for chunk in chunks:
+            end = chunk.rfind("\n")
+            if end < 0:
+                pieces.append(chunk)
+                continue
+            pieces.append(chunk[:end])
+            lines = "".join(pieces).split("\n")
+            pieces = [chunk[end+1:]]
+            for line in lines:
+                yield line + "\n"
+        rest = "".join(pieces)
+        if rest:
+            yield rest
+
+    def __iter__(self):
+        return self.__lines
+
+    def readline(self):
+        return next(self.__lines, "")
+
+    def close(self):
+        self.__lines.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _gzip_chunks(name):
+    """
+    Decompresses a gzip file (also of several concatenated members) chunk by chunk
+    """
+    with open(name, "rb") as f:
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = f.read(_GZIP_READ_SIZE)
+        while data:
+            chunk = d.decompress(data)
+            if chunk:
+                yield chunk
+            if d.unused_data:
+                # the next member starts
+                data = d.unused_data
+                tail = d.flush()
+                if tail:
+                    yield tail
+                d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = f.read(_GZIP_READ_SIZE)
+        tail = d.flush()
+        if tail:
+            yield tail
+
+
+def _bgzf_block_size(header, extra):
+    """
+    Returns the total size of a BGZF block or None if the gzip member is no BGZF block
+
+    :param str header: The first 12 bytes of the gzip member
+    :param str extra: The extra field of the gzip member
+    :rtype: int
+    """
+    if not header.startswith(_GZIP_MAGIC) or not ord(header[3]) & 4:
+        return None
+    i = 0
+    while i + 4 <= len(extra):
+        slen = struct.unpack("<H", extra[i+2:i+4])[0]
+        if extra[i:i+2] == "BC" and slen == 2:
+            return struct.unpack("<H", extra[i+4:i+6])[0] + 1
+        i += 4 + slen
+    return None
+
+
+def _bgzf_blocks(name, start=0):
+    """
+    Yields the file offset and the raw deflate data of the blocks of a BGZF file without decompressing them
+
+    :param str name: The file name
+    :param int start: The file offset of the first block to read
+    :raises IOError: If a gzip member of the file is no BGZF block
+    """
+    with open(name, "rb") as f:
+        f.seek(start)
+        header = f.read(12)
+        while len(header) == 12:
+            xlen = struct.unpack("<H", header[10:12])[0]
+            extra = f.read(xlen)
+            size = _bgzf_block_size(header, extra)
+            if size is None:
+                raise IOError("%s is not a valid BGZF file" % name)
+            yield start, f.read(size - 12 - xlen - 8)
+            f.read(8)  # crc32 and uncompressed size
+            start += size
+            header = f.read(12)
+
+
+def _inflate(blocks):
+    return "".join([zlib.decompress(b, -zlib.MAX_WBITS) for b in blocks])
+
+
+def _bgzf_chunks(name, threads=1, start=0):
+    """
+    Decompresses a BGZF file (from the block at file offset start on). As its blocks are independent deflate
+    streams, groups of blocks are decompressed by a pool of threads (zlib releases the GIL), at most 2*threads groups
+    are in flight so memory stays bounded.
+    """
+    blocks = _bgzf_blocks(name, start)
+    tasks = iter(lambda: [b for _, b in islice(blocks, _BGZF_BLOCKS_PER_TASK)], [])
+    if threads <= 1:
+        for task in tasks:
+            yield _inflate(task)
+        return
+    pool = ThreadPool(threads)
+    try:
+        pending = deque(pool.apply_async(_inflate, (t,)) for t in islice(tasks, 2*threads))
+        while pending:
+            chunk = pending.popleft().get()
+            for t in islice(tasks, 1):
+                pending.append(pool.apply_async(_inflate, (t,)))
+            yield chunk
+    finally:
+        pool.terminate()
+
+
+def _compression(name):
+    """
+    Detects the compression of a file from its content
+
+    :param str name: The file name
+    :return: None, "gzip" or "bgzf"
+    :rtype: str
+    """
+    with open(name, "rb") as f:
+        header = f.read(12)
+        extra = f.read(struct.unpack("<H", header[10:12])[0]) if len(header) == 12 else ""
+    if not header.startswith(_GZIP_MAGIC):
+        return None
+    return "bgzf" if _bgzf_block_size(header, extra) is not None else "gzip"
+
+
+def _open_text(name, threads=1):
+    """
+    Opens a plain, gzip or bgzip compressed text file for reading, the compression is detected from the content
+
+    :param str name: The file name
+    :param int threads: The number of threads decompressing the blocks of bgzip files
+    :return: A file-like object supporting iteration over the lines and readline
     """
-    Generator function:
+    compression = _compression(name)
+    if compression is None:
+        return open(name, "r")
+    if compression == "bgzf":
+        return _LineReader(_bgzf_chunks(name, threads))
+    return _LineReader(_gzip_chunks(name))
 
+
+def _check_files(files, error):
+    if isinstance(files, basestring):
+        return [files]
+    if any(not os.path.exists(f) for f in files):
+        raise error("Specified Files do not exist")
+    return files
+
+
+def _fasta_records(name, id_position, threads=1):
+    """
+    Reads the (sequence, id) pairs of a (compressed) fasta file
+    """
+    with _open_text(name, threads) as handle:
+        # iterate over all FASTA entries:
+        for _id, seq in SimpleFastaParser(handle):
+            try:
+                _id = _id.split("|")[id_position]
+            except IndexError:
+                pass
+            yield seq.strip().upper(), _id
+
+
+def _parse_fasta(args):
+    # runs in a worker process, hence module level and returning picklable strings only
+    return list(_fasta_records(*args))
+
+
+def stream_fasta(files, in_type=Peptide, id_position=1, batch_size=None, dedup="exact", processes=None, pool=None,
+                 threads=1):
+    """
+    Streaming version of :func:`~Fred2.IO.FileReader.read_fasta`: the sequences are read one after another and the
+    objects are yielded as soon as they are read (or in batches), so that processing can start on the first batch
+    and memory does not grow with the file size (depending on the deduplication strategy).
+
+    gzip and bgzip compressed files are read transparently, with threads the blocks of bgzip files are decompressed in
+    parallel. With processes, the files are parsed by a pool of worker processes (each file is then held in memory at once),
+    the results are merged in the order of files.
+
+    :param files: A (list) of file names to read in
+    :type files: list(str) or str
+    :param in_type: The type to read in
+    :type in_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Transcript.Transcript`
+                or :class:`~Fred2.Core.Protein.Protein`
+    :param int id_position: the position of the id specified counted by |
+    :param int batch_size: If given, lists of at most batch_size objects are yielded instead of single objects
+    :param dedup: How duplicated sequences are removed: "exact" (all distinct sequences are kept in memory), "hash"
+                  (8 bytes per distinct sequence, a hash collision drops a new sequence), an int n (only duplicates
+                  among the last n distinct sequences are removed, memory is bounded) or None (no deduplication)
+    :type dedup: str or int or None
+    :param int processes: If given (and more than one file is read), the number of processes parsing files in
+                          parallel
+    :param pool: If given, the objects are interned, i.e. the canonical objects of the pool are yielded
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
+    :param int threads: The number of threads decompressing the blocks of a bgzip file
+    :return: A generator of the specified sequence type (or of lists of it) in file order
+    :rtype: generator(:attr:`in_type`) or generator(list(:attr:`in_type`))
+    :raises ValueError: if a file is not readable or the deduplication strategy is unknown
+
+    .. warning::
+
+        With dedup="hash" a sequence whose 64 bit hash collides with the hash of an earlier, different sequence is
+        dropped silently, the result may then be incomplete. Use "exact" or an int if every sequence is required.
+    """
+    files = _check_files(files, ValueError)
+
+    def _records():
+        if processes is None or processes <= 1 or len(files) <= 1:
+            for name in files:
+                for record in _fasta_records(name, id_position, threads):
+                    yield record
+            return
+        pool = Pool(processes)
+        try:
+            for records in pool.imap(_parse_fasta, [(name, id_position) for name in files]):
+                for record in records:
+                    yield record
+        finally:
+            pool.terminate()
+
+    def _objects():
+        for seq, _id in _deduplicated(_records(), dedup, batch_size or 100000):
+            try:
+                obj = in_type(seq, transcript_id=_id)
+            except TypeError:
+                obj = in_type(seq)
+            yield obj if pool is None else pool.intern(obj)
+
+    return _batched(_objects(), batch_size)
+
+
+def stream_lines(files, in_type=Peptide, batch_size=None, dedup="exact", pool=None, threads=1):
+    """
+    Streaming version of :func:`~Fred2.IO.FileReader.read_lines`: the lines are read one after another and the
+    objects are yielded as soon as they are read (or in batches), so that processing can start on the first batch
+    and memory does not grow with the file size (depending on the deduplication strategy).
+
+    gzip and bgzip compressed files are read transparently.
+
+    :param files: a list of strings of absolute file names that are to be read.
+    :type files: list(str) or str
+    :param in_type: Possible in_type are :class:`~Fred2.Core.Peptide.Peptide`, :class:`~Fred2.Core.Protein.Protein`,
+                 :class:`~Fred2.Core.Transcript.Transcript`, and :class:`~Fred2.Core.Allele.Allele`.
+    :type in_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Protein.Protein` or
+                :class:`~Fred2.Core.Transcript.Transcript` or :class:`~Fred2.Core.Allele.Allele`
+    :param int batch_size: If given, lists of at most batch_size objects are yielded instead of single objects
+    :param dedup: How duplicated lines are removed: "exact" (all distinct lines are kept in memory), "hash" (8 bytes
+                  per distinct line, a hash collision drops a new line), an int n (only duplicates among the last n
+                  distinct lines are removed, memory is bounded) or None (no deduplication)
+    :type dedup: str or int or None
+    :param pool: If given, peptides and proteins are interned, i.e. the canonical objects of the pool are yielded
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
+    :param int threads: The number of threads decompressing the blocks of a bgzip file
+    :return: A generator of the specified objects (or of lists of them) in file order
+    :rtype: generator(:attr:`in_type`) or generator(list(:attr:`in_type`))
+    :raises IOError: if a file is not readable
+    :raises ValueError: if the deduplication strategy is unknown
+
+    .. warning::
+
+        With dedup="hash" a line whose 64 bit hash collides with the hash of an earlier, different line is dropped
+        silently, the result may then be incomplete. Use "exact" or an int if every line is required.
+    """
+    files = _check_files(files, IOError)
+
+    def _lines():
+        for name in files:
+            with _open_text(name, threads) as handle:
+                for line in handle:
+                    yield line.strip().upper(), None
+
+    def _objects():
+        for line, _ in _deduplicated(_lines(), dedup, batch_size or 100000):
+            if pool is None:
+                yield in_type(line)
+            elif issubclass(in_type, (Peptide, LightPeptide)):
+                yield pool.peptide(line, peptide_type=in_type)
+            else:
+                yield pool.intern(in_type(line))
+
+    return _batched(_objects(), batch_size)
+
+
+####################################
+#       F A S T A  -  R E A D E R
+####################################
+def read_fasta(files, in_type=Peptide, id_position=1, processes=None, pool=None):
+    """
     Read a (couple of) peptide, protein or rna sequence from a FASTA file.
     User needs to specify the correct type of the underlying sequences. It can
     either be: Peptide, Protein or Transcript (for RNA).
 
+    All sequences are read at once, see :func:`~Fred2.IO.FileReader.stream_fasta` for large files. gzip and bgzip
+    compressed files are read transparently.
+
     :param files: A (list) of file names to read in
     :in_type files: list(str) or str
     :param in_type: The type to read in
     :type in_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Transcript.Transcript`
                 or :class:`~Fred2.Core.Protein.Protein`
     :param int id_position: the position of the id specified counted by |
+    :param int processes: If given (and more than one file is read), the number of processes parsing files in
+                          parallel
+    :param pool: If given, the objects are interned, i.e. the canonical objects of the pool are returned
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
     :returns: a list of the specified sequence type derived from the FASTA file sequences.
     :rtype: (list(:attr:`in_type`))
     :raises ValueError: if a file is not readable
     """
-
-    if isinstance(files, basestring):
-            files = [files]
-    else:
-            if any(not os.path.exists(f) for f in files):
-                raise ValueError("Specified Files do not exist")
-
-    collect = set()
-    # open all specified files:
-    for name in files:
-        with open(name, 'r') as handle:
-            # iterate over all FASTA entries:
-            for _id, seq in SimpleFastaParser(handle):
-                # generate element:
-                try:
-                    _id = _id.split("|")[id_position]
-                except IndexError:
-                   _id = _id
-
-                try:
-                    collect.add(in_type(seq.strip().upper(), transcript_id=_id))
-                except TypeError:
-                    collect.add(in_type(seq.strip().upper()))
-    return list(collect)
+    return list(stream_fasta(files, in_type, id_position, processes=processes, pool=pool))
 
 
 
 ####################################
 #       L I N E  -  R E A D E R
 ####################################
-def read_lines(files, in_type=Peptide):
+def read_lines(files, in_type=Peptide, pool=None):
     """
-    Generator function:
-
     Read a sequence directly from a line. User needs to manually specify the 
     correct type of the underlying data. It can either be:
     Peptide, Protein or Transcript, Allele.
 
+    All lines are read at once, see :func:`~Fred2.IO.FileReader.stream_lines` for large files.
+
     :param files: a list of strings of absolute file names that are to be read.
     :in_type files: list(str) or str
     :param in_type: Possible in_type are :class:`~Fred2.Core.Peptide.Peptide`, :class:`~Fred2.Core.Protein.Protein`,
                  :class:`~Fred2.Core.Transcript.Transcript`, and :class:`~Fred2.Core.Allele.Allele`.
     :type in_type: :class:`~Fred2.Core.Peptide.Peptide` or :class:`~Fred2.Core.Protein.Protein` or
                 :class:`~Fred2.Core.Transcript.Transcript` or :class:`~Fred2.Core.Allele.Allele`
+    :param pool: If given, peptides and proteins are interned, i.e. the canonical objects of the pool are returned
+    :type pool: :class:`~Fred2.Core.SequencePool.SequencePool`
     :returns: A list of the specified objects
     :rtype: (list(:attr:`in_type`))
     :raises IOError: if a file is not readable
     """
-
-    if isinstance(files, basestring):
-            files = [files]
-    else:
-            if any(not os.path.exists(f) for f in files):
-                raise IOError("Specified Files do not exist")
-
-    collect = set()
     #alternative to using strings is like: cf = getattr(Fred2.Core, "Protein"/"Peptide"/"Allele"/...all in core)
-    for name in files:
-        with open(name, 'r') as handle:
-            # iterate over all lines:
-            for line in handle:
-                # generate element:
-                collect.add(in_type(line.strip().upper()))
-
-    return list(collect)
+    return list(stream_lines(files, in_type, pool=pool))
 
 
 #####################################
 #       A N N O V A R  -  R E A D E R
 #####################################
-def read_annovar_exonic(annovar_file, gene_filter=None, experimentalDesig=None):
+_ANNOVAR_TYPES = {('synonymous', 'snv'): VariationType.SNP,
+                  ('nonsynonymous', 'snv'): VariationType.SNP,
+                  ('stoploss', 'snv'): VariationType.SNP,
+                  ('stopgain', 'snv'): VariationType.SNP,
+                  ('nonframeshift', 'deletion'): VariationType.DEL,
+                  ('frameshift', 'deletion'): VariationType.FSDEL,
+                  ('nonframeshift', 'insertion'): VariationType.INS,
+                  ('frameshift', 'insertion'): VariationType.FSINS}
+_DIGITS = "0123456789"
+_NON_DIGITS = "".join(chr(i) for i in xrange(256) if chr(i) not in _DIGITS)
+# number of file segments per process parsed in parallel
+_ANNOVAR_SEGMENTS_PER_PROCESS = 4
+
+
+def _annovar_position(mutation):
+    """
+    Returns the first position of a c. or p. mutation syntax (e.g. 1142 of c.g1142a)
+
+    :param str mutation: The mutation syntax including its c. or p. prefix
+    :return: The 1-based position or None if the syntax contains no position followed by a change
+    :rtype: int
+    """
+    pos = mutation[2:].lstrip(_NON_DIGITS)
+    change = pos.lstrip(_DIGITS)
+    if not change or len(change) == len(pos):
+        return None
+    return int(pos[:len(pos)-len(change)])
+
+
+def _annovar_coding(annotation):
+    """
+    Parses the comma separated gene:transcript:exon:c.:p. annotations of one ANNOVAR line
+
+    :param str annotation: The (lower case) annotation column
+    :return: The :class:`~Fred2.Core.Variant.MutationSyntax` of each transcript
+    :rtype: dict(str,:class:`~Fred2.Core.Variant.MutationSyntax`)
+    """
+    coding = {}
+    for entry in annotation.split(","):
+        fields = entry.strip().split(":")
+        if len(fields) < 5 or not fields[-3].startswith("exon") or not fields[-2].startswith("c.") \
+                or not fields[-1].startswith("p."):
+            continue
+        trans_coding, prot_coding = fields[-2], fields[-1]
+        trans_pos = _annovar_position(trans_coding)
+        prot_start = _annovar_position(prot_coding)
+        if trans_pos is None or prot_start is None:
+            continue
+        nm_id = fields[-4].upper()
+        #internal transcript and protein position start at 0!
+        coding[nm_id] = MutationSyntax(nm_id, trans_pos-1, prot_start-1, trans_coding, prot_coding)
+    return coding
+
+
+def _annovar_variant(line, gene_filter, experimentalDesig):
+    """
+    Creates the :class:`~Fred2.Core.Variant.Variant` of one line of an ANNOVAR exonic_variant_function file
+
+    :return: The variant or None if the line is filtered
+    :rtype: :class:`~Fred2.Core.Variant.Variant`
+    """
+    fields = line.lower().split("\t", 9)
+    if len(fields) < 9:
+        return None
+    mut_id, mut_type, annotation, chrom, genome_start, _, ref, alt, zygos = [f.strip() for f in fields[:9]]
+
+    gene = annotation.split(":")[0].strip().upper()
+    if gene_filter and gene not in gene_filter:
+        return None
+    if gene == "UNKNOWN":
+        warnings.warn("Skipping UNKWON gene")
+        return None
+
+    ty = tuple(mut_type.split())
+    return Variant(mut_id, _ANNOVAR_TYPES.get(ty, VariationType.UNKNOWN), chrom, int(genome_start), ref.upper(),
+                   alt.upper(), _annovar_coding(annotation), zygos == "hom", ty[0] == "synonymous",
+                   experimentalDesign=experimentalDesig)
+
+
+def _parse_annovar_segment(args):
+    """
+    Parses the lines starting in the byte range [start, end) of an ANNOVAR file (runs in a worker process)
+
+    :return: The variants of the segment
+    :rtype: list(:class:`~Fred2.Core.Variant.Variant`)
+    """
+    annovar_file, start, end, gene_filter, experimentalDesig = args
+    variants = []
+    with open(annovar_file, "r") as f:
+        if start:
+            # skip the line started in the previous segment
+            f.seek(start-1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            var = _annovar_variant(line, gene_filter, experimentalDesig)
+            if var is not None:
+                variants.append(var)
+    return variants
+
+
+def stream_annovar_exonic(annovar_file, gene_filter=None, experimentalDesig=None, batch_size=None, processes=None):
+    """
+    Streaming version of :func:`~Fred2.IO.FileReader.read_annovar_exonic`: the variants are yielded as soon as
+    their line is parsed (or in batches), so that memory does not grow with the file size.
+
+    With processes, consecutive segments of the file are parsed by a pool of worker processes, the variants are
+    yielded in file order.
+
+    :param str annovar_file: The path ot the ANNOVAR file
+    :param list(str) gene_filter: A list of gene names of interest (only variants associated with these genes
+                                  are generated)
+    :param int batch_size: If given, lists of at most batch_size variants are yielded instead of single variants
+    :param int processes: If given, the number of processes parsing segments of the file in parallel
+    :return: A generator of :class:`~Fred2.Core.Variant.Variant` (or of lists of them) in file order
+    :rtype: generator(:class:`~Fred2.Core.Variant.Variant`) or generator(list(:class:`~Fred2.Core.Variant.Variant`))
+    """
+    gene_filter = frozenset(gene_filter) if gene_filter else frozenset()
+
+    def _variants():
+        if processes is None or processes <= 1:
+            with open(annovar_file, "r") as f:
+                for line in f:
+                    var = _annovar_variant(line, gene_filter, experimentalDesig)
+                    if var is not None:
+                        yield var
+            return
+        size = os.path.getsize(annovar_file)
+        n = processes * _ANNOVAR_SEGMENTS_PER_PROCESS
+        bounds = [size*i//n for i in xrange(n+1)]
+        pool = Pool(processes)
+        try:
+            for variants in pool.imap(_parse_annovar_segment, [(annovar_file, bounds[i], bounds[i+1], gene_filter,
+                                                                experimentalDesig) for i in xrange(n)]):
+                for var in variants:
+                    yield var
+        finally:
+            pool.terminate()
+
+    return _batched(_variants(), batch_size)
+
+
+def read_annovar_exonic(annovar_file, gene_filter=None, experimentalDesig=None, processes=None):
     """
     Reads an gene-based ANNOVAR output file and generates :class:`~Fred2.Core.Variant.Variant` objects containing
     all annotated :class:`~Fred2.Core.Transcript.Transcript` ids an outputs a list :class:`~Fred2.Core.Variant.Variant`.
 
+    All variants are read at once, see :func:`~Fred2.IO.FileReader.stream_annovar_exonic` for large files.
+
     :param str annovar_file: The path ot the ANNOVAR file
     :param list(str) gene_filter: A list of gene names of interest (only variants associated with these genes
                                   are generated)
+    :param int processes: If given, the number of processes parsing segments of the file in parallel
     :return: List of :class:`~Fred2.Core.Variant.Variants fully annotated
     :rtype: list(:class:`~Fred2.Core.Variant.Variant`)
     """
+    return list(stream_annovar_exonic(annovar_file, gene_filter, experimentalDesig, processes=processes))
+
+
+#####################################
+#       V C F  -  R E A D E R
+#####################################
+# VEP (CSQ) and SnpEff (ANN) names of the used annotation fields
+_VCF_ANNOTATION_FIELDS = {"allele": ("Allele",),
+                          "consequence": ("Consequence", "Annotation"),
+                          "gene": ("SYMBOL", "Gene_Name"),
+                          "transcript": ("Feature", "Feature_ID"),
+                          "cds_pos": ("CDS_position", "CDS.pos/CDS.length"),
+                          "prot_pos": ("Protein_position", "AA.pos/AA.length"),
+                          "hgvsc": ("HGVSc", "HGVS.c"),
+                          "hgvsp": ("HGVSp", "HGVS.p")}
+_TABIX_MAGIC = "TBI\x01"
+# size of the windows of the linear tabix index (16 kb)
+_TABIX_SHIFT = 14
+
+
+def _tabix_bin(beg, end):
+    """
+    Returns the UCSC/tabix bin of the 0-based half-open interval [beg, end)
+    """
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
 
-    vars = []
-    gene_filter = gene_filter if gene_filter is not None else []
-
-    #fgd3:nm_001083536:exon6:c.g823a:p.v275i,fgd3:nm_001286993:exon6:c.g823a:p.v275i,fgd3:nm_033086:exon6:c.g823a:p.v275i
-    #RE = re.compile("\w+:(\w+):exon\d+:c.(\D*)(\d+)_*(\d*)(\D\w*):p.\w+:\D*->\D*:(\D).*?,")
-    #RE = re.compile("\w+:(\w+):exon\d+:c.(\D*)(\d+)_*(\d*)(\D\w*):p.(\D*)(\d+)_*(\d*)(\D\w*):(\D).*?,")
-    RE = re.compile("((\w+):exon\d+:c.\D*(\d+)\D\w*:p.\D*(\d+)\D\w*)")
-    type_mapper = {('synonymous', 'snv'): VariationType.SNP,
-                   ('nonsynonymous', 'snv'): VariationType.SNP,
-                   ('stoploss', 'snv'): VariationType.SNP,
-                   ('stopgain', 'snv'): VariationType.SNP,
-                   ('nonframeshift', 'deletion'): VariationType.DEL,
-                   ('frameshift', 'deletion'): VariationType.FSDEL,
-                   ('nonframeshift', 'insertion'): VariationType.INS,
-                   ('frameshift', 'insertion'): VariationType.FSINS}
-    with open(annovar_file, "r") as f:
-        for line in f:
-            mut_id, mut_type, line, chrom, genome_start, genome_stop, ref, alt, zygos = map(lambda x: x.strip().lower(),
-                                                                                    line.split("\t")[:9])
-            #print ref, alt
 
-            #test if its a intersting snp
+def index_vcf(vcf_file, index_file=None):
+    """
+    Writes a tabix index (.tbi) of a bgzip compressed, position sorted VCF file, equivalent to tabix -p vcf
+
+    :param str vcf_file: The bgzip compressed VCF file
+    :param str index_file: The index file to write, default is vcf_file + '.tbi'
+    :raises IOError: If the file is not bgzip compressed
+    """
+    refs = OrderedDict()
+
+    def _add(line, start, end):
+        if not line or line.startswith("#"):
+            return
+        chrom, pos, _, ref = line.split("\t", 4)[:4]
+        beg = int(pos) - 1
+        stop = beg + max(len(ref), 1)
+        bins, linear = refs.setdefault(chrom, ({}, {}))
+        chunks = bins.setdefault(_tabix_bin(beg, stop), [])
+        if chunks and chunks[-1][1] == start:
+            chunks[-1][1] = end
+        else:
+            chunks.append([start, end])
+        for w in xrange(beg >> _TABIX_SHIFT, ((stop - 1) >> _TABIX_SHIFT) + 1):
+            linear.setdefault(w, start)
+
+    # the virtual offset of a line is the file offset of its block << 16 | its offset in the decompressed block
+    rest, start = "", None
+    for offset, cdata in _bgzf_blocks(vcf_file):
+        data = _inflate([cdata])
+        pos = 0
+        if start is None and data:
+            start = offset << 16
+        while pos < len(data):
+            nl = data.find("\n", pos)
+            if nl < 0:
+                rest += data[pos:]
+                break
+            _add((rest + data[pos:nl]).rstrip("\r"), start, offset << 16 | (nl + 1))
+            rest, pos = "", nl + 1
+            start = offset << 16 | pos if pos < len(data) else None
+    if rest:
+        _add(rest.rstrip("\r"), start, start + len(rest))
+
+    names = "".join(chrom + "\0" for chrom in refs)
+    out = [_TABIX_MAGIC, struct.pack("<8i", len(refs), 2, 1, 2, 0, ord("#"), 0, len(names)), names]
+    for bins, linear in refs.itervalues():
+        out.append(struct.pack("<i", len(bins)))
+        for b in sorted(bins):
+            out.append(struct.pack("<Ii", b, len(bins[b])))
+            out.extend(struct.pack("<QQ", beg, end) for beg, end in bins[b])
+        n = max(linear) + 1 if linear else 0
+        out.append(struct.pack("<i", n))
+        last = linear.get(min(linear)) if linear else 0
+        for w in xrange(n):
+            # windows without records point to the previous record
+            last = linear.get(w, last)
+            out.append(struct.pack("<Q", last))
+    writer = bgzf.BgzfWriter(index_file or vcf_file + ".tbi", "wb")
+    try:
+        writer.write("".join(out))
+    finally:
+        writer.close()
+
+
+def _read_tabix(index_file):
+    """
+    Reads the linear index of a tabix index file
+
+    :param str index_file: The .tbi file
+    :return: The virtual offset of the first record overlapping each 16 kb window by sequence name
+    :rtype: dict(str,list(int))
+    :raises ValueError: If the file is no tabix index
+    """
+    data = "".join(_bgzf_chunks(index_file, 1))
+    if not data.startswith(_TABIX_MAGIC):
+        raise ValueError("%s is not a tabix index" % index_file)
+    n_ref = struct.unpack("<i", data[4:8])[0]
+    l_nm = struct.unpack("<i", data[32:36])[0]
+    names = data[36:36+l_nm].split("\0")[:n_ref]
+    pos = 36 + l_nm
+    linear = {}
+    for name in names:
+        n_bin = struct.unpack("<i", data[pos:pos+4])[0]
+        pos += 4
+        for _ in xrange(n_bin):
+            n_chunk = struct.unpack("<i", data[pos+4:pos+8])[0]
+            pos += 8 + 16*n_chunk
+        n_intv = struct.unpack("<i", data[pos:pos+4])[0]
+        linear[name] = list(struct.unpack("<%iQ" % n_intv, data[pos+4:pos+4+8*n_intv]))
+        pos += 4 + 8*n_intv
+    return linear
+
+
+def _parse_region(region):
+    """
+    Converts a region given as 'chrom', 'chrom:start-end' or (chrom, start, end) (1-based, inclusive)
+
+    :rtype: (str,int,int)
+    """
+    if not isinstance(region, basestring):
+        chrom, start, end = region
+        return chrom, int(start), int(end)
+    chrom, _, span = region.partition(":")
+    if not span:
+        return chrom, 1, sys.maxint
+    start, _, end = span.replace(",", "").partition("-")
+    return chrom, int(start), int(end) if end else sys.maxint
+
+
+def _vcf_position(position):
+    """
+    Returns the first position of an annotated coordinate like 1142, 1142-1143 or 1142/3000
+
+    :param str position: The annotated coordinate
+    :return: The 1-based position or None if position contains none
+    :rtype: int
+    """
+    pos = position.lstrip(_NON_DIGITS)
+    digits = pos[:len(pos)-len(pos.lstrip(_DIGITS))]
+    return int(digits) if digits else None
+
+
+class _VCFParser(object):
+    """
+    Creates the :class:`~Fred2.Core.Variant.Variant` objects of the records of a VCF file, the header lines have to
+    be passed to :meth:`header` first
+    """
+
+    def __init__(self, sample=None, gene_filter=None, experimentalDesig=None):
+        self.sample = sample
+        self.gene_filter = gene_filter
+        self.experimentalDesig = experimentalDesig
+        self.sample_column = None
+        self.annotation = None
+        self.fields = None
+
+    def header(self, line):
+        """
+        Processes a header line
 
-            gene = line.split(":")[0].strip().upper()
+        :param str line: The line
+        :return: True if line was the last header line (#CHROM)
+        :rtype: bool
+        :raises ValueError: If the sample is not contained
+        """
+        if line.startswith("##INFO=<ID=CSQ,") or line.startswith("##INFO=<ID=ANN,"):
+            desc = line.split('Description="', 1)[-1].rsplit('"', 1)[0]
+            desc = desc.split("Format:", 1)[-1] if "Format:" in desc else desc.split(":", 1)[-1]
+            names = [f.replace(" ", "").strip("'") for f in desc.split("|")]
+            self.annotation = line[len("##INFO=<ID="):len("##INFO=<ID=")+3] + "="
+            self.fields = dict((key, next((names.index(n) for n in alternatives if n in names), None))
+                               for key, alternatives in _VCF_ANNOTATION_FIELDS.iteritems())
+        elif line.startswith("#CHROM"):
+            samples = line.rstrip("\r\n").split("\t")[9:]
+            if self.sample is None:
+                self.sample_column = 9 if samples else None
+            elif isinstance(self.sample, (int, long)):
+                if not 0 <= self.sample < len(samples):
+                    raise ValueError("Sample index %i not contained in the VCF file" % self.sample)
+                self.sample_column = 9 + self.sample
+            elif self.sample in samples:
+                self.sample_column = 9 + samples.index(self.sample)
+            else:
+                raise ValueError("Sample %s not contained in the VCF file" % self.sample)
+            return True
+        return False
 
-            if gene not in gene_filter and len(gene_filter):
+    def __annotations(self, info):
+        """
+        Splits the CSQ/ANN INFO field into the used fields of each annotation
+
+        :rtype: list(dict(str,str))
+        """
+        if self.annotation is None:
+            return []
+        for entry in info.split(";"):
+            if entry.startswith(self.annotation):
+                annotations = []
+                for ann in entry[4:].split(","):
+                    values = ann.split("|")
+                    annotations.append(dict((k, values[i] if i is not None and i < len(values) else "")
+                                            for k, i in self.fields.iteritems()))
+                return annotations
+        return []
+
+    def variants(self, line):
+        """
+        Creates the variants of a record (one per alternative allele carried by the sample)
+
+        :param str line: The record
+        :rtype: list(:class:`~Fred2.Core.Variant.Variant`)
+        """
+        columns = line.rstrip("\r\n").split("\t")
+        chrom, pos, vid, ref, alts, info = columns[0], int(columns[1]), columns[2], columns[3], columns[4], columns[7]
+        alts = alts.split(",")
+
+        genotype, carried, ps = None, None, None
+        if self.sample_column is not None and len(columns) > self.sample_column:
+            fmt = columns[8].split(":")
+            values = dict(zip(fmt, columns[self.sample_column].split(":")))
+            genotype = values.get("GT")
+            if genotype is not None:
+                carried = genotype.replace("|", "/").split("/")
+            if values.get("PS", ".") != ".":
+                ps = values["PS"]
+        annotations = self.__annotations(info)
+
+        variants = []
+        for i, alt in enumerate(alts, 1):
+            if alt in (".", "*") or alt.startswith("<") or "[" in alt or "]" in alt:
+                continue
+            if carried is not None and str(i) not in carried:
                 continue
 
-            if gene == "UNKNOWN":
-                warnings.warn("Skipping UNKWON gene")
+            # trim the shared suffix and prefix (VCF anchors indels at the preceding base)
+            r, o, start = ref.upper(), alt.upper(), pos
+            while len(r) > 1 and len(o) > 1 and r[-1] == o[-1]:
+                r, o = r[:-1], o[:-1]
+            while r and o and r[0] == o[0]:
+                r, o, start = r[1:], o[1:], start + 1
+            if len(r) == 1 and len(o) == 1:
+                ty = VariationType.SNP
+            elif not r:
+                ty = VariationType.INS if len(o) % 3 == 0 else VariationType.FSINS
+            elif not o:
+                ty = VariationType.DEL if len(r) % 3 == 0 else VariationType.FSDEL
+            else:
+                ty = VariationType.UNKNOWN
+
+            coding, genes, synonymous = {}, [], True
+            for ann in annotations:
+                if len(alts) > 1 and ann["allele"] not in (alt, o or "-"):
+                    continue
+                trans_pos, prot_pos = _vcf_position(ann["cds_pos"]), _vcf_position(ann["prot_pos"])
+                if ann["gene"] and ann["gene"] not in genes:
+                    genes.append(ann["gene"])
+                if not ann["transcript"] or trans_pos is None:
+                    continue
+                synonymous &= "synonymous_variant" in ann["consequence"].split("&")
+                # an insertion is placed behind the first given position, the protein position is None if it is
+                # not annotated. VEP percent-encodes HGVS notations (e.g. p.Thr281%3D)
+                coding[ann["transcript"]] = MutationSyntax(ann["transcript"],
+                                                           trans_pos if not r else trans_pos - 1,
+                                                           prot_pos - 1 if prot_pos is not None else None,
+                                                           urllib.unquote(ann["hgvsc"].split(":")[-1]),
+                                                           urllib.unquote(ann["hgvsp"].split(":")[-1]))
+            if self.gene_filter and not self.gene_filter.intersection(genes):
                 continue
 
-           # print "Debug ", gene, type.split(),mut_id
-            #print "Debug ", line, RE.findall(line), type, zygos
-            coding = {}
-            for nm_id_pos in RE.findall(line):
-                mutation_string, nm_id, trans_pos, prot_start = nm_id_pos
-                #print "Debug ",nm_id_pos
-
-                nm_id = nm_id.upper()
-                _, _, trans_coding, prot_coding = mutation_string.split(":")
-                #internal transcript and protein position start at 0!
-                coding[nm_id] = MutationSyntax(nm_id, int(trans_pos)-1, int(prot_start)-1, trans_coding, prot_coding)
-
-            ty = tuple(mut_type.split())
-
-            vars.append(
-                Variant(mut_id, type_mapper.get(ty, VariationType.UNKNOWN), chrom, int(genome_start), ref.upper(),
-                        alt.upper(), coding, zygos == "hom", ty[0] == "synonymous",
-                        experimentalDesign=experimentalDesig))
-    return vars
+            meta = {"genotype": genotype, "phased": genotype is not None and "|" in genotype}
+            if ps is not None:
+                meta["phase_set"] = ps
+            var = Variant(vid if vid != "." else "%s:%i:%s>%s" % (chrom, pos, ref, alt), ty, chrom, start, r, o,
+                          coding, carried is not None and all(a == str(i) for a in carried),
+                          bool(coding) and synonymous, experimentalDesign=self.experimentalDesig, metadata=meta)
+            var.gene = genes[0] if genes else None
+            variants.append(var)
+        return variants
+
+
+def stream_vcf(vcf_file, sample=None, gene_filter=None, experimentalDesig=None, region=None, index_file=None,
+               batch_size=None, threads=1):
+    """
+    Reads a plain, gzip or bgzip compressed VCF file and yields :class:`~Fred2.Core.Variant.Variant` objects as soon
+    as their record is read (or in batches), so that memory stays bounded also for whole-genome files.
+
+    One variant is created per alternative allele carried by the sample: isHomozygous is derived from the genotype
+    (GT), which is also logged as metadata 'genotype' together with 'phased' and the phase set 'phase_set' (PS).
+    The shared prefix and suffix of the REF and ALT alleles are removed: genomePos is the first changed base and the
+    missing allele of an indel is an empty string (e.g. ref 'G', obs '' for a deletion, whereas
+    :func:`~Fred2.IO.FileReader.read_annovar_exonic` keeps ANNOVAR's '-').
+
+    The transcript coordinates (:class:`~Fred2.Core.Variant.MutationSyntax`) are taken from VEP (CSQ) or SnpEff
+    (ANN) annotations, records without coding annotation yield variants without transcripts. tranPos is the 0-based
+    position of the first changed base, for insertions the 0-based position of the base following the insertion
+    (the ANNOVAR readers use the preceding base instead), protPos the 0-based protein position or None if it is not
+    annotated.
+
+    If a region is given and the file is bgzip compressed with a tabix index (vcf_file + '.tbi', see
+    :func:`~Fred2.IO.FileReader.index_vcf`), reading starts at the first block of the region, otherwise the file is
+    scanned.
+
+    :param str vcf_file: The VCF file
+    :param sample: The name or the 0-based index of the sample whose genotypes are used, default is the first one.
+                   Without sample columns all alternative alleles are used.
+    :type sample: str or int
+    :param list(str) gene_filter: A list of gene names of interest (only variants annotated with these genes are
+                                  generated)
+    :param str experimentalDesig: The experimental design of the variants
+    :param region: Only variants overlapping this region are generated: 'chrom', 'chrom:start-end' or
+                   (chrom, start, end), 1-based inclusive
+    :type region: str or (str,int,int)
+    :param str index_file: The tabix index, default is vcf_file + '.tbi'
+    :param int batch_size: If given, lists of at most batch_size variants are yielded instead of single variants
+    :param int threads: The number of threads decompressing bgzip blocks
+    :return: A generator of :class:`~Fred2.Core.Variant.Variant` (or of lists of them) in file order
+    :rtype: generator(:class:`~Fred2.Core.Variant.Variant`) or generator(list(:class:`~Fred2.Core.Variant.Variant`))
+    :raises IOError: If the file is not readable
+    :raises ValueError: If the sample is not contained
+    """
+    parser = _VCFParser(sample, frozenset(gene_filter) if gene_filter else None, experimentalDesig)
+    region = _parse_region(region) if region is not None else None
+    index_file = index_file or vcf_file + ".tbi"
+
+    def _records():
+        indexed = region is not None and os.path.exists(index_file) and _compression(vcf_file) == "bgzf"
+        with _open_text(vcf_file, threads) as handle:
+            for line in handle:
+                if line.startswith("#"):
+                    if parser.header(line) and indexed:
+                        break
+                elif indexed:
+                    break
+                elif line.strip():
+                    yield line
+        if not indexed:
+            return
+        linear = _read_tabix(index_file).get(region[0], [])
+        w = (region[1] - 1) >> _TABIX_SHIFT
+        if w >= len(linear):
+            return
+        voffset = linear[w]
+        chunks = _bgzf_chunks(vcf_file, threads, voffset >> 16)
+        first = next(chunks, "")[voffset & 0xFFFF:]
+        with _LineReader(c for cs in ([first], chunks) for c in cs) as handle:
+            for line in handle:
+                chrom, pos = line.split("\t", 2)[:2]
+                if chrom != region[0] or int(pos) > region[2]:
+                    return
+                yield line
+
+    def _variants():
+        for line in _records():
+            if region is not None:
+                chrom, pos, _, ref = line.split("\t", 4)[:4]
+                if chrom != region[0] or int(pos) > region[2] or int(pos) + len(ref) - 1 < region[1]:
+                    continue
+            for var in parser.variants(line):
+                yield var
+
+    return _batched(_variants(), batch_size)
+
+
+def read_vcf(vcf_file, sample=None, gene_filter=None, experimentalDesig=None, region=None, index_file=None):
+    """
+    Reads a plain, gzip or bgzip compressed VCF file and generates a :class:`~Fred2.Core.Variant.Variant` per
+    alternative allele carried by the sample, annotated with the transcripts of its VEP (CSQ) or SnpEff (ANN)
+    annotation.
+
+    All variants are read at once, see :func:`~Fred2.IO.FileReader.stream_vcf` for the details and large files.
+
+    :param str vcf_file: The VCF file
+    :param sample: The name or the 0-based index of the sample whose genotypes are used, default is the first one
+    :type sample: str or int
+    :param list(str) gene_filter: A list of gene names of interest (only variants annotated with these genes are
+                                  generated)
+    :param str experimentalDesig: The experimental design of the variants
+    :param region: Only variants overlapping this region are generated: 'chrom', 'chrom:start-end' or
+                   (chrom, start, end), 1-based inclusive
+    :type region: str or (str,int,int)
+    :param str index_file: The tabix index, default is vcf_file + '.tbi'
+    :return: List of :class:`~Fred2.Core.Variant.Variant`
+    :rtype: list(:class:`~Fred2.Core.Variant.Variant`)
+    """
+    return list(stream_vcf(vcf_file, sample, gene_filter, experimentalDesig, region, index_file))
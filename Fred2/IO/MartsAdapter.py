@@ -7,34 +7,210 @@
 .. moduleauthor:: walzer, schubert
 """
 
+import base64
 import csv
+import httplib
+import Queue
+import socket
+import sys
+import threading
+import time
+import urllib
 import urllib2
+import urlparse
 import warnings
 import logging
 import MySQLdb
+import MySQLdb.cursors
+from multiprocessing.pool import ThreadPool
 from operator import itemgetter
 
 from Fred2.IO.ADBAdapter import ADBAdapter, EAdapterFields, EIdentifierTypes
 
+# maximal number of ids and maximal (quoted) length of the comma separated ids sent in one BioMart query
+_BATCH_SIZE = 250
+_MAX_FILTER_LENGTH = 6000
+# maximal number of ids per SQL IN list and number of rows fetched at once from the database
+_SQL_BATCH_SIZE = 500
+_SQL_FETCH_SIZE = 1000
+
+# HTTP status codes of transient server failures, requests failing with these are retried
+_TRANSIENT_STATUS = frozenset([500, 502, 503, 504])
+# HTTP status codes of redirects and the maximal number of redirects followed by one request
+_REDIRECT_STATUS = frozenset([301, 302, 303, 307, 308])
+_MAX_REDIRECTS = 5
+
+_TRANSCRIPT_FILTERS = {EIdentifierTypes.REFSEQ: "refseq_mrna",
+                       EIdentifierTypes.PREDREFSEQ: "refseq_mrna_predicted",
+                       EIdentifierTypes.ENSEMBL: "ensembl_transcript_id"}
+_PRODUCT_FILTERS = {EIdentifierTypes.REFSEQ: "refseq_peptide",
+                    EIdentifierTypes.PREDREFSEQ: "refseq_peptide_predicted",
+                    EIdentifierTypes.ENSEMBL: "ensembl_peptide_id"}
+
+
+class _Redirect(Exception):
+    """
+    Raised by :meth:`_ConnectionPool.get` if the service redirects a request, url is the absolute target
+    """
+
+    def __init__(self, url):
+        Exception.__init__(self, url)
+        self.url = url
+
+
+class _ConnectionPool(object):
+    """
+    Bounded pool of persistent (keep-alive) HTTP connections to the host of a BioMart service. At most size requests
+    are sent at the same time, further requests wait for a free connection.
+
+    The proxies of the environment (http_proxy, https_proxy and no_proxy, see :func:`urllib.getproxies`) are used,
+    https requests are tunneled through the proxy with CONNECT.
+    """
+
+    def __init__(self, url, size, retries, backoff, timeout=None):
+        """
+        :param str url: The query url of the service (up to and including "query=")
+        :param int size: The maximal number of connections
+        :param int retries: The number of retries of a request failing with a transient error
+        :param float backoff: The wait before the first retry in seconds, doubled with each further retry
+        :param float timeout: The socket timeout in seconds
+        """
+        parts = urlparse.urlsplit(url)
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.__cls = httplib.HTTPSConnection if parts.scheme == "https" else httplib.HTTPConnection
+        self.__netloc = parts.netloc
+        self.__prefix = url[url.index(parts.netloc) + len(parts.netloc):] or "/"
+        self.__headers = dict()
+        self.__tunnel = None
+        proxy = urllib.getproxies().get(parts.scheme)
+        if proxy and not urllib.proxy_bypass(parts.hostname):
+            proxy = urlparse.urlsplit(proxy if "://" in proxy else "http://" + proxy)
+            self.__netloc = proxy.hostname + (":%i" % proxy.port if proxy.port else "")
+            if proxy.username:
+                self.__headers["Proxy-Authorization"] = "Basic " + base64.b64encode(
+                    urllib.unquote(proxy.username) + ":" + urllib.unquote(proxy.password or ""))
+            if parts.scheme == "https":
+                self.__tunnel = (parts.hostname, parts.port)
+            else:
+                # a http proxy gets the absolute url
+                self.__prefix = "http://" + parts.netloc + self.__prefix
+        self.__connections = Queue.Queue()
+        for _ in xrange(size):
+            self.__connections.put(None)
+
+    def get(self, query):
+        """
+        Sends a GET request, retrying with exponential backoff on connection errors and transient server errors
+
+        :param str query: The (already quoted) query appended to the url
+        :return: The body of the response
+        :rtype: str
+        :raises _Redirect: If the service redirects the request
+        :raises urllib2.HTTPError: If the service answers with an error status
+        :raises urllib2.URLError: If the service cannot be reached
+        """
+        conn = self.__connections.get()
+        try:
+            attempt = 0
+            while True:
+                # a kept-alive connection may have been closed by the server meanwhile, this is not counted as failure
+                reused = conn is not None
+                if conn is None:
+                    conn = self.__cls(self.__netloc, timeout=self.timeout)
+                    if self.__tunnel is not None:
+                        conn.set_tunnel(self.__tunnel[0], self.__tunnel[1], self.__headers)
+                try:
+                    conn.request("GET", self.__prefix + query, headers={} if self.__tunnel else self.__headers)
+                    resp = conn.getresponse()
+                    body = resp.read()
+                    if resp.status == 200:
+                        return body
+                    if resp.status in _REDIRECT_STATUS and resp.getheader("location"):
+                        raise _Redirect(urlparse.urljoin(self.url + query, resp.getheader("location")))
+                    error = urllib2.HTTPError(self.url + query, resp.status, resp.reason, resp.msg, None)
+                    if resp.status not in _TRANSIENT_STATUS:
+                        raise error
+                except socket.gaierror as e:
+                    # unknown host, retrying does not help
+                    conn.close()
+                    conn = None
+                    raise urllib2.URLError(e)
+                except (socket.error, httplib.HTTPException) as e:
+                    conn.close()
+                    conn = None
+                    if reused:
+                        continue
+                    error = urllib2.URLError(e)
+                if attempt >= self.retries:
+                    raise error
+                logging.warning("BioMart request failed (%s), retrying" % error)
+                time.sleep(self.backoff * 2**attempt)
+                attempt += 1
+        finally:
+            self.__connections.put(conn)
+
 
 class MartsAdapter(ADBAdapter):
-    def __init__(self, usr=None, host=None, pwd=None, db=None, biomart=None):
+    def __init__(self, usr=None, host=None, pwd=None, db=None, biomart=None, max_connections=4, retries=3,
+                 backoff=1.0, timeout=None, connection=None, use_sql=False, sql_queries=None):
         """
         Used to fetch sequences from given RefSeq id's either from BioMart if no credentials given else from a MySQLdb
 
+        BioMart queries are sent over at most max_connections persistent connections, independent queries (e.g. the
+        chunks of a batch lookup) are sent in parallel.
+
+        The database is only queried if use_sql is True, otherwise all lookups are sent to BioMart. The schema of the
+        database has to be described by sql_queries, which maps "transcript" and "product" to dicts of
+        :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes` and queries with one %s for the IN list of ids, e.g.:
+
+            {"transcript": {EIdentifierTypes.REFSEQ:
+                                "SELECT id, sequence, gene, strand FROM transcripts WHERE id IN (%s)"},
+             "product": {EIdentifierTypes.REFSEQ: "SELECT id, sequence FROM products WHERE id IN (%s)"}}
+
+        Transcript queries return id, coding sequence, gene and strand, product queries return id and sequence. Lookups
+        of id types without a query raise a ValueError.
+
         :param str usr: db user e.g. = 'ucsc_annot_query'
         :param str host: db host e.g. = "pride"
         :param str pwd: pw for user e.g. = 'an0q3ry'
         :param str db: db on host e.g. = "hg18_ucsc_annotation"
+        :param int max_connections: The maximal number of concurrent BioMart requests
+        :param int retries: The number of retries of BioMart requests failing with a transient error
+        :param float backoff: The wait before the first retry in seconds, doubled with each further retry
+        :param float timeout: The socket timeout of BioMart requests in seconds
+        :param connection: An open DB-API connection to be used instead of connecting with the credentials
+        :param bool use_sql: If True, the sequences are looked up in the database instead of BioMart
+        :param dict(str,dict) sql_queries: The queries of the database lookups by kind and id type, required with
+                                           use_sql
+        :raises ValueError: If use_sql is True but no connection, credentials or sql_queries are given
         """
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.__http = None
+        self.__http_origin = None
+        self.__http_lock = threading.Lock()
         self.ids_proxy = dict()
         self.gene_proxy = dict()
         self.sequence_proxy = dict()
 
-        if usr and host and pwd and db:
+        if connection is not None:
+            self.connection = connection
+        elif usr and host and pwd and db:
             self.connection = MySQLdb.connect(user=usr, host=host, passwd=pwd, db=db)
         else:
             self.connection = None
+        if use_sql:
+            if self.connection is None:
+                raise ValueError("use_sql requires a connection or the database credentials")
+            if not sql_queries:
+                raise ValueError("use_sql requires sql_queries describing the database schema")
+        self.use_sql = use_sql
+        self.sql_queries = sql_queries or dict()
 
         if biomart:
             self.biomart_url = biomart
@@ -74,6 +250,8 @@ class MartsAdapter(ADBAdapter):
         :return: The requested sequence
         :rtype: str
         """
+        if self.use_sql:
+            return self.get_product_sequences([product_id], **kwargs).get(product_id)
 
         _db = kwargs.get("_db", "hsapiens_gene_ensembl")
         _dataset = kwargs.get("_dataset", "gene_ensembl_config")
@@ -101,8 +279,7 @@ class MartsAdapter(ADBAdapter):
             + self.biomart_tail
 
         # logging.warn(rq_n)
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url
-                                                   + urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             logging.warn("There seems to be no Proteinsequence for " + str(product_id))
@@ -126,6 +303,8 @@ class MartsAdapter(ADBAdapter):
         :return: The requested sequence
         :rtype: str
         """
+        if self.use_sql:
+            return self.get_transcript_sequences([transcript_id], **kwargs).get(transcript_id)
 
         _db = kwargs.get("_db", "hsapiens_gene_ensembl")
         _dataset = kwargs.get("_dataset", "gene_ensembl_config")
@@ -153,8 +332,7 @@ class MartsAdapter(ADBAdapter):
             + self.biomart_attribute%("strand")  \
             + self.biomart_tail
 
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url +
-                                                   urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             logging.warn("There seems to be no Transcriptsequence for " + str(transcript_id))
@@ -178,6 +356,8 @@ class MartsAdapter(ADBAdapter):
         :return: Dictionary of the requested keys as in EAdapterFields.ENUM
         :rtype: dict
         """
+        if self.use_sql:
+            return self.get_transcript_informations([transcript_id], **kwargs).get(transcript_id)
 
         _db = kwargs.get("_db", "hsapiens_gene_ensembl")
         _dataset = kwargs.get("_dataset", "gene_ensembl_config")
@@ -204,7 +384,7 @@ class MartsAdapter(ADBAdapter):
             + self.biomart_attribute%("strand")  \
             + self.biomart_tail
 
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url+urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             logging.warn("No Information on transcript %s"%transcript_id)
@@ -216,6 +396,291 @@ class MartsAdapter(ADBAdapter):
                                                   else "+"}
         return self.ids_proxy[transcript_id]
 
+    def _request(self, rq_n):
+        """
+        Sends a query to BioMart over the connection pool
+
+        :param str rq_n: The query XML
+        :return: The TSV result
+        :rtype: str
+        :raises urllib2.URLError: If the query fails after all retries or is redirected too often
+        """
+        query = urllib2.quote(rq_n)
+        http = self._connection_pool()
+        for _ in xrange(_MAX_REDIRECTS + 1):
+            try:
+                return http.get(query)
+            except _Redirect as redirect:
+                if not redirect.url.endswith(query):
+                    # the query itself was rewritten, the target is fetched once without moving the pool
+                    kwargs = {} if self.timeout is None else {"timeout": self.timeout}
+                    return urllib2.urlopen(redirect.url, **kwargs).read()
+                # e.g. http to https, the following queries are sent to the new location directly
+                http = self._connection_pool(http, redirect.url[:-len(query)])
+        raise urllib2.URLError("Too many redirects of BioMart query to %s" % self.biomart_url)
+
+    def _connection_pool(self, moved=None, url=None):
+        """
+        Returns the connection pool of :attr:`biomart_url`. It is (re)built under a lock, as the requests of
+        :meth:`_request_all` are sent from several threads which must share one pool.
+
+        :param moved: The pool whose service redirected to url
+        :type moved: :class:`~Fred2.IO.MartsAdapter._ConnectionPool`
+        :param str url: The new query url (up to and including "query=") of the service
+        :rtype: :class:`~Fred2.IO.MartsAdapter._ConnectionPool`
+        """
+        with self.__http_lock:
+            if moved is not None and moved is self.__http:
+                self.__http = _ConnectionPool(url, self.max_connections, self.retries, self.backoff, self.timeout)
+                self.__http_origin = self.biomart_url
+            elif self.__http is None or self.__http_origin != self.biomart_url:
+                self.__http = _ConnectionPool(self.biomart_url, self.max_connections, self.retries, self.backoff,
+                                              self.timeout)
+                self.__http_origin = self.biomart_url
+            return self.__http
+
+    def _request_all(self, rqs, raise_errors=True):
+        """
+        Sends independent queries to BioMart in parallel (at most max_connections at once)
+
+        :param list(str) rqs: The query XMLs
+        :param bool raise_errors: If False, the result of failing queries is None
+        :return: The TSV results in the order of rqs
+        :rtype: list(str)
+        :raises urllib2.URLError: If a query fails after all retries and raise_errors is True
+        """
+        def _req(rq):
+            try:
+                return self._request(rq)
+            except Exception:
+                if raise_errors:
+                    raise
+                return None
+
+        if len(rqs) <= 1 or self.max_connections <= 1:
+            return [_req(rq) for rq in rqs]
+        pool = ThreadPool(min(self.max_connections, len(rqs)))
+        try:
+            return pool.map(_req, rqs, chunksize=1)
+        finally:
+            pool.terminate()
+
+    @staticmethod
+    def _id_chunks(ids, batch_size):
+        """
+        Splits ids into chunks of at most batch_size ids whose comma separated (and quoted) concatenation does not
+        exceed the URL length the BioMart servers accept
+
+        :param list(str) ids: The ids
+        :param int batch_size: The maximal number of ids per chunk
+        :return: The chunks of ids
+        :rtype: generator(list(str))
+        """
+        chunk, length = [], 0
+        for i in ids:
+            l = len(urllib2.quote(i)) + 3
+            if chunk and (len(chunk) >= batch_size or length + l > _MAX_FILTER_LENGTH):
+                yield chunk
+                chunk, length = [], 0
+            chunk.append(i)
+            length += l
+        if chunk:
+            yield chunk
+
+    def _query_ids(self, ids, query_filter, attributes, **kwargs):
+        """
+        Queries BioMart for many ids at once, the ids are sent as comma separated filter value in chunks (see
+        :meth:`~Fred2.IO.MartsAdapter.MartsAdapter._id_chunks`) which are queried in parallel
+
+        :param list(str) ids: The ids to be queried
+        :param str query_filter: The BioMart filter the ids belong to
+        :param list(str) attributes: The BioMart attributes to fetch (the id column is added)
+        :keyword str _db: Can override MartsAdapter default db ("hsapiens_gene_ensembl")
+        :keyword str _dataset: Specifies the query dbs dataset if default is not wanted ("gene_ensembl_config")
+        :keyword int batch_size: The maximal number of ids per query (default 250)
+        :return: The first result row of each found id
+        :rtype: dict(str,dict)
+        """
+        _db = kwargs.get("_db", "hsapiens_gene_ensembl")
+        _dataset = kwargs.get("_dataset", "gene_ensembl_config")
+        batch_size = kwargs.get("batch_size", _BATCH_SIZE)
+
+        chunks = list(self._id_chunks(ids, batch_size))
+        rqs = [self.biomart_head%(_db, _dataset)
+               + self.biomart_filter%(query_filter, ",".join(chunk))
+               + self.biomart_attribute%(query_filter)
+               + "".join(self.biomart_attribute%a for a in attributes)
+               + self.biomart_tail for chunk in chunks]
+
+        result = dict()
+        for chunk, tsv in zip(chunks, self._request_all(rqs)):
+            tsvreader = csv.DictReader(tsv.splitlines(), dialect='excel-tab')
+            # the header names of the id columns differ between marts, the id is recognized by its value instead
+            pending = set(chunk)
+            for row in tsvreader:
+                for v in row.itervalues():
+                    if v in pending:
+                        pending.discard(v)
+                        result[v] = row
+                        break
+        return result
+
+    def _sql_query(self, kind, id_type):
+        """
+        Returns the configured database query for ids of the given kind and type
+
+        :param str kind: "transcript" or "product"
+        :param id_type: The type of the ids
+        :type id_type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :return: The query with one %s for the IN list
+        :rtype: str
+        :raises ValueError: If no query is configured for the id type
+        """
+        query = self.sql_queries.get(kind, dict()).get(id_type)
+        if query is None:
+            raise ValueError("No %s query configured for id type %s" % (kind, id_type))
+        return query
+
+    def _sql_query_ids(self, query, ids):
+        """
+        Looks up many ids in the database with parameterized IN lists of at most 500 ids. MySQL results are streamed
+        with a server-side cursor.
+
+        :param str query: The query with one %s for the IN list, the first column of the result has to be the id
+        :param list(str) ids: The ids to be queried
+        :return: The first result row of each found id
+        :rtype: dict(str,tuple)
+        """
+        # the placeholder depends on the DB-API module (%s for MySQLdb, ? for sqlite3)
+        module = sys.modules.get(type(self.connection).__module__.split(".")[0])
+        marker = "?" if getattr(module, "paramstyle", "format") == "qmark" else "%s"
+        if isinstance(self.connection, MySQLdb.connections.Connection):
+            cursor = self.connection.cursor(MySQLdb.cursors.SSCursor)
+        else:
+            cursor = self.connection.cursor()
+
+        result = dict()
+        try:
+            ids = list(ids)
+            for i in xrange(0, len(ids), _SQL_BATCH_SIZE):
+                chunk = ids[i:i+_SQL_BATCH_SIZE]
+                cursor.execute(query % ",".join([marker]*len(chunk)), chunk)
+                rows = cursor.fetchmany(_SQL_FETCH_SIZE)
+                while rows:
+                    for row in rows:
+                        result.setdefault(row[0], row)
+                    rows = cursor.fetchmany(_SQL_FETCH_SIZE)
+        finally:
+            cursor.close()
+        return result
+
+    def get_product_sequences(self, product_ids, **kwargs):
+        """
+        Fetches product (i.e. protein) sequences for many ids with as few BioMart (or database) queries as possible
+
+        :param list(str) product_ids: The ids to be queried
+        :keyword type: Assumes given IDs from type found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`, default is
+                       ensembl_peptide_id
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :keyword str _db: Can override MartsAdapter default db ("hsapiens_gene_ensembl")
+        :keyword str _dataset: Specifies the query dbs dataset if default is not wanted ("gene_ensembl_config")
+        :keyword int batch_size: The maximal number of ids per query (default 250)
+        :return: The sequences of all found ids
+        :rtype: dict(str,str)
+        :raises ValueError: If use_sql is set and no query is configured for the id type
+        """
+        missing = [i for i in set(product_ids) if i not in self.sequence_proxy]
+        if self.use_sql:
+            query = self._sql_query("product", kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            found = dict((i, row[1]) for i, row in self._sql_query_ids(query, missing).iteritems())
+        else:
+            query_filter = _PRODUCT_FILTERS.get(kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            if query_filter is None:
+                logging.warn("Could not infer the origin of product ids")
+                return dict()
+            found = dict((i, row["Protein"]) for i, row in
+                         self._query_ids(missing, query_filter, ["peptide", "external_gene_name"], **kwargs).iteritems())
+        for product_id, seq in found.iteritems():
+            self.sequence_proxy[product_id] = seq[:-1] if seq.endswith('*') else seq
+
+        result = dict((i, self.sequence_proxy[i]) for i in product_ids if i in self.sequence_proxy)
+        if len(result) < len(set(product_ids)):
+            logging.warn("There seems to be no Proteinsequence for " + ",".join(set(product_ids) - set(result)))
+        return result
+
+    def get_transcript_sequences(self, transcript_ids, **kwargs):
+        """
+        Fetches transcript sequences for many ids with as few BioMart (or database) queries as possible
+
+        :param list(str) transcript_ids: The ids to be queried
+        :keyword type: Assumes given IDs from type found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`, default is
+                       ensembl_transcript_id
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :keyword str _db: Can override MartsAdapter default db ("hsapiens_gene_ensembl")
+        :keyword str _dataset: Specifies the query dbs dataset if default is not wanted ("gene_ensembl_config")
+        :keyword int batch_size: The maximal number of ids per query (default 250)
+        :return: The sequences of all found ids
+        :rtype: dict(str,str)
+        :raises ValueError: If use_sql is set and no query is configured for the id type
+        """
+        missing = [i for i in set(transcript_ids) if i not in self.sequence_proxy]
+        if self.use_sql:
+            query = self._sql_query("transcript", kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            for transcript_id, row in self._sql_query_ids(query, missing).iteritems():
+                self.sequence_proxy[transcript_id] = row[1]
+        else:
+            query_filter = _TRANSCRIPT_FILTERS.get(kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            if query_filter is None:
+                logging.warn("Could not infer the origin of transcript ids")
+                return dict()
+            for transcript_id, row in self._query_ids(missing, query_filter, ["coding", "strand"],
+                                                      **kwargs).iteritems():
+                self.sequence_proxy[transcript_id] = row['Coding sequence']
+
+        result = dict((i, self.sequence_proxy[i]) for i in transcript_ids if i in self.sequence_proxy)
+        if len(result) < len(set(transcript_ids)):
+            logging.warn("There seems to be no Transcriptsequence for " + ",".join(set(transcript_ids) - set(result)))
+        return result
+
+    def get_transcript_informations(self, transcript_ids, **kwargs):
+        """
+        Fetches transcript sequence, gene name and strand information for many ids with as few BioMart (or database)
+        queries as possible
+
+        :param list(str) transcript_ids: The ids to be queried
+        :keyword type: Assumes given IDs from type found in :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`, default is
+                       ensembl_transcript_id
+        :type type: :func:`~Fred2.IO.ADBAdapter.EIdentifierTypes`
+        :keyword str _db: Can override MartsAdapter default db ("hsapiens_gene_ensembl")
+        :keyword str _dataset: Specifies the query dbs dataset if default is not wanted ("gene_ensembl_config")
+        :keyword int batch_size: The maximal number of ids per query (default 250)
+        :return: Dictionary of the requested keys as in EAdapterFields.ENUM for all found ids
+        :rtype: dict(str,dict)
+        :raises ValueError: If use_sql is set and no query is configured for the id type
+        """
+        missing = [i for i in set(transcript_ids) if i not in self.ids_proxy]
+        if self.use_sql:
+            query = self._sql_query("transcript", kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            for transcript_id, row in self._sql_query_ids(query, missing).iteritems():
+                self.ids_proxy[transcript_id] = {EAdapterFields.SEQ: row[1],
+                                                 EAdapterFields.GENE: row[2] or "",
+                                                 EAdapterFields.STRAND: "-" if str(row[3]).startswith("-") else "+"}
+        else:
+            query_filter = _TRANSCRIPT_FILTERS.get(kwargs.get("type", EIdentifierTypes.ENSEMBL))
+            if query_filter is None:
+                logging.warn("Could not infer the origin of transcript ids")
+                return dict()
+            for transcript_id, row in self._query_ids(missing, query_filter, ["coding", "strand"],
+                                                      **kwargs).iteritems():
+                self.ids_proxy[transcript_id] = {EAdapterFields.SEQ: row['Coding sequence'],
+                                                 EAdapterFields.GENE: row.get('Associated Gene Name', ""),
+                                                 EAdapterFields.STRAND: "-" if int(row['Strand']) < 0 else "+"}
+
+        result = dict((i, self.ids_proxy[i]) for i in transcript_ids if i in self.ids_proxy)
+        if len(result) < len(set(transcript_ids)):
+            logging.warn("No Information on transcripts %s" % ",".join(set(transcript_ids) - set(result)))
+        return result
+
     def get_transcript_position(self, transcript_id, start, stop, **kwargs):
         """
         If no transcript position is available for a variant, it can be retrieved if the mart has the transcripts
@@ -270,8 +735,7 @@ class MartsAdapter(ADBAdapter):
             + self.biomart_attribute%("cds_end")  \
             + self.biomart_tail
 
-        tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url +
-                                                    urllib2.quote(rq_n)).read()).splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader((self._request(rq_n)).splitlines(), dialect='excel-tab')
         exons = [ex for ex in tsvreader if ex["CDS Start"] and ex["CDS End"]]
         cds = [dict([k, int(v)] for k, v in e.iteritems()) for e in exons] # cast to int
         cds = sorted(cds, key=itemgetter("CDS Start")) #sort by CDS Start(position in the CDS)
@@ -342,8 +806,7 @@ class MartsAdapter(ADBAdapter):
             + self.biomart_attribute%("external_gene_name")  \
             + self.biomart_tail
 
-        tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url +
-                                                    urllib2.quote(rq_n)).read()).splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader((self._request(rq_n)).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if tsvselect and tsvselect[0]:
             self.gene_proxy[str(chrom) + str(start) + str(stop)] = tsvselect[0]['Associated Gene Name']
@@ -392,7 +855,7 @@ class MartsAdapter(ADBAdapter):
                + self.biomart_attribute%("strand") \
                + self.biomart_tail
 
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url+urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             warnings.warn("No entry found for ID %s"%product_id)
@@ -445,7 +908,7 @@ class MartsAdapter(ADBAdapter):
                + self.biomart_attribute%("peptide_location") \
                + self.biomart_tail
         #tsvreader = csv.DictReader(urllib2.urlopen(self.new_biomart_url+urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab') #what? brachvogel?
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url+urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             warnings.warn("No entry found for ID %s"%transcript_id)
@@ -494,8 +957,7 @@ class MartsAdapter(ADBAdapter):
                + self.biomart_attribute%("ensembl_transcript_id") \
                + self.biomart_attribute%("ensembl_peptide_id") \
                + self.biomart_tail
-        tsvreader = csv.DictReader(urllib2.urlopen(self.biomart_url +
-                                                   urllib2.quote(rq_n)).read().splitlines(), dialect='excel-tab')
+        tsvreader = csv.DictReader(self._request(rq_n).splitlines(), dialect='excel-tab')
         tsvselect = [x for x in tsvreader]
         if not tsvselect:
             logging.warn("No entry found for ID %s"%gene_id)
@@ -595,7 +1057,22 @@ class MartsAdapter(ADBAdapter):
 
         # logging.warning(rq_n)
 
-        tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url+urllib2.quote(rq_n)).read()).splitlines(), dialect='excel-tab')
+        rqs = [rq_n]
+        if not ensemble_only:
+            rqs.append(self.biomart_head%(_db, _dataset)
+                       + query
+                       + self.biomart_attribute%("uniprot_genename")
+                       + self.biomart_attribute%("ensembl_gene_id")
+                       + self.biomart_attribute%("ensembl_peptide_id")
+                       + self.biomart_attribute%("ensembl_transcript_id")
+                       + self.biomart_attribute%("refseq_peptide_predicted")
+                       + self.biomart_attribute%("refseq_mrna_predicted")
+                       + self.biomart_attribute%("strand")
+                       + self.biomart_tail)
+        # the query for the predicted refseq ids is independent and sent at the same time
+        tsvs = self._request_all(rqs)
+
+        tsvreader = csv.DictReader(tsvs[0].splitlines(), dialect='excel-tab')
         if ensemble_only:
             result = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader}
         else:
@@ -603,18 +1080,7 @@ class MartsAdapter(ADBAdapter):
                   if x['RefSeq Protein ID [e.g. NP_001005353]'] and x['RefSeq mRNA [e.g. NM_001195597]']}
 
         if not ensemble_only:
-            rq_x = self.biomart_head \
-                + query  \
-                + self.biomart_attribute%("uniprot_genename")  \
-                + self.biomart_attribute%("ensembl_gene_id")  \
-                + self.biomart_attribute%("ensembl_peptide_id")  \
-                + self.biomart_attribute%("ensembl_transcript_id")  \
-                + self.biomart_attribute%("refseq_peptide_predicted")  \
-                + self.biomart_attribute%("refseq_mrna_predicted")  \
-                + self.biomart_attribute%("strand")  \
-                + self.biomart_tail
-
-            tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url+urllib2.quote(rq_x)).read()).splitlines(), dialect='excel-tab')
+            tsvreader = csv.DictReader(tsvs[1].splitlines(), dialect='excel-tab')
 
             result2 = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader
                        if (x['RefSeq Predicted Protein ID [e.g. XP_001720922]'] and x['RefSeq mRNA predicted [e.g. XM_001125684]'])
@@ -659,6 +1125,7 @@ class MartsAdapter(ADBAdapter):
             logging.warning('***'+self.biomart_filter%("uniprot_genename", ','.join(kwargs['genes'][x:x+250])) for x in xrange(0, len(kwargs['genes']), 250))
         else:
             logging.warning("wrong arguments to get_variant_ids")
+        rqs = []
         for query in queries:
             rq_n = self.biomart_head%(_db,_dataset) \
                 + query \
@@ -672,19 +1139,7 @@ class MartsAdapter(ADBAdapter):
                     + self.biomart_attribute%("refseq_peptide")
             rq_n += self.biomart_tail
             # rq_n += self.biomart_attribute%("uniprot_swissprot") + self.biomart_tail
-
-            # logging.warning(rq_n)
-
-            try:
-                tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url+urllib2.quote(rq_n)).read()).splitlines(), dialect='excel-tab')
-                if ensemble_only:
-                    result = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader}
-                else:
-                    result = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader
-                          if x['RefSeq Protein ID [e.g. NP_001005353]'] and x['RefSeq mRNA [e.g. NM_001195597]']}
-                end_result.update(result)
-            except:
-                logging.error('Bad Mart Query: '+rq_n)
+            rqs.append(rq_n)
 
             if not ensemble_only:
                 rq_x = self.biomart_head%(_db, _dataset) \
@@ -697,9 +1152,27 @@ class MartsAdapter(ADBAdapter):
                     + self.biomart_attribute%("refseq_mrna_predicted")  \
                     + self.biomart_attribute%("strand")  \
                     + self.biomart_tail
+                rqs.append(rq_x)
+
+        # all queries are independent and sent in parallel, the results are merged in query order
+        step = 1 if ensemble_only else 2
+        tsvs = self._request_all(rqs, raise_errors=False)
+        for i in xrange(0, len(rqs), step):
+            rq_n = rqs[i]
+            try:
+                tsvreader = csv.DictReader(tsvs[i].splitlines(), dialect='excel-tab')
+                if ensemble_only:
+                    result = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader}
+                else:
+                    result = {x['Ensembl Gene ID']+x['Ensembl Transcript ID']+x['Ensembl Protein ID']: x for x in tsvreader
+                          if x['RefSeq Protein ID [e.g. NP_001005353]'] and x['RefSeq mRNA [e.g. NM_001195597]']}
+                end_result.update(result)
+            except:
+                logging.error('Bad Mart Query: '+rq_n)
 
+            if not ensemble_only:
                 try:
-                    tsvreader = csv.DictReader((urllib2.urlopen(self.biomart_url+urllib2.quote(rq_x)).read()).splitlines(), dialect='excel-tab')
+                    tsvreader = csv.DictReader(tsvs[i+1].splitlines(), dialect='excel-tab')
 
                     for x in tsvreader:
                         if (x['RefSeq Predicted Protein ID [e.g. XP_001720922]'] and x['RefSeq mRNA predicted [e.g. XM_001125684]']):
@@ -8,28 +8,157 @@
 .. deprecated:: 1.0
 """
 
+import cPickle
 import logging
+import os
+from collections import OrderedDict
+from StringIO import StringIO
 
 from Bio import SeqIO
 from Fred2.Core.Base import deprecated
 from Fred2.IO.ADBAdapter import ADBAdapter
 
 
+def _refseq_ids(record_id):
+    """
+    Splits a fasta record id into the versioned and the unversioned RefSeq accession
+
+    :param str record_id: The record id, e.g. gi|4505307|ref|NP_001639.1|
+    :return: The versioned and the unversioned accession, e.g. (NP_001639.1, NP_001639)
+    :rtype: (str,str)
+    """
+    ridv = filter(None, record_id.split('|'))[-1]  # NP_001639.1
+    return ridv, ridv.split('.')[0]  # NP_001639
+
+
+class _IndexedRecords(object):
+    """
+    Read-only, dict-like view of the records of a RefSeq fasta file. The file is scanned once for the byte offsets of
+    the records (or the offsets are taken from the index file stored next to it), a record is only read and parsed
+    when it is accessed. The most recently accessed records are kept parsed.
+    """
+    INDEX_SUFFIX = ".fred2idx"
+
+    def __init__(self, filename, cache_size=1000):
+        """
+        :param str filename: The fasta file
+        :param int cache_size: The number of parsed records kept in memory
+        """
+        self.filename = filename
+        self.cache_size = cache_size
+        self.__cache = OrderedDict()
+        self.offsets = self.__load_index()
+        if self.offsets is None:
+            self.offsets = self.__scan()
+            self.__save_index()
+
+    def __stamp(self):
+        st = os.stat(self.filename)
+        return st.st_size, st.st_mtime
+
+    def __load_index(self):
+        try:
+            with open(self.filename + self.INDEX_SUFFIX, "rb") as f:
+                idx = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return None
+        # an index of an older version of the file is rebuilt
+        if idx.get("stamp") != self.__stamp():
+            return None
+        return idx["offsets"]
+
+    def __save_index(self):
+        try:
+            with open(self.filename + self.INDEX_SUFFIX, "wb") as f:
+                cPickle.dump({"stamp": self.__stamp(), "offsets": self.offsets}, f, cPickle.HIGHEST_PROTOCOL)
+        except IOError:
+            logging.warning("Could not store the index of %s" % self.filename)
+
+    def __scan(self):
+        """
+        Records the start offset and length of each record
+
+        :return: The offset and length of each record by unversioned accession
+        :rtype: dict(str,(int,int))
+        """
+        offsets = dict()
+        rid, start, pos = None, 0, 0
+        with open(self.filename, "rb") as f:
+            for line in f:
+                if line.startswith(">"):
+                    if rid is not None:
+                        offsets[rid] = (start, pos - start)
+                    rid = _refseq_ids(line[1:].split(None, 1)[0])[1] if line[1:].strip() else None
+                    if rid in offsets:
+                        logging.warning("Duplicate accession %s in %s, the first record is used" % (rid, self.filename))
+                        rid = None
+                    start = pos
+                pos += len(line)
+        if rid is not None:
+            offsets[rid] = (start, pos - start)
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, rid):
+        return rid in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __getitem__(self, rid):
+        if rid in self.__cache:
+            record = self.__cache.pop(rid)
+            self.__cache[rid] = record
+            return record
+        start, length = self.offsets[rid]
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            record = SeqIO.read(StringIO(f.read(length).replace("\r", "")), "fasta")
+        record.dbxrefs.append(_refseq_ids(record.id)[0])
+        record.id = rid
+        self.__cache[rid] = record
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+        return record
+
+    def get(self, rid, default=None):
+        return self[rid] if rid in self.offsets else default
+
+    def keys(self):
+        return self.offsets.keys()
+
+
 class RefSeqAdapter(ADBAdapter):
     @deprecated  # TODO: refactor ... function based on old code
-    def __init__(self, prot_file=None, prot_vers=None, mrna_file=None, mrna_vers=None):
-        self.refseq_prot = self.load(prot_file)
+    def __init__(self, prot_file=None, prot_vers=None, mrna_file=None, mrna_vers=None, indexed=False,
+                 cache_size=1000):
+        """
+        :param str prot_file: The RefSeq protein fasta file
+        :param str prot_vers: The version of the protein file
+        :param str mrna_file: The RefSeq mRNA fasta file
+        :param str mrna_vers: The version of the mRNA file
+        :param bool indexed: If True, the files are only indexed (the byte offsets of the records are stored next to
+                             the files as <file>.fred2idx and reused) and records are read on request
+        :param int cache_size: The number of parsed records kept in memory per file in indexed mode
+        """
+        self.refseq_prot = self.load(prot_file, indexed, cache_size)
         self.vers_prot = prot_vers
-        self.refseq_mrna = self.load(mrna_file)
+        self.refseq_mrna = self.load(mrna_file, indexed, cache_size)
         self.vers_mrna = mrna_vers
 
-    def load(self, filename):
+    def load(self, filename, indexed=False, cache_size=1000):
+        if indexed:
+            try:
+                return _IndexedRecords(filename, cache_size)
+            except (IOError, OSError, TypeError):
+                return dict()
         refseq_records = dict()
         try:
             with open(filename, "rU") as f:
                 for record in SeqIO.parse(f, "fasta"):
-                    ridv = filter(None, record.id.split('|'))[-1]  # NP_001639.1
-                    rid = ridv.split('.')[0]  # NP_001639
+                    ridv, rid = _refseq_ids(record.id)
                     if rid not in refseq_records:
                         refseq_records[rid] = record
                         refseq_records[rid].dbxrefs.append(ridv)
@@ -0,0 +1,155 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: IO.SequenceIndex
+   :synopsis: Compact, memory-mappable storage of the sequences of EnsemblDB and UniProtDB
+.. moduleauthor:: walzer, schubert
+"""
+
+import cPickle
+import mmap
+import os
+
+import numpy
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from Fred2.IO.SuffixArray import SuffixArray
+
+
+_SEQUENCES = "sequences.bin"
+_OFFSETS = "offsets.npy"
+_SUFFIX_ARRAY = "suffix_array.npy"
+_LCP = "lcp.npy"
+_META = "meta.pkl"
+
+
+class CompactCollection(object):
+    """
+    Read-only, dict-like view of sequence records that are stored in one '#' separated buffer (the searchstring of
+    the database). :class:`~Bio.SeqRecord.SeqRecord` objects are created on access only, so the sequences are held
+    in memory only once.
+
+    Iteration order is the order of the sequences in the buffer, i.e. values() is aligned with the offsets.
+    """
+
+    def __init__(self, buf, offsets, accs, descriptions):
+        """
+        :param buf: The '#' separated sequences
+        :type buf: str or mmap.mmap
+        :param offsets: Start position of each sequence in buf, followed by len(buf)+1
+        :type offsets: list(int) or numpy.ndarray
+        :param list(str) accs: The accession of each sequence
+        :param list(str) descriptions: The fasta header (description) of each sequence
+        """
+        self.buf = buf
+        self.offsets = offsets
+        self.accs = accs
+        self.descriptions = descriptions
+        self.__pos = dict((acc, i) for i, acc in enumerate(accs))
+
+    def __len__(self):
+        return len(self.accs)
+
+    def __contains__(self, acc):
+        return acc in self.__pos
+
+    def __iter__(self):
+        return iter(self.accs)
+
+    def get_sequence(self, acc):
+        """
+        Returns the sequence of an accession as slice of the buffer
+
+        :param str acc: The accession
+        :return: The sequence
+        :rtype: str
+        :raises KeyError: If the accession is not contained
+        """
+        i = self.__pos[acc]
+        return self.buf[int(self.offsets[i]):int(self.offsets[i+1])-1]
+
+    def __getitem__(self, acc):
+        i = self.__pos[acc]
+        return SeqRecord(Seq(self.buf[int(self.offsets[i]):int(self.offsets[i+1])-1]), id=acc, name=acc,
+                         description=self.descriptions[i])
+
+    def get(self, acc, default=None):
+        return self[acc] if acc in self.__pos else default
+
+    def keys(self):
+        return list(self.accs)
+
+    def iterkeys(self):
+        return iter(self.accs)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def itervalues(self):
+        for acc in self.accs:
+            yield self[acc]
+
+    def items(self):
+        return list(self.iteritems())
+
+    def iteritems(self):
+        for acc in self.accs:
+            yield acc, self[acc]
+
+
+def save_sequence_index(path, searchstring, offsets, accs, descriptions, suffix_array=None, **extra):
+    """
+    Writes the sequences of a database into the directory path. The sequences and offsets (and the suffix array) are
+    stored as raw binary files, so that :func:`~Fred2.IO.SequenceIndex.load_sequence_index` can memory-map them.
+
+    :param str path: The directory to write to (created if it does not exist)
+    :param str searchstring: The '#' separated sequences
+    :param list(int) offsets: Start position of each sequence in searchstring, followed by len(searchstring)+1
+    :param list(str) accs: The accession of each sequence
+    :param list(str) descriptions: The fasta header (description) of each sequence
+    :param suffix_array: The suffix array of searchstring if present
+    :type suffix_array: :class:`~Fred2.IO.SuffixArray.SuffixArray`
+    :param extra: Further picklable data (e.g. id mappings) to store
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    with open(os.path.join(path, _SEQUENCES), "wb") as f:
+        f.write(searchstring.encode("ascii") if isinstance(searchstring, unicode) else searchstring)
+    numpy.save(os.path.join(path, _OFFSETS), numpy.asarray(offsets, dtype=numpy.int64))
+    if suffix_array is not None:
+        numpy.save(os.path.join(path, _SUFFIX_ARRAY), suffix_array.sa)
+        numpy.save(os.path.join(path, _LCP), suffix_array.lcp)
+    with open(os.path.join(path, _META), "wb") as f:
+        cPickle.dump({"accs": list(accs), "descriptions": list(descriptions),
+                      "suffix_array": suffix_array is not None, "extra": extra}, f, cPickle.HIGHEST_PROTOCOL)
+
+
+def load_sequence_index(path):
+    """
+    Loads the sequences written by :func:`~Fred2.IO.SequenceIndex.save_sequence_index`. The sequences, offsets and
+    suffix array are memory-mapped read-only, hence loading is fast and the pages are shared between processes.
+
+    :param str path: The directory of the index
+    :return: Dictionary with searchstring (mmap), idx, accs, collection
+             (:class:`~Fred2.IO.SequenceIndex.CompactCollection`), suffix_array and the extra data
+    :rtype: dict
+    :raises IOError: If path does not contain an index
+    """
+    with open(os.path.join(path, _META), "rb") as f:
+        meta = cPickle.load(f)
+    with open(os.path.join(path, _SEQUENCES), "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            searchstring = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            searchstring = ""
+    offsets = numpy.load(os.path.join(path, _OFFSETS), mmap_mode="r")
+    sa = None
+    if meta["suffix_array"]:
+        sa = SuffixArray(searchstring, numpy.load(os.path.join(path, _SUFFIX_ARRAY), mmap_mode="r"),
+                         numpy.load(os.path.join(path, _LCP), mmap_mode="r"))
+    res = dict(meta["extra"])
+    res.update({"searchstring": searchstring, "idx": offsets, "accs": meta["accs"], "suffix_array": sa,
+                "collection": CompactCollection(searchstring, offsets, meta["accs"], meta["descriptions"])})
+    return res
@@ -0,0 +1,220 @@
+# This code is part of the Fred2 distribution and governed by its
+# license.  Please see the LICENSE file that should have been included
+# as part of this package.
+"""
+.. module:: IO.SuffixArray
+   :synopsis: Suffix array with LCP array for fast exact substring search in sequence databases
+.. moduleauthor:: walzer, schubert
+"""
+
+import numpy
+
+
+class SuffixArray(object):
+    """
+    Suffix array (and LCP array) of a text. All occurrences of a pattern of length m are found with an O(m log n)
+    binary search (instead of scanning the whole text), the occurrences are contiguous in the suffix array and their
+    end is given by the LCP array.
+
+    Usage:
+        sa = SuffixArray(db.searchstring)
+        positions = sa.find_all('SYFPEITHI')
+    """
+    # number of characters compared for all neighbouring suffixes at once when building the LCP array
+    _PARALLEL_LCP = 32
+
+    def __init__(self, text, sa=None, lcp=None):
+        """
+        :param text: The text to index (e.g. the '#' separated sequences of a database). Has to be ASCII.
+        :type text: str or unicode
+        :param numpy.ndarray sa: A precomputed suffix array of text (e.g. loaded from disk)
+        :param numpy.ndarray lcp: The precomputed LCP array belonging to sa
+        """
+        self.text = text
+        if sa is None:
+            buf = numpy.frombuffer(text.encode('ascii') if isinstance(text, unicode) else text, dtype=numpy.uint8)
+            sa = self._build(buf)
+            lcp = self._build_lcp(buf, sa)
+        elif lcp is None:
+            buf = numpy.frombuffer(text.encode('ascii') if isinstance(text, unicode) else text, dtype=numpy.uint8)
+            lcp = self._build_lcp(buf, sa)
+        self.sa = sa
+        self.lcp = lcp
+
+    @staticmethod
+    def _build(buf):
+        """
+        Builds the suffix array by prefix doubling (Larsson-Sadakane): the suffixes are first sorted by their first k
+        characters (packed into one integer), then only groups of suffixes sharing a prefix of length k are refined
+        by the rank of the suffix k positions further, doubling k in each round. As almost all suffixes of a proteome
+        are distinct after a few characters, the later rounds only touch the few repeated regions.
+
+        :param numpy.ndarray buf: The text as uint8 array (must not contain 0 bytes)
+        :return: The suffix array
+        :rtype: numpy.ndarray
+        """
+        n = len(buf)
+        dtype = numpy.int32 if n < 2**31 else numpy.int64
+        if n == 0:
+            return numpy.zeros(0, dtype=dtype)
+
+        # pack as many characters as possible into one int64 key, 0 marks the end of the text
+        alphabet = numpy.zeros(256, dtype=numpy.int64)
+        present = numpy.bincount(buf, minlength=256) > 0
+        alphabet[present] = numpy.arange(1, present.sum()+1)
+        bits = int(present.sum()).bit_length()
+        k = max(1, 62 // bits)
+        padded = numpy.concatenate((alphabet[buf], numpy.zeros(k, dtype=numpy.int64)))
+        key = numpy.zeros(n, dtype=numpy.int64)
+        for j in xrange(k):
+            key = (key << bits) | padded[j:j+n]
+        del padded
+        # the order within groups of equal keys is irrelevant, they are refined below
+        sa = numpy.argsort(key)
+        key = key[sa]
+
+        # rank of a suffix is the position of the first suffix of its group in sa
+        boundary = numpy.concatenate(([True], key[1:] != key[:-1]))
+        rank = numpy.empty(n, dtype=numpy.int64)
+        rank[sa] = numpy.maximum.accumulate(numpy.where(boundary, numpy.arange(n), 0))
+        del key
+
+        unresolved = SuffixArray._unresolved(boundary)
+        while len(unresolved):
+            s = sa[unresolved]
+            second = numpy.full(len(s), -1, dtype=numpy.int64)
+            inside = s + k < n
+            second[inside] = rank[s[inside] + k]
+            first = rank[s]
+            order = numpy.argsort(first*(n+1) + second + 1)
+            s, first, second = s[order], first[order], second[order]
+            sa[unresolved] = s
+
+            boundary = numpy.concatenate(([True], (first[1:] != first[:-1]) | (second[1:] != second[:-1])))
+            rank[s] = numpy.maximum.accumulate(numpy.where(boundary, unresolved, 0))
+            unresolved = unresolved[SuffixArray._unresolved(boundary)]
+            k *= 2
+        return sa.astype(dtype)
+
+    @staticmethod
+    def _unresolved(boundary):
+        """
+        Returns the indices of all elements belonging to groups of more than one element
+
+        :param numpy.ndarray boundary: Boolean array marking the first element of each group
+        :return: The indices of the elements of groups with at least two elements
+        :rtype: numpy.ndarray
+        """
+        starts = numpy.flatnonzero(boundary)
+        sizes = numpy.diff(numpy.append(starts, len(boundary)))
+        return numpy.flatnonzero(numpy.repeat(sizes > 1, sizes))
+
+    @staticmethod
+    def _build_lcp(buf, sa):
+        """
+        Builds the LCP array, lcp[i] is the length of the longest common prefix of the suffixes sa[i-1] and sa[i]
+        (lcp[0] = 0). All neighbouring suffix pairs are first extended in parallel for a few characters, the remaining
+        pairs of long repeats are finished in text order with Kasai's algorithm.
+
+        :param numpy.ndarray buf: The text as uint8 array
+        :param numpy.ndarray sa: The suffix array
+        :return: The LCP array
+        :rtype: numpy.ndarray
+        """
+        n = len(buf)
+        lcp = numpy.zeros(n, dtype=sa.dtype)
+        if n < 2:
+            return lcp
+        # the 0 byte is not part of the text and terminates every comparison
+        padded = numpy.concatenate((buf, [0])).astype(numpy.uint8)
+        a = sa[:-1].astype(numpy.int64)
+        b = sa[1:].astype(numpy.int64)
+        active = numpy.arange(1, n)
+        length = 0
+        while len(active) and length < SuffixArray._PARALLEL_LCP:
+            same = padded[a[active-1] + length] == padded[b[active-1] + length]
+            active = active[same]
+            length += 1
+            lcp[active] = length
+        if not len(active):
+            return lcp
+
+        # Kasai: if the suffix at p shares h characters with its predecessor, the suffix at p+1 shares at least h-1
+        text = padded.tostring()
+        pos = b[active-1]
+        order = numpy.argsort(pos)
+        last, h = -2, 0
+        for j, p, q in zip(active[order], pos[order], a[active-1][order]):
+            h = max(h-1 if p == last+1 else 0, length)
+            while text[p+h:p+h+64] == text[q+h:q+h+64]:
+                h += 64
+            while text[p+h] == text[q+h]:
+                h += 1
+            lcp[j] = h
+            last = p
+        return lcp
+
+    def __len__(self):
+        return len(self.sa)
+
+    def _range(self, pattern):
+        """
+        Finds the range of the suffix array whose suffixes start with pattern
+
+        :param str pattern: The pattern to search for
+        :return: The half-open range (lo, hi) of the suffix array
+        :rtype: (int,int)
+        """
+        m = len(pattern)
+        text, sa = self.text, self.sa
+        lo, hi = 0, len(sa)
+        while lo < hi:
+            mid = (lo+hi)//2
+            start = int(sa[mid])
+            if text[start:start+m] < pattern:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(sa) or text[int(sa[lo]):int(sa[lo])+m] != pattern:
+            return lo, lo
+        # all following suffixes sharing at least m characters also start with pattern
+        lcp = self.lcp
+        hi = lo + 1
+        while hi < len(sa) and lcp[hi] >= m:
+            hi += 1
+        return lo, hi
+
+    def contains(self, pattern):
+        """
+        Checks whether pattern occurs in the text
+
+        :param str pattern: The pattern to search for
+        :return: True if pattern occurs in the text
+        :rtype: bool
+        """
+        lo, hi = self._range(pattern)
+        return hi > lo
+
+    def find(self, pattern):
+        """
+        Returns the smallest position at which pattern occurs in the text (like str.find)
+
+        :param str pattern: The pattern to search for
+        :return: The position of the first occurrence or -1
+        :rtype: int
+        """
+        lo, hi = self._range(pattern)
+        if hi == lo:
+            return -1
+        return int(self.sa[lo:hi].min())
+
+    def find_all(self, pattern):
+        """
+        Returns all positions at which pattern occurs in the text in ascending order
+
+        :param str pattern: The pattern to search for
+        :return: The positions of all (also overlapping) occurrences
+        :rtype: list(int)
+        """
+        lo, hi = self._range(pattern)
+        return sorted(int(i) for i in self.sa[lo:hi])
@@ -12,9 +12,17 @@ import warnings
 import bisect
 
 from Bio import SeqIO
+from Fred2.IO.SuffixArray import SuffixArray
+from Fred2.IO.AhoCorasick import AhoCorasick
+from Fred2.IO.SequenceIndex import CompactCollection, save_sequence_index, load_sequence_index
 from Fred2.Core.Base import deprecated
 
 
+# number of queries from which on search_all streams the searchstring once through an Aho-Corasick automaton
+# instead of scanning it once per query
+_BATCH_SEARCH_MIN = 500
+
+
 class UniProtDB:
     @deprecated  # TODO: refactor ... function based on old code
     def __init__(self, name='fdb'):
@@ -40,13 +48,17 @@ class UniProtDB:
         self.searchstring = ''  # all sequences concatenated with a '#'
         self.accs = list()  # all accessions in respective order to searchstring
         self.idx = list()  # all indices of starting strings in the searchstring in respective order
+        self.suffix_array = None  # optional SuffixArray of the searchstring
 
-    def read_seqs(self, sequence_file):
+    def read_seqs(self, sequence_file, suffix_array=False):
         """
         read sequences from uniprot files (.dat or .fasta) or from lists or dicts of BioPython SeqRecords
         and make them available for fast search. Appending also with this function.
 
         :param sequence_file: uniprot files (.dat or .fasta)
+        :param bool suffix_array: If True, a :class:`~Fred2.IO.SuffixArray.SuffixArray` of all sequences is built
+                                  which speeds up :meth:`exists`, :meth:`search` and :meth:`search_all` from a linear
+                                  scan to a binary search per query (it is kept up to date on subsequent calls)
         :return:
         """
         recs = sequence_file
@@ -63,15 +75,45 @@ class UniProtDB:
         if isinstance(sequence_file, list):
             recs = SeqIO.to_dict(sequence_file)
         if recs:
+            if isinstance(self.collection, CompactCollection):
+                self.collection = dict(self.collection.iteritems())
             self.collection.update(recs)
-            self.searchstring = '#'.join([str(x.seq) for x in self.collection.values()]).decode('ascii')
+            seqs = [str(x.seq) for x in self.collection.itervalues()]
+            self.searchstring = '#'.join(seqs).decode('ascii')
             self.accs = self.collection.keys()
-            self.idx = list()
-            self.idx.append(0)
-            for i, v in enumerate(self.collection.values()):
-                self.idx.append(1 + self.idx[-1] + len(self.collection.values()[i].seq))
+            self.idx = [0]
+            for seq in seqs:
+                self.idx.append(1 + self.idx[-1] + len(seq))
+            if suffix_array or self.suffix_array is not None:
+                self.suffix_array = SuffixArray(self.searchstring)
         return
 
+    def save_index(self, path):
+        """
+        Stores the concatenated sequences, offsets, accessions, fasta headers and the suffix array (if built) in
+        the directory path, to be loaded by :meth:`load_index` instead of parsing the sequence files again
+
+        :param str path: The directory to write the index to
+        """
+        descriptions = [self.collection[acc].description for acc in self.accs]
+        save_sequence_index(path, self.searchstring, self.idx, self.accs, descriptions, self.suffix_array)
+
+    def load_index(self, path):
+        """
+        Loads an index stored with :meth:`~Fred2.IO.UniProtAdapter.UniProtDB.save_index`. The sequences are
+        memory-mapped instead of read, so loading is near-instant and the memory is shared between processes using the
+        same index. Sequences appended later on with :meth:`read_seqs` are held in memory.
+
+        :param str path: The directory of the index
+        :raises IOError: If path does not contain an index
+        """
+        index = load_sequence_index(path)
+        self.searchstring = index["searchstring"]
+        self.idx = index["idx"]
+        self.accs = index["accs"]
+        self.collection = index["collection"]
+        self.suffix_array = index["suffix_array"]
+
     def write_seqs(self, name):
         """
         writes all fasta entries in the current object into one fasta file
@@ -81,6 +123,55 @@ class UniProtDB:
         with open(name, "w") as output:
             SeqIO.write(self.collection.values(), output, "fasta")
 
+    def _find(self, seq):
+        """
+        Returns the position of the first occurrence of seq in the searchstring (using the suffix array if present)
+
+        :param str seq: The sequence to search for
+        :return: The position or -1 if seq does not occur
+        :rtype: int
+        """
+        if self.suffix_array is not None:
+            return self.suffix_array.find(seq)
+        return self.searchstring.find(seq)
+
+    def _find_all(self, seq):
+        """
+        Returns the positions of all non-overlapping occurrences of seq in the searchstring (using the suffix array if
+        present)
+
+        :param str seq: The sequence to search for
+        :return: The positions in ascending order
+        :rtype: list(int)
+        """
+        positions = []
+        if self.suffix_array is not None:
+            for index in self.suffix_array.find_all(seq):
+                if not positions or index >= positions[-1] + len(seq):
+                    positions.append(index)
+            return positions
+        index = 0
+        while index < len(self.searchstring):
+            index = self.searchstring.find(seq, index)
+            if index == -1:
+                break
+            positions.append(index)
+            index += len(seq)
+        return positions
+
+    def _find_all_batch(self, seqs):
+        """
+        Returns the positions of all non-overlapping occurrences of each of the given sequences in the searchstring
+        with a single pass of an :class:`~Fred2.IO.AhoCorasick.AhoCorasick` automaton over the searchstring
+
+        :param list(str) seqs: The sequences to search for
+        :return: A list of positions in ascending order for each sequence
+        :rtype: list(list(int))
+        """
+        queries = [v for v in seqs if v]
+        found = dict(zip(queries, AhoCorasick(queries).find_all(self.searchstring))) if queries else {}
+        return [found.get(v, []) if v else self._find_all(v) for v in seqs]
+
     def exists(self, seq):
         """
         fast check if given sequence exists (as subsequence) in one of the UniProtDB objects collection of sequences.
@@ -89,7 +180,7 @@ class UniProtDB:
         :return: True, if it is found somewhere, False otherwise
         """
         if isinstance(seq, str):
-            index = self.searchstring.find(seq)
+            index = self._find(seq)
             if index >= 0:
                 return True
             else:
@@ -106,7 +197,7 @@ class UniProtDB:
         """
         if isinstance(seq, str):
             ids = 'null'
-            index = self.searchstring.find(seq)
+            index = self._find(seq)
             if index >= 0:
                 j = bisect.bisect(self.idx, index) - 1
                 ids = self.accs[j]
@@ -116,7 +207,7 @@ class UniProtDB:
             for i in seq:
                 ids.append('null')
             for i, v in enumerate(seq):
-                index = self.searchstring.find(v)
+                index = self._find(v)
                 if index >= 0:
                     j = bisect.bisect(self.idx, index) - 1
                     ids[i] = self.accs[j]
@@ -126,42 +217,35 @@ class UniProtDB:
     def search_all(self, seq):
         """
         search for all occurrences of given sequence(s) in the UniProtDB objects collection returning (each) the
-        fasta header front part of all occurrences.
+        fasta header front part of all occurrences. Large lists of sequences are searched with a single pass over the
+        collection.
 
         :param seq: a string interpreted as a single sequence or a list (of str) interpreted as a coll. of sequences
         :return: a dictionary of the given sequences to lists (of ids, 'null' if n/a)
         """
         if isinstance(seq, str):
             ids = 'null'
-            index = 0
-            searchstring_length = len(seq)
-            while index < len(self.searchstring):
-                index = self.searchstring.find(seq, index)
-                if index == -1:
-                    break
+            for index in self._find_all(seq):
                 j = bisect.bisect(self.idx, index) - 1
                 if ids == 'null':
                     ids = self.accs[j]
                 else:
                     ids = ids + ',' + self.accs[j]
-                index += searchstring_length
             return {seq: ids}
         if isinstance(seq, list):
             ids = list()
             for i in seq:
                 ids.append('null')
+            if self.suffix_array is None and len(seq) >= _BATCH_SEARCH_MIN:
+                hits = self._find_all_batch(seq)
+            else:
+                hits = [self._find_all(v) for v in seq]
             for i, v in enumerate(seq):
-                index = 0
-                searchstring_length = len(v)
-                while index < len(self.searchstring):
-                    index = self.searchstring.find(v, index)
-                    if index == -1:
-                        break
+                for index in hits[i]:
                     j = bisect.bisect(self.idx, index) - 1
                     if ids[i] == 'null':
                         ids[i] = self.accs[j]
                     else:
                         ids[i] = ids[i] + ',' + self.accs[j]
-                    index += searchstring_length
             return dict(zip(seq, ids))
         return None
\ No newline at end of file
@@ -3,9 +3,12 @@
 # as part of this package.
 __author__ = 'walzer', 'haegele', 'schubert', 'szolek'
 
-from Fred2.IO.FileReader import read_annovar_exonic,read_fasta,read_lines
+from Fred2.IO.FileReader import read_annovar_exonic,read_fasta,read_lines,read_vcf,stream_annovar_exonic,stream_fasta,\
+    stream_lines,stream_vcf,index_vcf
 from Fred2.IO.MartsAdapter import MartsAdapter
 from Fred2.IO.RefSeqAdapter import RefSeqAdapter
 from Fred2.IO.UniProtAdapter import UniProtDB
 from Fred2.IO.EnsemblAdapter import EnsemblDB
+from Fred2.IO.CachingDBAdapter import CachingDBAdapter
+from Fred2.IO.FastaIndex import FastaIndex, index_fasta
 from Fred2.IO.ADBAdapter import EIdentifierTypes, EAdapterFields
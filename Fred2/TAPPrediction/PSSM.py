@@ -11,7 +11,7 @@
 import itertools
 import warnings
 
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Base import ATAPPrediction
 from Fred2.Core.Result import TAPPredictionResult
 
@@ -35,12 +35,12 @@ class APSSMTAPPrediction(ATAPPrediction):
             model = "%s_%i"%(self.name, length)
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+model, fromlist=[model]), model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -139,12 +139,12 @@ class SMMTAP(APSSMTAPPrediction):
             model = "%s_%i"%(self.name, length)
             return getattr(__import__("Fred2.Data.pssms."+self.name+".mat."+model, fromlist=[model]), model)
 
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides): peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -14,7 +14,7 @@ import itertools
 import warnings
 import pkg_resources
 
-from Fred2.Core.Peptide import Peptide
+from Fred2.Core.Peptide import Peptide, LightPeptide
 from Fred2.Core.Base import ATAPPrediction, ASVM
 from Fred2.Core.Result import TAPPredictionResult
 
@@ -30,12 +30,12 @@ class ASVMTAPPrediction(ATAPPrediction, ASVM):
         :return: Returns a :class:`~Fred2.Core.Result.TAPPredictionResult` object with the prediction results
         :rtype: :class:`~Fred2.Core.Result.TAPPredictionResult`
         """
-        if isinstance(peptides, Peptide):
+        if isinstance(peptides, (Peptide, LightPeptide)):
             pep_seqs = {str(peptides):peptides}
         else:
             pep_seqs = {}
             for p in peptides:
-                if not isinstance(p, Peptide):
+                if not isinstance(p, (Peptide, LightPeptide)):
                     raise ValueError("Input is not of type Protein or Peptide")
                 pep_seqs[str(p)] = p
 
@@ -6,6 +6,7 @@ from Fred2.test.DummyAdapter import DummyAdapter
 from Fred2.test.VariantsForTesting import *
 from Fred2.Core import Generator
 from Fred2.IO.ADBAdapter import EIdentifierTypes
+from Fred2.IO.CachingDBAdapter import CachingDBAdapter
 import os
 import inspect
 import Fred2
@@ -97,6 +98,17 @@ class GeneratorTest(TestCase):
         trans = Generator.generate_transcripts_from_variants(dummy_vars, dummy_db, EIdentifierTypes.REFSEQ).next()
         self.assertEqual(str(trans), "AAAAAGGGGG")
 
+    def test_cached_adapter(self):
+        """
+        the transcripts of all variants are prefetched once, later lookups are served from the cache
+        """
+        dummy_db = CachingDBAdapter(DummyAdapter())
+        trans = list(Generator.generate_transcripts_from_variants([var_1, var_3], dummy_db, EIdentifierTypes.REFSEQ))
+        self.assertEqual(dummy_db.misses, 1)
+        self.assertTrue(any(str(t) == "ATAAACCTTCCCGGGGG" for t in trans))
+        Generator.generate_transcripts_from_variants([var_4], dummy_db, EIdentifierTypes.REFSEQ).next()
+        self.assertEqual((dummy_db.hits, dummy_db.misses), (2, 1))
+
     def test_offset_single(self):
         """
         tests if offset is correctly handled when several variants for one
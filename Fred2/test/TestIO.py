@@ -1,10 +1,21 @@
 from unittest import TestCase
+import BaseHTTPServer
 import copy
+import gzip
+import re
+import SocketServer
+import threading
+import time
+import urllib2
 
-from Fred2.Core import Allele
+from Bio import bgzf
+from Fred2.Core import Allele, Protein
+from Fred2.Core.Variant import VariationType
 from Fred2.IO import FileReader
 from Fred2.IO.MartsAdapter import MartsAdapter
 from Fred2.IO.EnsemblAdapter import EnsemblDB
+from Fred2.IO.CachingDBAdapter import CachingDBAdapter
+from Fred2.IO.FastaIndex import FastaIndex
 from Fred2.IO.RefSeqAdapter import RefSeqAdapter
 from Fred2.IO.UniProtAdapter import UniProtDB
 from Fred2.IO.ADBAdapter import ADBAdapter, EAdapterFields, EIdentifierTypes
@@ -12,11 +23,96 @@ import warnings
 import logging
 import os
 import inspect
+import shutil
+import sqlite3
+import tempfile
 import Fred2
 
 __author__ = 'walzer'
 
 
+class MockMartHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Stand-in for a BioMart martservice answering queries for the transcripts and proteins in DATA
+    """
+    COLUMNS = {"ensembl_transcript_id": "Ensembl Transcript ID", "ensembl_peptide_id": "Ensembl Protein ID",
+               "coding": "Coding sequence", "strand": "Strand", "peptide": "Protein",
+               "external_gene_name": "Associated Gene Name"}
+    DATA = dict([("ENST%011i" % i, {"ensembl_transcript_id": "ENST%011i" % i, "coding": "ATG"*(i+1),
+                                    "strand": "-1" if i % 2 else "1"}) for i in xrange(10)] +
+                [("ENSP%011i" % i, {"ensembl_peptide_id": "ENSP%011i" % i, "peptide": "M"*(i+1)+"*",
+                                    "external_gene_name": "GENE%i" % i}) for i in xrange(10)])
+    # connections are kept alive, the first failures requests are answered with 503, each answer takes latency s
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1
+    queries = []
+    connections = set()
+    failures = 0
+    latency = 0
+
+    def do_GET(self):
+        rq = urllib2.unquote(self.path.split("?query=", 1)[1])
+        MockMartHandler.queries.append(rq)
+        MockMartHandler.connections.add(self.client_address)
+        if self.latency:
+            time.sleep(self.latency)
+        if MockMartHandler.failures > 0:
+            MockMartHandler.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        ids = re.search(r'<Filter name="[^"]*" value="([^"]*)"', rq).group(1).split(",")
+        attributes = re.findall(r'<Attribute name="([^"]*)"/>', rq)
+        lines = ["\t".join(self.COLUMNS.get(a, a) for a in attributes)]
+        lines.extend("\t".join(self.DATA[i].get(a, "") for a in attributes) for i in ids if i in self.DATA)
+        body = "\n".join(lines) + "\n"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockMartServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), MockMartHandler)
+        MockMartHandler.queries = []
+        MockMartHandler.connections = set()
+        MockMartHandler.failures = 0
+        MockMartHandler.latency = 0
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%i" % self.server_address[1]
+
+
+class MockRedirectHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers every request with a redirect to the same path on the server at target
+    """
+    protocol_version = "HTTP/1.1"
+    target = None
+    count = 0
+
+    def do_GET(self):
+        MockRedirectHandler.count += 1
+        self.send_response(302)
+        self.send_header("Location", self.target + self.path)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
 class TestIO(TestCase):
     def assertWarnings(self, warning, call, *args, **kwds):
         with warnings.catch_warnings(record=True) as warning_list:
@@ -50,10 +146,139 @@ class TestIO(TestCase):
         seqs = FileReader.read_fasta(self.fa_unconventional_path)  # no "|"
         self.assertEqual(len(seqs), 174)
 
+    def test_stream_lines(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            pep_file = os.path.join(tmp, "peptides.txt")
+            with open(pep_file, "w") as f:
+                f.write("\n".join(["SYFPEITHI", "KLLPKLVSY", "syfpeithi", "AAAAAAAAA", "KLLPKLVSY", "SYFPEITHI"]))
+            self.assertEqual(map(str, FileReader.stream_lines(pep_file)), ["SYFPEITHI", "KLLPKLVSY", "AAAAAAAAA"])
+            self.assertEqual(map(str, FileReader.stream_lines(pep_file, dedup="hash")),
+                             ["SYFPEITHI", "KLLPKLVSY", "AAAAAAAAA"])
+            self.assertEqual(len(list(FileReader.stream_lines(pep_file, dedup=None))), 6)
+            # only duplicates among the last two distinct peptides are removed
+            self.assertEqual(map(str, FileReader.stream_lines(pep_file, dedup=2)),
+                             ["SYFPEITHI", "KLLPKLVSY", "AAAAAAAAA", "KLLPKLVSY", "SYFPEITHI"])
+            batches = list(FileReader.stream_lines([pep_file, pep_file], batch_size=2, dedup=None))
+            self.assertEqual(map(len, batches), [2]*6)
+            self.assertRaises(ValueError, list, FileReader.stream_lines(pep_file, dedup="fuzzy"))
+            self.assertItemsEqual(FileReader.read_lines(pep_file), FileReader.stream_lines(pep_file))
+
+            batches = list(FileReader.stream_fasta([self.fa_path, self.fa_path], in_type=Protein, batch_size=1))
+            self.assertEqual([[p.transcript_id for p in b] for b in batches], [["Q8N1N4"], ["Q9R4J4"]])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_read_fasta_compressed(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            expected = [(str(p), p.transcript_id) for p in FileReader.read_fasta(self.edb_pep_path, in_type=Protein)]
+            with open(self.edb_pep_path, "rb") as f:
+                content = f.read()
+            gz_file = os.path.join(tmp, "pep.fa.gz")
+            # two concatenated gzip members
+            with gzip.open(gz_file, "wb") as f:
+                f.write(content[:1000])
+            with gzip.open(gz_file, "ab") as f:
+                f.write(content[1000:])
+            bgz_file = os.path.join(tmp, "pep.fa.bgz")
+            with bgzf.BgzfWriter(bgz_file, "wb") as f:
+                for i in xrange(0, len(content), 700):
+                    f.write(content[i:i+700])
+                    f.flush()  # many small blocks
+            self.assertEqual("".join(FileReader._bgzf_chunks(bgz_file, 3)), content)
+            self.assertEqual(list(FileReader._LineReader(iter(["AB", "C", "D\nE", "F\n\nG"]))),
+                             ["ABCD\n", "EF\n", "\n", "G"])
+            for name in [gz_file, bgz_file]:
+                self.assertEqual([(str(p), p.transcript_id) for p in FileReader.read_fasta(name, in_type=Protein)],
+                                 expected)
+            self.assertEqual([(str(p), p.transcript_id) for p in FileReader.stream_fasta(bgz_file, Protein, threads=2)],
+                             expected)
+            merged = FileReader.read_fasta([gz_file, self.fa_path, bgz_file], in_type=Protein, processes=2)
+            self.assertEqual([str(p) for p in merged],
+                             [s for s, _ in expected] + map(str, FileReader.read_fasta(self.fa_path, Protein)))
+        finally:
+            shutil.rmtree(tmp)
+
     def test_read_annovar_exonic(self):
         ano = FileReader.read_annovar_exonic(self.ano_path)
         self.assertEqual(len(ano), 5)
 
+    def test_stream_annovar_exonic(self):
+        ano = FileReader.read_annovar_exonic(self.ano_path)
+        self.assertEqual(sorted((k, m.tranPos, m.protPos, m.cdsMutationSyntax, m.aaMutationSyntax)
+                                for k, m in ano[1].coding.iteritems())[0],
+                         ("NM_001190266", 645, 215, "c.a646g", "p.t216a"))
+        self.assertEqual((ano[4].type, ano[4].coding["NM_004004"].tranPos), (VariationType.FSDEL, 34))
+
+        batches = list(FileReader.stream_annovar_exonic(self.ano_path, batch_size=2))
+        self.assertEqual(map(len, batches), [2, 2, 1])
+        self.assertEqual([v.id for b in batches for v in b], [v.id for v in ano])
+        self.assertEqual([v.id for v in FileReader.stream_annovar_exonic(self.ano_path, gene_filter=["NOD2"])],
+                         ["line11", "line12"])
+
+        def _key(v):
+            return (v.id, v.type, v.chrom, v.genomePos, v.ref, v.obs, v.isHomozygous,
+                    sorted((k, m.tranPos, m.protPos, m.cdsMutationSyntax) for k, m in v.coding.iteritems()))
+        self.assertEqual(map(_key, FileReader.read_annovar_exonic(self.ano_path, processes=2)), map(_key, ano))
+
+    def test_read_vcf(self):
+        vcf_path = os.path.join(os.path.dirname(inspect.getfile(Fred2)), "Data/examples/test_vep.vcf")
+        tumor = FileReader.read_vcf(vcf_path)
+        self.assertEqual([(v.id, v.type, v.genomePos, v.ref, v.obs, v.isHomozygous) for v in tumor],
+                         [("rs11209026", VariationType.SNP, 67705958, "G", "A", False),
+                          ("rs2241880", VariationType.SNP, 234183368, "A", "G", True),
+                          ("rs80338943", VariationType.FSDEL, 20763687, "G", "", False),
+                          ("rs2066844", VariationType.SNP, 50745926, "C", "T", False),
+                          ("rs2066844", VariationType.INS, 50745927, "", "TTT", False),
+                          ("22:17000000:T>C", VariationType.SNP, 17000000, "T", "C", False)])
+        m = tumor[0].coding["ENST00000347310"]
+        self.assertEqual((m.tranPos, m.protPos, m.cdsMutationSyntax, m.aaMutationSyntax),
+                         (1141, 380, "c.1142G>A", "p.Arg381Gln"))
+        self.assertEqual(tumor[1].coding["ENST00000347464"].aaMutationSyntax, "p.Thr281=")
+        self.assertEqual((tumor[0].gene, tumor[0].get_metadata("phased", True),
+                          tumor[0].get_metadata("phase_set", True)), ("IL23R", True, "67705000"))
+        # each allele of a multi-allelic record gets its own annotation
+        self.assertEqual(tumor[4].coding["ENST00000300589"].tranPos, 2104)
+        self.assertEqual(tumor[5].coding, {})
+
+        normal = FileReader.read_vcf(vcf_path, sample="normal")
+        self.assertEqual([v.id for v in normal], ["rs2241880", "22:17000000:T>C"])
+        self.assertEqual([v.id for v in FileReader.read_vcf(vcf_path, gene_filter=["NOD2"])], ["rs2066844"]*2)
+        self.assertRaises(ValueError, FileReader.read_vcf, vcf_path, sample="blood")
+        self.assertEqual([v.id for v in FileReader.read_vcf(vcf_path, sample=1)], [v.id for v in normal])
+        self.assertRaises(ValueError, FileReader.read_vcf, vcf_path, sample=2)
+
+        # annotations without protein position
+        parser = FileReader._VCFParser()
+        parser.header('##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence. Format: '
+                      'Allele|Consequence|SYMBOL|Feature|HGVSc|HGVSp|CDS_position|Protein_position">')
+        parser.header("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO")
+        var = parser.variants("1\t100\t.\tA\tG\t.\tPASS\tCSQ=G|stop_lost|GENE|ENST01|ENST01:c.1500A>G||1500|")[0]
+        self.assertEqual((var.coding["ENST01"].tranPos, var.coding["ENST01"].protPos), (1499, None))
+
+        tmp = tempfile.mkdtemp()
+        try:
+            bgz_file = os.path.join(tmp, "test.vcf.gz")
+            with open(vcf_path) as f:
+                content = f.read()
+            with bgzf.BgzfWriter(bgz_file, "wb") as f:
+                for line in content.splitlines(True):
+                    f.write(line)
+                    f.flush()  # one block per line
+            FileReader.index_vcf(bgz_file)
+            self.assertTrue(os.path.isfile(bgz_file + ".tbi"))
+            batches = list(FileReader.stream_vcf(bgz_file, batch_size=4))
+            self.assertEqual([[v.id for v in b] for b in batches], [[v.id for v in tumor[:4]], [v.id for v in tumor[4:]]])
+            self.assertEqual([v.id for v in FileReader.read_vcf(bgz_file, region="16:50745000-50746000")],
+                             ["rs2066844"]*2)
+            self.assertEqual([v.id for v in FileReader.read_vcf(bgz_file, region=("13", 20763687, 20763687))],
+                             ["rs80338943"])
+            self.assertEqual(FileReader.read_vcf(bgz_file, region="16:50745927-50800000"), [])
+            self.assertEqual(FileReader.read_vcf(bgz_file, region="X"), [])
+        finally:
+            shutil.rmtree(tmp)
+
     def test_EnsemblAdapter(self):
         ed = EnsemblDB()
         ed.read_seqs(self.edb_cds_path)
@@ -69,6 +294,90 @@ class TestIO(TestCase):
         self.assertEqual(ed.get_transcript_information("ENSP00000337602", type=EIdentifierTypes.ENSEMBL)[0],
                          self.ENSEMBL_ensg)
 
+    def test_EnsemblAdapter_suffix_array(self):
+        ed = EnsemblDB()
+        ed.read_seqs(self.edb_pep_path)
+        ed_sa = EnsemblDB()
+        ed_sa.read_seqs(self.edb_pep_path, suffix_array=True)
+        self.assertIsNotNone(ed_sa.suffix_array)
+
+        seqs = [str(r.seq)[i:i+9] for r in ed.collection.values() if len(r.seq) > 50 for i in (0, 17, 40)]
+        seqs += ["SYFPEITHI", "AAAAA"]
+        self.assertEqual(ed_sa.search(seqs), ed.search(seqs))
+        self.assertEqual(ed_sa.search_all(seqs), ed.search_all(seqs))
+        for seq in seqs:
+            self.assertEqual(ed_sa.exists(seq), ed.exists(seq))
+            self.assertEqual(ed_sa.search_all(seq), ed.search_all(seq))
+
+        # appending sequences keeps the suffix array up to date
+        ed.read_seqs(self.edb_cds_path)
+        ed_sa.read_seqs(self.edb_cds_path)
+        self.assertEqual(ed_sa.search_all(["ATGGC", "GATTACA"]), ed.search_all(["ATGGC", "GATTACA"]))
+
+    def test_EnsemblAdapter_batch_search(self):
+        ed = EnsemblDB()
+        ed.read_seqs(self.edb_pep_path)
+        seqs = [str(r.seq)[i:i+9] for r in ed.collection.values() for i in xrange(0, len(r.seq)-9, 7)]
+        seqs += ["SYFPEITHI", "AAAAA", "AA"]
+        self.assertTrue(len(seqs) >= 500)
+        expected = {}
+        for seq in seqs:
+            expected.update(ed.search_all(seq))
+        self.assertEqual(ed.search_all(seqs), expected)
+
+    def test_EnsemblAdapter_index(self):
+        ed = EnsemblDB()
+        ed.read_seqs(self.edb_pep_path, suffix_array=True)
+        path = tempfile.mkdtemp()
+        try:
+            ed.save_index(path)
+            loaded = EnsemblDB()
+            loaded.load_index(path)
+
+            self.assertEqual(len(loaded.collection), 30)
+            self.assertEqual(str(loaded.get_product_sequence("ENSP00000337602", type=EIdentifierTypes.ENSEMBL).seq),
+                             str(ed.get_product_sequence("ENSP00000337602", type=EIdentifierTypes.ENSEMBL).seq))
+            self.assertEqual(loaded.get_transcript_information("ENSP00000337602", type=EIdentifierTypes.ENSEMBL),
+                             ed.get_transcript_information("ENSP00000337602", type=EIdentifierTypes.ENSEMBL))
+            self.assertEqual(loaded.map_ensp("ENSP00000337602"), ed.map_ensp("ENSP00000337602"))
+            self.assertIsNotNone(loaded.suffix_array)
+            seqs = [str(r.seq)[i:i+9] for r in ed.collection.values() if len(r.seq) > 50 for i in (0, 17, 40)]
+            self.assertEqual(loaded.search_all(seqs), ed.search_all(seqs))
+            self.assertEqual(loaded.search(seqs), ed.search(seqs))
+
+            ed.read_seqs(self.edb_cds_path)
+            loaded.read_seqs(self.edb_cds_path)
+            self.assertEqual(len(loaded.collection), 60)
+            self.assertEqual(loaded.search_all(["ATGGC", "GATTACA"]), ed.search_all(["ATGGC", "GATTACA"]))
+        finally:
+            shutil.rmtree(path)
+
+    def test_EnsemblAdapter_compact(self):
+        ed = EnsemblDB()
+        ed_c = EnsemblDB(compact=True)
+        for path in (self.edb_cds_path, self.edb_pep_path):
+            ed.read_seqs(path)
+            ed_c.read_seqs(path)
+            self.assertEqual(len(ed_c.collection), len(ed.collection))
+            self.assertEqual(ed_c.idx[-1], len(ed_c.searchstring) + 1)
+
+        self.assertEqual(ed_c.get_transcript_sequence("ENST00000348405", type=EIdentifierTypes.ENSEMBL),
+                         ed.get_transcript_sequence("ENST00000348405", type=EIdentifierTypes.ENSEMBL))
+        self.assertEqual(ed_c.get_transcript_information("ENSP00000337602", type=EIdentifierTypes.ENSEMBL),
+                         ed.get_transcript_information("ENSP00000337602", type=EIdentifierTypes.ENSEMBL))
+        self.assertEqual(str(ed_c.get_product_sequence("ENSP00000337602", type=EIdentifierTypes.ENSEMBL).seq),
+                         str(ed.get_product_sequence("ENSP00000337602", type=EIdentifierTypes.ENSEMBL).seq))
+        self.assertEqual(ed_c.map_enst("ENST00000348405"), ed.map_enst("ENST00000348405"))
+        self.assertEqual((ed_c.enst2ensp, ed_c.ensp2ensg), (ed.enst2ensp, ed.ensp2ensg))
+        # the compact storage reads the records in file order, the other one in dict order
+        self.assertEqual(dict((k, sorted(v)) for k, v in ed_c.ensg2enst.iteritems()),
+                         dict((k, sorted(v)) for k, v in ed.ensg2enst.iteritems()))
+        seqs = [str(r.seq)[i:i+9] for r in ed.collection.values() if len(r.seq) > 50 for i in (0, 17, 40)]
+        # the order of the accessions depends on the storage order
+        found, expected = ed_c.search_all(seqs), ed.search_all(seqs)
+        self.assertEqual(dict((k, sorted(v.split(','))) for k, v in found.iteritems()),
+                         dict((k, sorted(v.split(','))) for k, v in expected.iteritems()))
+
     def test_MartsAdapter(self):
         ma = MartsAdapter(biomart="http://grch37.ensembl.org")
 
@@ -86,8 +395,237 @@ class TestIO(TestCase):
         self.assertIsNone(ma.get_transcript_information("ENST00000614237", type=EIdentifierTypes.ENSEMBL))
         self.assertEqual(str(ma.get_ensembl_ids_from_id('TP53', type=EIdentifierTypes.GENENAME)), "[{0: 'ENSG00000141510', 1: '-', 3: 'ENST00000413465', 4: 'ENSP00000410739'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000359597', 4: 'ENSP00000352610'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000504290', 4: ''}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000510385', 4: ''}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000504937', 4: ''}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000269305', 4: 'ENSP00000269305'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000455263', 4: 'ENSP00000398846'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000420246', 4: 'ENSP00000391127'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000445888', 4: 'ENSP00000391478'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000576024', 4: 'ENSP00000458393'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000509690', 4: 'ENSP00000425104'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000514944', 4: 'ENSP00000423862'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000574684', 4: ''}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000505014', 4: ''}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000508793', 4: 'ENSP00000424104'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000604348', 4: 'ENSP00000473895'}, {0: 'ENSG00000141510', 1: '-', 3: 'ENST00000503591', 4: 'ENSP00000426252'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t8', 4: 'LRG_321p8'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t7', 4: 'LRG_321p13'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t6', 4: 'LRG_321p12'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t5', 4: 'LRG_321p11'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t4', 4: 'LRG_321p10'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t3', 4: 'LRG_321p3'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t2', 4: 'LRG_321p2'}, {0: 'LRG_321', 1: '+', 3: 'LRG_321t1', 4: 'LRG_321p1'}]")
 
+    def test_MartsAdapter_batch(self):
+        server = MockMartServer()
+        try:
+            ma = MartsAdapter(biomart=server.url)
+            ids = ["ENST%011i" % i for i in xrange(10)] + ["ENST99999999999"]
+            infos = ma.get_transcript_informations(ids, type=EIdentifierTypes.ENSEMBL, batch_size=4)
+            self.assertEqual(len(MockMartHandler.queries), 3)
+            self.assertEqual(sorted(infos), ids[:-1])
+            self.assertDictEqual(infos["ENST00000000003"], {EAdapterFields.SEQ: "ATG"*4, EAdapterFields.GENE: "",
+                                                            EAdapterFields.STRAND: "-"})
+
+            # cached ids are not queried again
+            self.assertEqual(ma.get_transcript_informations(ids[:5]), dict((i, infos[i]) for i in ids[:5]))
+            self.assertEqual(len(MockMartHandler.queries), 3)
+
+            seqs = ma.get_transcript_sequences(ids)
+            self.assertEqual(len(MockMartHandler.queries), 4)
+            self.assertEqual(seqs, dict((i, v[EAdapterFields.SEQ]) for i, v in infos.iteritems()))
+
+            prots = ma.get_product_sequences(["ENSP00000000001", "ENSP00000000004"], type=EIdentifierTypes.ENSEMBL)
+            self.assertEqual(prots, {"ENSP00000000001": "MM", "ENSP00000000004": "MMMMM"})
+            self.assertEqual(ma.get_product_sequences(["Q15942"], type=EIdentifierTypes.UNIPROT), {})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_MartsAdapter_concurrent(self):
+        server = MockMartServer()
+        try:
+            ma = MartsAdapter(biomart=server.url, max_connections=2, backoff=0)
+            ids = ["ENST%011i" % i for i in xrange(10)]
+            infos = ma.get_transcript_informations(ids, batch_size=1)
+            self.assertEqual(sorted(infos), ids)
+            self.assertEqual(len(MockMartHandler.queries), 10)
+            # the connections are kept alive and reused, all threads share one pool
+            self.assertLessEqual(len(MockMartHandler.connections), 2)
+            self.assertIs(ma._connection_pool(), ma._connection_pool())
+
+            # transient failures are retried
+            MockMartHandler.failures = 2
+            self.assertEqual(ma.get_transcript_sequences(["ENST00000000001"]), {"ENST00000000001": "ATGATG"})
+            self.assertEqual(len(MockMartHandler.queries), 13)
+            MockMartHandler.failures = 5
+            self.assertRaises(urllib2.HTTPError, ma.get_product_sequences, ["ENSP00000000001"])
+
+            # the follow-up queries of get_variant_ids and get_all_variant_ids are sent together
+            MockMartHandler.queries = []
+            MockMartHandler.failures = 0
+            self.assertEqual(ma.get_all_variant_ids(genes=["GENE%i" % i for i in xrange(600)]), [])
+            self.assertEqual(len(MockMartHandler.queries), 6)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_MartsAdapter_redirect(self):
+        server = MockMartServer()
+        redirect = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), MockRedirectHandler)
+        MockRedirectHandler.target, MockRedirectHandler.count = server.url, 0
+        thread = threading.Thread(target=redirect.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            ma = MartsAdapter(biomart="http://127.0.0.1:%i" % redirect.server_address[1], backoff=0)
+            self.assertEqual(ma.get_transcript_information("ENST00000000001")[EAdapterFields.SEQ], "ATGATG")
+            # the following queries are sent to the new location directly
+            self.assertEqual(ma.get_transcript_sequences(["ENST00000000002"]), {"ENST00000000002": "ATGATGATG"})
+            self.assertEqual((MockRedirectHandler.count, len(MockMartHandler.queries)), (1, 2))
+        finally:
+            redirect.shutdown()
+            redirect.server_close()
+            server.shutdown()
+            server.server_close()
+
+    def test_MartsAdapter_proxy(self):
+        server = MockMartServer()
+        environ = dict(os.environ)
+        try:
+            os.environ.update({"http_proxy": server.url, "no_proxy": ""})
+            ma = MartsAdapter(biomart="http://mart.invalid", backoff=0)
+            self.assertEqual(ma.get_transcript_sequences(["ENST00000000001"]), {"ENST00000000001": "ATGATG"})
+            self.assertEqual(len(MockMartHandler.queries), 1)
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+            server.shutdown()
+            server.server_close()
+
+    def test_MartsAdapter_sql(self):
+        connection = sqlite3.connect(":memory:")
+        connection.text_factory = str
+        connection.execute("CREATE TABLE transcripts (id TEXT, sequence TEXT, gene TEXT, strand INTEGER)")
+        connection.execute("CREATE TABLE products (id TEXT, sequence TEXT)")
+        connection.executemany("INSERT INTO transcripts VALUES (?, ?, ?, ?)",
+                               [("NM_%06i" % i, "ATG"*(i % 7 + 1), "GENE%i" % i, -1 if i % 2 else 1)
+                                for i in xrange(1200)])
+        connection.executemany("INSERT INTO products VALUES (?, ?)", [("NP_%06i" % i, "MK*") for i in xrange(10)])
+        queries = {"transcript": {EIdentifierTypes.REFSEQ:
+                                      "SELECT id, sequence, gene, strand FROM transcripts WHERE id IN (%s)"},
+                   "product": {EIdentifierTypes.REFSEQ: "SELECT id, sequence FROM products WHERE id IN (%s)"}}
+        self.assertRaises(ValueError, MartsAdapter, connection=connection, use_sql=True)
+        self.assertRaises(ValueError, MartsAdapter, use_sql=True, sql_queries=queries)
+        # without use_sql the connection is not used
+        self.assertFalse(MartsAdapter(connection=connection).use_sql)
+        ma = MartsAdapter(connection=connection, use_sql=True, sql_queries=queries)
+
+        ids = ["NM_%06i" % i for i in xrange(0, 1300, 2)]
+        infos = ma.get_transcript_informations(ids, type=EIdentifierTypes.REFSEQ)
+        self.assertEqual(len(infos), 600)
+        self.assertDictEqual(infos["NM_000010"], {EAdapterFields.SEQ: "ATGATGATGATG", EAdapterFields.GENE: "GENE10",
+                                                  EAdapterFields.STRAND: "+"})
+        self.assertEqual(ma.get_transcript_information("NM_000003", type=EIdentifierTypes.REFSEQ),
+                         {EAdapterFields.SEQ: "ATGATGATGATG", EAdapterFields.GENE: "GENE3", EAdapterFields.STRAND: "-"})
+        self.assertIsNone(ma.get_transcript_information("NM_999999", type=EIdentifierTypes.REFSEQ))
+        self.assertEqual(ma.get_transcript_sequences(["NM_000001", "NM_000002"], type=EIdentifierTypes.REFSEQ),
+                         {"NM_000001": "ATGATG", "NM_000002": "ATGATGATG"})
+        self.assertEqual(ma.get_product_sequence("NP_000001", type=EIdentifierTypes.REFSEQ), "MK")
+        # id types without a configured query are not looked up with the wrong query
+        self.assertRaises(ValueError, ma.get_transcript_sequences, ["NM_000005"])
+        self.assertRaises(ValueError, ma.get_product_sequence, "NP_000002", type=EIdentifierTypes.ENSEMBL)
+
+    def test_CachingDBAdapter(self):
+        server = MockMartServer()
+        tmp = tempfile.mkdtemp()
+        try:
+            url = server.url
+            db = CachingDBAdapter(MartsAdapter(biomart=url), maxsize=5, cache_file=os.path.join(tmp, "cache.sqlite"))
+            ids = ["ENST%011i" % i for i in xrange(10)] + ["ENST99999999999"]
+            db.prefetch(ids, type=EIdentifierTypes.ENSEMBL)
+            self.assertEqual(len(MockMartHandler.queries), 1)
+            self.assertEqual(db.get_transcript_information("ENST00000000003", type=EIdentifierTypes.ENSEMBL),
+                             {EAdapterFields.SEQ: "ATG"*4, EAdapterFields.GENE: "", EAdapterFields.STRAND: "-"})
+            self.assertEqual(len(MockMartHandler.queries), 1)
+            self.assertEqual(db.misses, len(ids))
+            # ids the batch lookup did not return are not cached by prefetch, None is only cached in memory
+            self.assertIsNone(db.get_transcript_information("ENST99999999999", type=EIdentifierTypes.ENSEMBL))
+            self.assertIsNone(db.get_transcript_information("ENST99999999999", type=EIdentifierTypes.ENSEMBL))
+            self.assertEqual(len(MockMartHandler.queries), 2)
+            # attributes of the wrapped adapter are passed through
+            self.assertEqual(db.biomart_url, url + "/biomart/martservice?query=")
+            db.close()
+
+            # a new cache on the same file does not query the adapter
+            db = CachingDBAdapter(MartsAdapter(biomart=url), cache_file=os.path.join(tmp, "cache.sqlite"))
+            for i in ids[:-1]:
+                db.get_transcript_information(i, type=EIdentifierTypes.ENSEMBL)
+            self.assertEqual(len(MockMartHandler.queries), 2)
+            self.assertEqual((db.hits, db.misses), (len(ids)-1, 0))
+            db.get_transcript_information(ids[-1], type=EIdentifierTypes.ENSEMBL)
+            self.assertEqual(len(MockMartHandler.queries), 3)
+            # other types are cached separately
+            db.get_transcript_information("ENST00000000003", type=EIdentifierTypes.REFSEQ)
+            self.assertEqual(len(MockMartHandler.queries), 4)
+            db.close()
+            self.assertRaises(ValueError, db.prefetch, ids, EIdentifierTypes.ENSEMBL, "get_transcript_position")
+            self.assertRaises(TypeError, CachingDBAdapter, object())
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp)
+
     def test_UniProtAdapter(self):
         self.assertWarnings(DeprecationWarning, UniProtDB)
 
     def test_RefSeqAdapter(self):
-        self.assertWarnings(DeprecationWarning, RefSeqAdapter,"1","2","3","4")
\ No newline at end of file
+        self.assertWarnings(DeprecationWarning, RefSeqAdapter,"1","2","3","4")
+
+    def test_RefSeqAdapter_indexed(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            prot_file = os.path.join(tmp, "prot.fa")
+            with open(prot_file, "w") as f:
+                f.write(">gi|4505307|ref|NP_001639.1| first\nMKLLV\nAAQ\n"
+                        ">gi|4505308|ref|NP_001640.2| second\nMSSSR\n\n"
+                        ">NP_001641.1\nMPEPT\nKLL\n")
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                full = RefSeqAdapter(prot_file)
+                rs = RefSeqAdapter(prot_file, indexed=True, cache_size=1)
+            self.assertTrue(os.path.isfile(prot_file + ".fred2idx"))
+            self.assertEqual(sorted(rs.refseq_prot.keys()), sorted(full.refseq_prot.keys()))
+            for rid in ["NP_001639", "NP_001641", "NP_001640", "NP_001639"]:
+                rec, exp = rs.get_product_sequence(rid), full.get_product_sequence(rid)
+                self.assertEqual((str(rec.seq), rec.id, rec.dbxrefs), (str(exp.seq), exp.id, exp.dbxrefs))
+            self.assertIsNone(rs.get_product_sequence("NP_000000"))
+            self.assertIsNone(rs.get_transcript_sequence("NM_001639"))
+
+            # the stored index is reused unless the file changed
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                self.assertEqual(RefSeqAdapter(prot_file, indexed=True).refseq_prot.offsets, rs.refseq_prot.offsets)
+                with open(prot_file, "a") as f:
+                    f.write(">NP_001642.1\nMAAAA\n")
+                os.utime(prot_file, (0, 0))
+                self.assertEqual(str(RefSeqAdapter(prot_file, indexed=True).get_product_sequence("NP_001642").seq),
+                                 "MAAAA")
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_FastaIndex(self):
+        ens_file = os.path.join(os.path.dirname(inspect.getfile(Fred2)), "Data/examples/Homo_sapiens.GRCh38.cds.test_stub.fa")
+        tmp = tempfile.mkdtemp()
+        try:
+            fasta = os.path.join(tmp, "cds.fa")
+            shutil.copy(ens_file, fasta)
+            ens = EnsemblDB()
+            ens.read_seqs(fasta)
+            fai = FastaIndex(fasta)
+            self.assertTrue(os.path.isfile(fasta + ".fai"))
+            self.assertEqual(sorted(fai.keys()), sorted(ens.collection.keys()))
+            for tid in fai:
+                seq = str(ens.collection[tid].seq)
+                self.assertEqual(fai.get_sequence(tid), seq)
+                self.assertEqual(fai.get_sequence(tid, 55, 130), seq[55:130])
+                self.assertEqual(fai.get_transcript_information(tid), ens.get_transcript_information(tid))
+            self.assertIsNone(fai.get_transcript_sequence("ENST00000000000"))
+            self.assertRaises(KeyError, fai.get_sequence, "ENST00000000000")
+            fai.close()
+
+            with open(fasta, "w") as f:
+                f.write(">sp|P01308|INS_HUMAN Insulin > 1\nMALWMRLLPL\nLALLAL\n>sp|Q8N1N4|K2C78_HUMAN a>b\nMSLS\n")
+            os.utime(fasta, (os.path.getmtime(fasta + ".fai")+1,)*2)
+            fai = FastaIndex(fasta, id_position=1)
+            self.assertEqual(len(fai), 2)
+            prot = fai.get("P01308", Protein)
+            self.assertEqual((str(prot), prot.transcript_id), ("MALWMRLLPLLALLAL", "P01308"))
+            self.assertEqual(fai.get_description("P01308"), "sp|P01308|INS_HUMAN Insulin > 1")
+            self.assertEqual(fai.get_description("Q8N1N4"), "sp|Q8N1N4|K2C78_HUMAN a>b")
+            self.assertIsNone(fai.get("P00000"))
+
+            with open(fasta, "w") as f:
+                f.write(">a\nMAL\nMALWMR\n")
+            self.assertRaises(ValueError, FastaIndex, fasta, os.path.join(tmp, "other.fai"))
+        finally:
+            shutil.rmtree(tmp)
@@ -1,12 +1,20 @@
 from unittest import TestCase
 import copy
+import cPickle
+import gc
+import os
+import tempfile
 
-from Fred2.Core import Peptide
+from Fred2.Core import Peptide, LightPeptide
 from Fred2.Core import Protein
 from Fred2.Core import Transcript
 from Fred2.Core import Variant
 from Fred2.Core import VariationType
 from Fred2.Core import MutationSyntax
+from Fred2.Core import generate_peptides_from_proteins, generate_peptide_index_from_proteins
+from Fred2.Core import SelfPeptidome
+from Fred2.Core import SequencePool
+from Fred2.Core import dumps_peptides, loads_peptides
 
 __author__ = 'walzer'
 
@@ -55,3 +63,152 @@ class TestPeptide(TestCase):
     def test_get_all_transcripts(self):
         self.assertTrue(repr(self.w_v.get_all_transcripts()) == repr([Transcript(seq="", transcript_id="GLUC_HUMAN")]))
         self.assertTrue(repr(self.w_p.get_all_transcripts()) == repr([self.gcg_t1]))
+
+    def test_peptide_index(self):
+        prots = [Protein("IIIVRCIIIV", transcript_id="p1"), Protein("VRCVRX", transcript_id="p2"),
+                 self.gcg_p1]
+        index = generate_peptide_index_from_proteins(prots, [3, 4])
+        peps = {str(p): p for p in generate_peptides_from_proteins(prots, [3, 4])}
+
+        self.assertEqual(len(index), len(peps))
+        self.assertEqual(sorted(index.sequences()), sorted(peps.keys()))
+        self.assertFalse("RCX" in index)
+        self.assertEqual(index.get_protein_positions("IIIV", "p1"), [0, 6])
+        self.assertEqual(index.get_protein_positions("IIIV", "p2"), [])
+        self.assertEqual(len(index.indptr), len(index) + 1)
+        for seq, pep in peps.iteritems():
+            self.assertEqual(index.get_all_proteins(seq), [p for p in prots if p.transcript_id in pep.proteins])
+            lazy = index[seq]
+            self.assertEqual(dict(lazy.proteinPos), dict(pep.proteinPos))
+            self.assertEqual(lazy.proteins, pep.proteins)
+
+    def test_self_peptidome(self):
+        peps = list(generate_peptides_from_proteins([self.gcg_p1], [8, 9]))
+        others = [Peptide("SYFPEITHI"), Peptide("AAAAAAAAA"), Peptide("KLLPKLVSY")]
+        for bloom in (False, True):
+            ref = SelfPeptidome.from_sequences([self.gcg_ps], [8, 9], bloom=bloom)
+            self.assertTrue(all(p in ref for p in peps))
+            self.assertEqual(ref.filter(peps), [])
+            self.assertEqual(ref.filter(others), others)
+            self.assertRaises(ValueError, ref.__contains__, "SYFPEITH12")
+
+            fd, name = tempfile.mkstemp()
+            os.close(fd)
+            try:
+                ref.save(name)
+                loaded = SelfPeptidome.load(name)
+            finally:
+                os.remove(name)
+            self.assertEqual(loaded.filter(peps + others), others)
+            self.assertEqual(len(loaded), len(ref))
+
+    def test_lazy_metadata(self):
+        pep = Peptide("SYFPEITHI")
+        self.assertIsNone(pep._MetadataLogger__metadata)
+        self.assertEqual((pep.get_metadata("score"), pep.get_metadata("score", True)), ([], None))
+        self.assertIsNone(pep._MetadataLogger__metadata)
+        pep.log_metadata("score", 0.5)
+        self.assertEqual((pep.get_metadata("score"), pep.get_metadata("score", True)), ([0.5], 0.5))
+        self.assertEqual(copy.deepcopy(pep).get_metadata("score"), [0.5])
+        self.assertIsNone(Peptide("SYFPEITHI").get_metadata("score", True))
+
+    def test_pickle(self):
+        self.w_v.log_metadata("score", 0.5)
+        self.gcg_v1.gene = "GCG"
+        pep, other = cPickle.loads(cPickle.dumps([self.w_v, Peptide("VARIANT", {self.w_v.get_protein("GLUC_HUMAN"): [2]})],
+                                                 cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual(repr(pep), repr(self.w_v))
+        self.assertEqual((pep.get_metadata("score"), pep.get_protein_positions("GLUC_HUMAN")), ([0.5], [0]))
+        # proteins and variants are shared as before
+        self.assertIs(pep.get_protein("GLUC_HUMAN"), other.get_protein("GLUC_HUMAN"))
+        var = pep.get_variants_by_protein("GLUC_HUMAN")[0]
+        self.assertEqual((var.gene, var.coding["GLUC_HUMAN"].aaMutationSyntax), ("GCG", "p.A115D"))
+        pep.proteinPos["GLUC_COPY"].append(1)
+        self.assertEqual(pep.get_protein_positions("GLUC_COPY"), [1])
+
+        prot = cPickle.loads(cPickle.dumps(self.gcg_p1, cPickle.HIGHEST_PROTOCOL))
+        self.assertEqual((str(prot), prot.transcript_id, prot.vars), (self.gcg_ps, "GLUC_HUMAN", {}))
+        self.assertEqual(prot.orig_transcript.transcript_id, "GLUC_HUMAN")
+
+    def test_serialize_peptides(self):
+        self.w_p.log_metadata("score", 0.5)
+        peps = [self.simple, self.w_p, self.w_v]
+        for pep, loaded in zip(peps, loads_peptides(dumps_peptides(peps))):
+            self.assertEqual(repr(loaded), repr(pep))
+            self.assertEqual(dict(loaded.proteinPos), dict(pep.proteinPos))
+        self.assertEqual(loads_peptides(dumps_peptides(peps))[1].get_metadata("score"), [0.5])
+
+        # without proteins only the transcript IDs are transferred and resolved against the given proteins
+        data = dumps_peptides(peps, proteins=False)
+        self.assertRaises(ValueError, loads_peptides, data)
+        self.assertRaises(KeyError, loads_peptides, data, proteins=[Protein("SYFPEITHI", transcript_id="OTHER")])
+        proteins = {"GLUC_HUMAN": self.gcg_p1}
+        loaded = loads_peptides(data, proteins=proteins, peptide_type=LightPeptide)
+        self.assertTrue(all(isinstance(p, LightPeptide) for p in loaded))
+        self.assertIs(loaded[1].get_protein("GLUC_HUMAN"), self.gcg_p1)
+        self.assertEqual(loaded, peps)
+
+        pool = SequencePool()
+        self.assertIs(loads_peptides(dumps_peptides(peps), pool=pool)[0], pool.peptide("SYFPEITHI"))
+
+    def test_light_peptide(self):
+        light = LightPeptide("syfpeithi")
+        self.assertFalse(isinstance(light, Peptide))
+        self.assertIs(SequencePool().intern(light), light)
+        self.assertEqual((str(light), len(light), light[1:3], light[0]), ("SYFPEITHI", 9, "YF", "S"))
+        self.assertTrue(light == self.simple and self.simple == light and not light != self.simple)
+        self.assertEqual({self.simple: 1}[light], 1)
+        self.assertEqual(repr(light), repr(self.simple))
+        self.assertEqual((light.get_all_proteins(), light.get_protein_positions("GLUC_HUMAN")), ([], []))
+        self.assertIsNone(light.get_metadata("score", True))
+        light.log_metadata("score", 0.5)
+        self.assertEqual(cPickle.loads(cPickle.dumps(light, 2)).get_metadata("score"), [0.5])
+
+        w_v = LightPeptide("VARIANT", {self.w_v.get_protein("GLUC_HUMAN"): [0]})
+        self.assertEqual(repr(w_v), repr(self.w_v))
+        self.assertEqual(w_v.get_variants_by_protein("GLUC_HUMAN"), [self.gcg_v1])
+
+        # slices keep the protein offset of each origin
+        prot = self.w_v.get_protein("GLUC_HUMAN")
+        for pep_type in (Peptide, LightPeptide):
+            sliced = pep_type("VARIANT", {prot: [0, 7]})[2:5]
+            self.assertEqual((str(sliced), sliced.get_protein_positions("GLUC_HUMAN")), ("RIA", [2, 9]))
+
+        peps = sorted(generate_peptides_from_proteins(self.gcg_p1, 9, peptide_type=LightPeptide))
+        ref = sorted(generate_peptides_from_proteins(self.gcg_p1, 9))
+        self.assertEqual(peps, ref)
+        self.assertEqual([p.get_protein_positions("GLUC_HUMAN") for p in peps],
+                         [p.get_protein_positions("GLUC_HUMAN") for p in ref])
+
+    def test_sequence_pool(self):
+        pool = SequencePool()
+        pep = pool.peptide("syfpeithi")
+        self.assertIs(pool.peptide("SYFPEITHI"), pep)
+        self.assertIs(pool.intern(Peptide("SYFPEITHI")), pep)
+        self.assertIs(pool.intern(self.simple), pep)
+
+        first = list(generate_peptides_from_proteins(self.gcg_p1, 9, pool=pool))
+        second = list(generate_peptides_from_proteins(self.gcg_p1, 9, pool=pool))
+        self.assertTrue(all(a is b for a, b in zip(sorted(first), sorted(second))))
+        self.assertEqual(sorted(p.get_protein_positions("GLUC_HUMAN") for p in first),
+                         sorted(p.get_protein_positions("GLUC_HUMAN")
+                                for p in generate_peptides_from_proteins(self.gcg_p1, 9)))
+
+        # origins and metadata of an interned duplicate are merged into the canonical peptide
+        other = Protein(self.gcg_ps, transcript_id="GLUC_COPY")
+        dup = Peptide(str(first[0]), {other: [3]})
+        dup.log_metadata("source", "copy")
+        canonical = pool.intern(dup)
+        self.assertIs(canonical, pool.peptide(str(first[0])))
+        self.assertEqual(canonical.get_protein_positions("GLUC_COPY"), [3])
+        self.assertEqual(canonical.get_metadata("source"), ["copy"])
+        self.assertIs(pool.protein(self.gcg_ps, transcript_id="GLUC_COPY"),
+                      pool.protein(self.gcg_ps, transcript_id="GLUC_COPY"))
+        self.assertRaises(TypeError, pool.intern, "SYFPEITHI")
+
+        weak = SequencePool(weak=True)
+        light = weak.peptide("SYFPEITHI", peptide_type=LightPeptide)
+        self.assertIs(weak.peptide("SYFPEITHI"), light)
+        del light
+        gc.collect()
+        self.assertEqual(len(weak), 0)
@@ -2,6 +2,7 @@
 """
 
 import unittest
+import cPickle
 
 # Variants and Generator
 from Fred2.Core.Generator import generate_transcripts_from_variants
@@ -9,8 +10,11 @@ from Fred2.test.DummyAdapter import DummyAdapter
 from Fred2.test.VariantsForTesting import *
 
 from Fred2.Core.Protein import Protein
+from Fred2.Core.Peptide import Peptide
 from Fred2.Core.Generator import generate_peptides_from_proteins
 from Fred2.Core.Generator import generate_proteins_from_transcripts
+from Fred2.Core.Generator import generate_peptide_batches_from_proteins
+from Fred2.Core import Generator
 from Fred2.IO.ADBAdapter import EIdentifierTypes
 
 class TestProteinClass(unittest.TestCase):
@@ -63,6 +67,109 @@ class TestProteinClass(unittest.TestCase):
         unique_test_pep_seqs = set([str(pep) for pep in unique_test_pep_set])
         self.assertEqual(len(unique_test_pep_set), len(unique_test_pep_seqs))
 
+    def test2_generate_peptides_multiple_lengths(self):
+        """
+        Test if several window sizes generated in one pass equal the union of the single length runs and that
+        windows containing invalid residues are skipped.
+        """
+        prots = self.prot_set + [Protein("ACDXEFGHIKLMNPQRSTVBWY", transcript_id='invalid entry')]
+        pep_set = list(generate_peptides_from_proteins(prots, range(2, 6)))
+        single = [p for l in range(2, 6) for p in generate_peptides_from_proteins(prots, l)]
+
+        self.assertEqual(sorted(str(p) for p in pep_set), sorted(str(p) for p in single))
+        self.assertFalse(any("X" in str(p) or "B" in str(p) for p in pep_set))
+        for p in single:
+            multi = [q for q in pep_set if str(q) == str(p)][0]
+            self.assertEqual(sorted(multi.proteins.keys()), sorted(p.proteins.keys()))
+            for t_id in p.proteins:
+                self.assertEqual(multi.get_protein_positions(t_id), p.get_protein_positions(t_id))
+
+    def test2_generate_peptide_batches(self):
+        """
+        Test if the streaming peptide generation yields every unique peptide exactly once and, if spilled to disk,
+        with all protein origins.
+        """
+        prots = self.prot_set + [Protein("IIIVRCITVRCIIIV", gene_id='gene 2', transcript_id='set entry 5')]
+        expected = {str(p): p for p in generate_peptides_from_proteins(prots, [2, 3])}
+
+        batches = list(generate_peptide_batches_from_proteins(prots, [2, 3], batch_size=5))
+        self.assertTrue(len(batches) > 1)
+        seqs = [str(p) for b in batches for p in b]
+        self.assertEqual(sorted(seqs), sorted(expected))
+
+        run_size = Generator._SPILL_RUN_SIZE
+        Generator._SPILL_RUN_SIZE = 10
+        try:
+            batches = list(generate_peptide_batches_from_proteins(prots, [2, 3], batch_size=5, spill=True))
+        finally:
+            Generator._SPILL_RUN_SIZE = run_size
+        peps = [p for b in batches for p in b]
+        self.assertEqual(sorted(str(p) for p in peps), sorted(expected))
+        for p in peps:
+            self.assertEqual(dict(p.proteinPos), dict(expected[str(p)].proteinPos))
+
+    def test2_generate_peptides_only_variants(self):
+        """
+        Peptides generated from the variant windows only have to be the same as the full fragmentation filtered for
+        peptides affected by a variant
+        """
+        dummy_db = DummyAdapter()
+        for dummy_vars in ([var_10, var_11, var_12], [var_13, var_14]):
+            ts = generate_transcripts_from_variants(dummy_vars, dummy_db, EIdentifierTypes.REFSEQ)
+            prots = list(generate_proteins_from_transcripts(ts))
+            for prot in prots:
+                for length in (2, 3, [2, 4]):
+                    full = set(str(p) for p in generate_peptides_from_proteins([prot], length)
+                               if p.get_variants_by_protein(prot.transcript_id))
+                    only = set(str(p) for p in generate_peptides_from_proteins([prot], length, only_variants=True))
+                    self.assertEqual(only, full)
+
+            # by default the variant peptides keep all origins, only_variants is an explicit opt-in
+            full = {str(p): p for p in
+                    Generator.generate_peptides_from_variants(dummy_vars, 3, dummy_db, EIdentifierTypes.REFSEQ)}
+            only = Generator.generate_peptides_from_variants(dummy_vars, 3, dummy_db, EIdentifierTypes.REFSEQ,
+                                                             only_variants=True)
+            self.assertEqual(set(str(p) for p in only), set(full))
+            for p in only:
+                for t_id, pos in p.proteinPos.iteritems():
+                    self.assertTrue(set(pos) <= set(full[str(p)].get_protein_positions(t_id)))
+            self.assertGreaterEqual(sum(len(pos) for p in full.itervalues() for pos in p.proteinPos.itervalues()),
+                                    sum(len(pos) for p in only for pos in p.proteinPos.itervalues()))
+
+    def test2_variant_index(self):
+        """
+        Slices and variant queries use the sorted variant positions, frameshifts (var_3 +2, var_4 -5) that cancel
+        each other out are not active anymore after the second one
+        """
+        prot = Protein("ASDERWQTGHKILPMNVFCY", transcript_id="someID",
+                       vars={1: [var_1], 4: [var_3], 8: [var_4], 12: [var_2]})
+        self.assertEqual(prot.get_variants(0, 5), [(1, [var_1]), (4, [var_3])])
+        self.assertEqual(prot.get_active_frameshifts(5), [(4, var_3)])
+        self.assertEqual(prot.get_active_frameshifts(10), [])
+        self.assertEqual(prot[5:10].vars, {-1: [var_3], 3: [var_4]})
+        self.assertEqual(prot[2:14].vars, {2: [var_3], 6: [var_4], 10: [var_2]})
+
+        pep = Peptide("ERWQTGH", {prot: [3]})
+        self.assertEqual(pep.get_variants_by_protein("someID"), [var_3, var_4])
+        self.assertEqual(pep.get_variants_by_protein_position("someID", 3), {1: [var_3], 5: [var_4]})
+
+        # the index is rebuilt after vars or one of its variant lists was modified or reassigned
+        prot.vars[15] = [var_7]
+        self.assertEqual(prot.get_variants(13), [(15, [var_7])])
+        del prot.vars[8]
+        self.assertEqual(prot.get_active_frameshifts(10), [(4, var_3)])
+        prot.vars[4].remove(var_3)
+        self.assertEqual(prot.get_active_frameshifts(10), [])
+        prot.vars[12].append(var_3)
+        self.assertEqual(prot.get_active_frameshifts(13), [(12, var_3)])
+        self.assertEqual([pos for pos, _ in cPickle.loads(cPickle.dumps(prot, 2)).get_active_frameshifts(13)], [12])
+        vars = {1: [var_1]}
+        prot.vars = vars
+        vars[4] = [var_3]
+        self.assertEqual(prot.get_variants(), [(1, [var_1])])
+        prot.vars = {}
+        self.assertEqual((prot.get_variants(), prot[5:10].vars), ([], {}))
+
     def test3_protein_from_variants(self):
         """
         Generate some transcripts from the 3 input variants
@@ -1,5 +1,7 @@
 from unittest import TestCase
 
+from Bio.Data.CodonTable import TranslationError
+
 __author__ = 'walzer,schubert'
 
 from Fred2.Core import Transcript
@@ -45,3 +47,18 @@ class TestTranscript(TestCase):
         new_t = self.w_v[343:]
         self.assertTrue(new_t.vars.keys()[0] == 0)
 
+
+    def test_translate_biopython_consistency(self):
+        seqs = ["ATGCCCTAG", "ATGCCCTAGCCCTAA", "AAACCCTAG", "TANNNNCCCRTA", "ATGTGAGGGC", "ATGXCCTGA", ""]
+        for to_stop in (True, False):
+            for cds in (True, False):
+                for s in seqs:
+                    t = Transcript(s)
+                    try:
+                        expected = str(t.translate(table=2, stop_symbol='#', to_stop=to_stop, cds=cds))
+                    except TranslationError:
+                        self.assertRaises(TranslationError, generate_proteins_from_transcripts(
+                            t, table=2, stop_symbol='#', to_stop=to_stop, cds=cds).next)
+                    else:
+                        self.assertEqual(str(generate_proteins_from_transcripts(
+                            t, table=2, stop_symbol='#', to_stop=to_stop, cds=cds).next()), expected)